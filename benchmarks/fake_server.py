@@ -0,0 +1,516 @@
+"""
+A local, in-process stand-in for the RabbitMQ management API, serving
+synthetic queues, exchanges, connections and bindings for benchmarks.
+
+Objects are generated from their index on demand rather than stored, so a
+dataset of a million queues costs next to nothing until it's listed, and
+listings are written out in chunks as they're generated. Deletes, purges,
+creates and published messages are kept in small overlays on top of the
+generated data.
+
+    with FakeManagementAPI(Dataset(queues=100000)) as server:
+        client = Client(server.address, 'guest', 'guest')
+        client.get_queues()
+
+Pagination (page, page_size, name, use_regex), ``columns`` and the vhost
+filtered listings behave like the real API's.
+"""
+
+import collections
+import functools
+import itertools
+import json
+import re
+import threading
+import time
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, unquote, urlparse
+except ImportError:
+    # python 2.x
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import parse_qs, urlparse
+
+#: Number of objects serialized per chunk of a listing.
+CHUNK_ITEMS = 1000
+
+
+def _rate():
+    return {'rate': 0.0}
+
+
+class Dataset(object):
+    """
+    Synthetic broker contents. Queue *i* is called 'queue.<i>' and lives in
+    vhost 'vhost-<i % vhosts>'; connections are numbered the same way.
+    Binding *i* binds queue *i % queues* to the 'events' exchange of the
+    queue's vhost. Connections and bindings default to one per queue.
+
+    """
+
+    def __init__(self, queues=1000, connections=None, bindings=None,
+                 exchanges=10, vhosts=10):
+        self.queues = queues
+        self.connections = queues if connections is None else connections
+        self.bindings = queues if bindings is None else bindings
+        self.exchanges = exchanges
+        self.vhosts = vhosts
+        self.deleted = set()
+        self.created = collections.OrderedDict()
+        self.messages = collections.defaultdict(collections.deque)
+        self.purged = set()
+        self.closed = set()
+        self.lock = threading.Lock()
+
+    def vhost_names(self):
+        return ['vhost-%d' % i for i in range(self.vhosts)]
+
+    def queue(self, i):
+        vhost = 'vhost-%d' % (i % self.vhosts)
+        name = 'queue.%d' % i
+        key = (vhost, name)
+        backlog = len(self.messages.get(key, ()))
+        messages = backlog if key in self.purged else i % 1000 + backlog
+        return {
+            'name': name, 'vhost': vhost,
+            'node': 'rabbit@node%d' % (i % 3), 'state': 'running',
+            'durable': True, 'auto_delete': False, 'exclusive': False,
+            'arguments': {'x-message-ttl': 60000}, 'policy': None,
+            'messages': messages, 'messages_ready': messages,
+            'messages_unacknowledged': 0,
+            'messages_details': _rate(), 'messages_ready_details': _rate(),
+            'messages_unacknowledged_details': _rate(),
+            'consumers': i % 2, 'consumer_utilisation': None,
+            'memory': 14000, 'idle_since': '2026-01-01 00:00:00',
+            'message_stats': {'publish': i, 'publish_details': _rate(),
+                              'deliver_get': i,
+                              'deliver_get_details': _rate(),
+                              'ack': i, 'ack_details': _rate()},
+            'backing_queue_status': {'q1': 0, 'q2': 0, 'q3': 0, 'q4': 0,
+                                     'delta': ['delta', 0, 0],
+                                     'len': messages,
+                                     'target_ram_count': 'infinity',
+                                     'next_seq_id': i,
+                                     'avg_ingress_rate': 0.0,
+                                     'avg_egress_rate': 0.0},
+        }
+
+    def exchange(self, i):
+        return {'name': 'events' if i < self.vhosts else 'exchange.%d' % i,
+                'vhost': 'vhost-%d' % (i % self.vhosts), 'type': 'topic',
+                'durable': True, 'auto_delete': False, 'internal': False,
+                'arguments': {},
+                'message_stats': {'publish_in': i,
+                                  'publish_in_details': _rate()}}
+
+    def connection_name(self, i):
+        return '10.0.%d.%d:%d -> 10.1.0.1:5672' % (i // 65536 % 256,
+                                                  i // 256 % 256,
+                                                  10000 + i % 50000)
+
+    def connection(self, i):
+        return {'name': self.connection_name(i), 'vhost': 'vhost-%d' % (i % self.vhosts),
+                'user': 'app', 'node': 'rabbit@node%d' % (i % 3),
+                'state': 'running', 'host': '10.1.0.1', 'port': 5672,
+                'peer_host': '10.0.%d.%d' % (i // 65536 % 256, i // 256 % 256),
+                'peer_port': 10000 + i % 50000, 'channels': 1,
+                'protocol': 'AMQP 0-9-1', 'recv_oct': i, 'send_oct': i,
+                'recv_oct_details': _rate(), 'send_oct_details': _rate(),
+                'client_properties': {'product': 'bench',
+                                      'capabilities': {}}}
+
+    def binding(self, i):
+        queue = i % max(self.queues, 1)
+        return {'source': 'events',
+                'vhost': 'vhost-%d' % (queue % self.vhosts),
+                'destination': 'queue.%d' % queue,
+                'destination_type': 'queue',
+                'routing_key': 'key.%d' % i, 'arguments': {},
+                'properties_key': 'key.%d' % i}
+
+    def _name(self, kind, i):
+        if kind == 'queue':
+            return 'queue.%d' % i
+        if kind == 'exchange':
+            return 'events' if i < self.vhosts else 'exchange.%d' % i
+        if kind == 'connection':
+            return self.connection_name(i)
+        return 'key.%d' % i
+
+    def _indexes(self, kind, vhost):
+        count = {'queue': self.queues, 'exchange': self.exchanges,
+                 'connection': self.connections,
+                 'binding': self.bindings}[kind]
+        if vhost is None:
+            indexes = range(count)
+        elif kind == 'binding':
+            # Bindings follow their queue's vhost.
+            indexes = (i for i in range(count)
+                       if i % max(self.queues, 1) % self.vhosts ==
+                       self._vhost_index(vhost))
+        else:
+            first = self._vhost_index(vhost)
+            indexes = range(first, count, self.vhosts) if first >= 0 else ()
+        return indexes
+
+    def _sliceable(self, kind, indexes):
+        """True if the objects at *indexes* are all present, so a page can
+        be cut straight out of them."""
+        removed = {'queue': self.deleted, 'connection': self.closed}
+        return isinstance(indexes, range) and not removed.get(kind)
+
+    def count(self, kind, vhost=None):
+        """Number of objects of one kind present, optionally in one vhost."""
+        indexes = self._indexes(kind, vhost)
+        if not self._sliceable(kind, indexes):
+            return sum(1 for entry in self.entries(kind, vhost))
+        created = 0
+        if kind == 'queue':
+            created = sum(1 for qvhost, name in self.created
+                          if vhost is None or qvhost == vhost)
+        return len(indexes) + created
+
+    def entries(self, kind, vhost=None, start=0):
+        """
+        Yield a (name, build) pair for each object of one kind still
+        present, optionally only those in one vhost, from the *start*-th
+        on. Calling *build* returns the object; listings that skip most
+        objects, like later pages, never pay for building those.
+
+        """
+        make = getattr(self, kind)
+        indexes = self._indexes(kind, vhost)
+        if start and self._sliceable(kind, indexes):
+            skipped = min(start, len(indexes))
+            indexes, start = indexes[skipped:], start - skipped
+        for entry in itertools.islice(self._entries(kind, vhost, make,
+                                                    indexes), start, None):
+            yield entry
+
+    def _entries(self, kind, vhost, make, indexes):
+        for i in indexes:
+            name = self._name(kind, i)
+            if kind == 'queue' and ('vhost-%d' % (i % self.vhosts),
+                                    name) in self.deleted:
+                continue
+            if kind == 'connection' and name in self.closed:
+                continue
+            yield name, functools.partial(make, i)
+        if kind == 'queue':
+            for (qvhost, name), obj in list(self.created.items()):
+                if vhost is None or qvhost == vhost:
+                    yield name, functools.partial(dict, obj)
+
+    def _vhost_index(self, vhost):
+        try:
+            return int(vhost.rsplit('-', 1)[1])
+        except (IndexError, ValueError):
+            return -1
+
+    def find_queue(self, vhost, name):
+        key = (vhost, name)
+        if key in self.deleted:
+            return None
+        if key in self.created:
+            return self.created[key]
+        match = re.match(r'queue\.(\d+)$', name)
+        if not match or int(match.group(1)) >= self.queues:
+            return None
+        obj = self.queue(int(match.group(1)))
+        return obj if obj['vhost'] == vhost else None
+
+
+def _project(obj, columns):
+    result = {}
+    for column in columns:
+        value, target, parts = obj, result, column.split('.')
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send each response in as few packets as possible, without waiting on
+    # Nagle's algorithm; the handler flushes after every request.
+    wbufsize = 65536
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def dataset(self):
+        return self.server.dataset
+
+    def _send(self, status, obj=None):
+        body = b'' if obj is None else json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_listing(self, items):
+        """Write a JSON array with chunked encoding as it's generated."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(text):
+            data = text.encode('utf-8')
+            self.wfile.write(('%x\r\n' % len(data)).encode('ascii'))
+            self.wfile.write(data + b'\r\n')
+
+        batch, first = [], True
+        for item in items:
+            batch.append(json.dumps(item))
+            if len(batch) == CHUNK_ITEMS:
+                chunk(('[' if first else ',') + ','.join(batch))
+                batch, first = [], False
+        if batch or first:
+            chunk(('[' if first else ',') + ','.join(batch) + ']')
+        else:
+            chunk(']')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _not_found(self):
+        self._send(404, {'error': 'Object Not Found', 'reason': 'Not Found'})
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else b''
+        return json.loads(data.decode('utf-8')) if data else {}
+
+    def _route(self):
+        url = urlparse(self.path)
+        path = url.path
+        if path.startswith('/api/'):
+            path = path[len('/api/'):]
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        return parts, query
+
+    def _list(self, kind, vhost, query):
+        entries = self.dataset.entries(kind, vhost)
+        name = query.get('name')
+        if name:
+            if query.get('use_regex') == 'true':
+                regex = re.compile(name)
+                entries = (e for e in entries if regex.search(e[0]))
+            else:
+                entries = (e for e in entries if name in e[0])
+        columns = query.get('columns')
+        columns = columns.split(',') if columns else None
+
+        def build(selected):
+            for name, make in selected:
+                obj = make()
+                yield _project(obj, columns) if columns else obj
+
+        if 'page' not in query:
+            return self._send_listing(build(entries))
+        page = int(query['page'])
+        size = int(query.get('page_size', 100))
+        start = (page - 1) * size
+        if not name:
+            total = self.dataset.count(kind, vhost)
+            entries = self.dataset.entries(kind, vhost, start)
+            selected = list(build(itertools.islice(entries, size)))
+            return self._send_page(selected, page, size, total)
+
+        seen = [0]
+
+        def counted(entries):
+            for entry in entries:
+                seen[0] += 1
+                yield entry
+
+        entries = counted(entries)
+        selected = list(build(itertools.islice(entries, start, start + size)))
+        for entry in entries:
+            pass
+        self._send_page(selected, page, size, seen[0])
+
+    def _send_page(self, selected, page, size, total):
+        self._send(200, {'items': selected, 'page': page,
+                         'page_size': size,
+                         'page_count': max(1, -(-total // size)),
+                         'item_count': len(selected),
+                         'filtered_count': total, 'total_count': total})
+
+    def _delay(self):
+        latency = self.server.latency
+        if latency:
+            time.sleep(latency)
+
+    def do_GET(self):
+        self._delay()
+        parts, query = self._route()
+        head, rest = parts[0], parts[1:]
+        data = self.dataset
+        if head == 'overview':
+            return self._send(200, {
+                'management_version': '3.12.0',
+                'object_totals': {'queues': data.queues,
+                                  'exchanges': data.exchanges,
+                                  'connections': data.connections}})
+        if head == 'aliveness-test':
+            return self._send(200, {'status': 'ok'})
+        if head == 'whoami':
+            return self._send(200, {'name': 'guest', 'tags': 'administrator'})
+        if head == 'vhosts' and not rest:
+            return self._send(200, [{'name': n} for n in data.vhost_names()])
+        if head == 'nodes':
+            return self._send(200, [{'name': 'rabbit@node%d' % i,
+                                     'type': 'disc', 'running': True}
+                                    for i in range(3)])
+        if head in ('queues', 'exchanges', 'connections', 'bindings'):
+            kind = head[:-1]
+            if len(rest) <= 1:
+                return self._list(kind, rest[0] if rest else None, query)
+            if head == 'queues' and len(rest) == 2:
+                with data.lock:
+                    obj = data.find_queue(rest[0], rest[1])
+                return self._send(200, obj) if obj else self._not_found()
+        return self._not_found()
+
+    def do_PUT(self):
+        self._delay()
+        parts, query = self._route()
+        body = self._body()
+        data = self.dataset
+        if parts[0] == 'queues' and len(parts) == 3:
+            key = (parts[1], parts[2])
+            with data.lock:
+                data.deleted.discard(key)
+                if data.find_queue(*key) is None:
+                    obj = {'name': key[1], 'vhost': key[0], 'messages': 0,
+                           'messages_ready': 0,
+                           'messages_unacknowledged': 0}
+                    obj.update(body)
+                    data.created[key] = obj
+            return self._send(201)
+        if parts[0] in ('vhosts', 'exchanges', 'users', 'permissions'):
+            return self._send(201)
+        return self._not_found()
+
+    def do_DELETE(self):
+        self._delay()
+        parts, query = self._route()
+        data = self.dataset
+        if parts[0] == 'queues' and len(parts) in (3, 4):
+            key = (parts[1], parts[2])
+            with data.lock:
+                if data.find_queue(*key) is None:
+                    return self._not_found()
+                data.messages.pop(key, None)
+                if len(parts) == 4:
+                    data.purged.add(key)
+                else:
+                    data.created.pop(key, None)
+                    data.deleted.add(key)
+            return self._send(204)
+        if parts[0] == 'connections' and len(parts) == 2:
+            with data.lock:
+                data.closed.add(parts[1])
+            return self._send(204)
+        return self._not_found()
+
+    def do_POST(self):
+        self._delay()
+        parts, query = self._route()
+        body = self._body()
+        data = self.dataset
+        if parts[0] == 'exchanges' and parts[-1] == 'publish':
+            # Everything is routed as if through the default exchange.
+            key = (parts[1], body.get('routing_key', ''))
+            with data.lock:
+                routed = data.find_queue(*key) is not None
+                if routed:
+                    data.messages[key].append(body)
+            return self._send(200, {'routed': routed})
+        if parts[0] == 'queues' and parts[-1] == 'get':
+            key = (parts[1], parts[2])
+            with data.lock:
+                if data.find_queue(*key) is None:
+                    return self._not_found()
+                backlog = data.messages[key]
+                taken = [backlog.popleft()
+                         for i in range(min(body.get('count', 1),
+                                            len(backlog)))]
+                if body.get('requeue'):
+                    backlog.extend(taken)
+                remaining = len(backlog)
+            return self._send(200, [
+                {'payload': msg.get('payload', ''),
+                 'payload_bytes': len(msg.get('payload', '')),
+                 'payload_encoding': msg.get('payload_encoding', 'string'),
+                 'redelivered': False, 'exchange': '',
+                 'routing_key': key[1], 'message_count': remaining,
+                 'properties': msg.get('properties', {})}
+                for msg in taken])
+        if parts[0] == 'definitions':
+            return self._send(204)
+        return self._not_found()
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections aren't worth a traceback.
+        pass
+
+
+class FakeManagementAPI(object):
+    """
+    Serves a :class:`Dataset` over HTTP on a local port from a background
+    thread.
+
+    """
+
+    def __init__(self, dataset, host='127.0.0.1', port=0, latency=0):
+        """
+        :param Dataset dataset: What the API should report.
+        :param int port: Port to listen on; 0 picks a free one.
+        :param float latency: Seconds to wait before answering each request.
+
+        """
+        self._server = _Server((host, port), _Handler)
+        self._server.dataset = dataset
+        self._server.latency = latency
+        self._thread = None
+
+    @property
+    def address(self):
+        """The API url to give a :class:`pyrabbit.api.Client`."""
+        host, port = self._server.server_address[:2]
+        return '%s:%d/api/' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
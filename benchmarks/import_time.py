@@ -0,0 +1,93 @@
+"""
+Measures what a short-lived script, such as a cron job or monitoring check,
+pays to use pyrabbit: the time to import it, and the time for a whole
+``is_alive`` check against :mod:`fake_server` with each transport, each
+in a fresh interpreter. Reports the median and best of several runs as
+JSON, along with the number of modules each scenario loads.
+
+Usage: python benchmarks/import_time.py [--runs 20] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_server import Dataset, FakeManagementAPI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Name and code for each scenario. The code prints how many modules it
+#: ended up loading.
+SCENARIOS = [
+    ('interpreter', "import sys"),
+    ('import_pyrabbit', "import sys, pyrabbit"),
+    ('is_alive_requests',
+     "import sys, pyrabbit\n"
+     "client = pyrabbit.Client(%(address)r, 'guest', 'guest',"
+     " transport='requests')\n"
+     "assert client.is_alive('vhost-0')"),
+    ('is_alive_stdlib',
+     "import sys, pyrabbit\n"
+     "client = pyrabbit.Client(%(address)r, 'guest', 'guest',"
+     " transport='stdlib')\n"
+     "assert client.is_alive('vhost-0')"),
+]
+
+
+def run(code):
+    """Run *code* in a new interpreter; return seconds taken and modules."""
+    start = time.time()
+    out = subprocess.check_output(
+        [sys.executable, '-c', code + "\nprint(len(sys.modules))"],
+        cwd=ROOT)
+    return time.time() - start, int(out.decode().split()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=20,
+                        help='runs of each scenario')
+    parser.add_argument('--output', help='also write results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    with FakeManagementAPI(Dataset(queues=10)) as server:
+        for name, code in SCENARIOS:
+            code = code % {'address': server.address}
+            run(code)
+            samples = []
+            for i in range(args.runs):
+                seconds, modules = run(code)
+                samples.append(seconds)
+            samples.sort()
+            results.append({
+                'benchmark': name, 'runs': args.runs, 'modules': modules,
+                'median': round(samples[len(samples) // 2], 6),
+                'best': round(samples[0], 6),
+            })
+            sys.stderr.write('%-20s median %.4fs  best %.4fs  %4d modules\n'
+                             % (name, results[-1]['median'],
+                                results[-1]['best'], modules))
+
+    report = {
+        'suite': 'import_time',
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'timestamp': int(time.time()),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
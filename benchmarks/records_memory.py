@@ -0,0 +1,76 @@
+"""
+Compare the memory held by a queue listing kept as the plain dicts the API
+returns against the same listing kept as :class:`pyrabbit.records.Queue`
+objects.
+
+Usage: python benchmarks/records_memory.py [number-of-queues]
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+
+sys.path.insert(0, '.')
+from pyrabbit import records
+
+
+def synthetic_queue(i):
+    """A queue object shaped like what /api/queues returns."""
+    rate = {'rate': 0.0}
+    return {
+        'name': 'queue.%d' % i, 'vhost': 'vhost-%d' % (i % 10),
+        'node': 'rabbit@node%d' % (i % 3), 'state': 'running',
+        'durable': True, 'auto_delete': False, 'exclusive': False,
+        'arguments': {'x-message-ttl': 60000}, 'policy': None,
+        'messages': i, 'messages_ready': i, 'messages_unacknowledged': 0,
+        'messages_details': dict(rate),
+        'messages_ready_details': dict(rate),
+        'messages_unacknowledged_details': dict(rate),
+        'consumers': 1, 'consumer_utilisation': None,
+        'memory': 14000, 'idle_since': '2026-01-01 00:00:00',
+        'exclusive_consumer_tag': None,
+        'message_stats': {'publish': i, 'publish_details': dict(rate),
+                          'deliver_get': i,
+                          'deliver_get_details': dict(rate),
+                          'ack': i, 'ack_details': dict(rate)},
+        'backing_queue_status': {'q1': 0, 'q2': 0, 'delta': ['delta', 0, 0],
+                                 'q3': 0, 'q4': 0, 'len': i,
+                                 'target_ram_count': 'infinity',
+                                 'next_seq_id': i, 'avg_ingress_rate': 0.0,
+                                 'avg_egress_rate': 0.0,
+                                 'avg_ack_ingress_rate': 0.0,
+                                 'avg_ack_egress_rate': 0.0},
+    }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return data, size
+
+
+def main(count):
+    payload = json.dumps([synthetic_queue(i) for i in range(count)])
+
+    dicts, dict_bytes = measure(lambda: json.loads(payload))
+    del dicts
+    recs, record_bytes = measure(
+        lambda: records.wrap(records.Queue, json.loads(payload)))
+
+    result = {
+        'benchmark': 'records_memory',
+        'queues': count,
+        'dict_bytes': dict_bytes,
+        'record_bytes': record_bytes,
+        'ratio': round(float(dict_bytes) / record_bytes, 2),
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
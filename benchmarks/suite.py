@@ -0,0 +1,236 @@
+"""
+Benchmarks the Client against :mod:`fake_server`, a local stand-in for the
+management API, at a range of dataset sizes. Reports throughput, latency
+percentiles and peak Python memory for listing, paging, publishing, getting
+messages and the bulk operations, as JSON for regression tracking.
+
+Usage: python benchmarks/suite.py [--sizes 10,1000,100000]
+                                  [--only get_queues,publish]
+                                  [--codec json] [--pause-gc]
+                                  [--transport stdlib]
+                                  [--output results.json]
+
+Sizes go up to 1000000 queues, connections and bindings; the largest take
+a while and a few GB of memory for the full, unpaged listings.
+
+Peak memory is measured with tracemalloc in a separate run of each
+benchmark, so tracing doesn't skew the timings. The server runs in the same
+process and is included in the peak, but it only ever holds one chunk of
+a listing at a time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, '.')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import pyrabbit
+from pyrabbit.api import Client
+from pyrabbit.codec import get_codec
+from pyrabbit.topology import Topology
+from pyrabbit.watch import Watcher
+from fake_server import Dataset, FakeManagementAPI
+
+try:
+    _clock = time.perf_counter
+except AttributeError:
+    # python 2.x
+    _clock = time.time
+
+DEFAULT_SIZES = (10, 1000, 100000)
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[int(round((len(ordered) - 1) * pct / 100.0))]
+
+
+def repeats(size):
+    """How many times to run a listing benchmark at *size*."""
+    return max(1, min(30, 100000 // max(size, 1)))
+
+
+class Benchmark(object):
+    """
+    One benchmark: *setup* runs untimed, then *op* runs *ops* times and
+    each run is timed. *items* is the number of objects each op handles.
+
+    """
+
+    def __init__(self, name, op, ops=1, items=1, setup=None):
+        self.name = name
+        self.op = op
+        self.ops = ops
+        self.items = items
+        self.setup = setup
+
+    def run(self, size):
+        if self.setup:
+            self.setup()
+        samples = []
+        start = _clock()
+        for i in range(self.ops):
+            began = _clock()
+            self.op(i)
+            samples.append(_clock() - began)
+        seconds = _clock() - start
+
+        if self.setup:
+            self.setup()
+        tracemalloc.start()
+        self.op(0)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        samples.sort()
+        return {
+            'benchmark': self.name, 'size': size, 'ops': self.ops,
+            'items_per_op': self.items, 'seconds': round(seconds, 6),
+            'ops_per_sec': round(self.ops / seconds, 2),
+            'items_per_sec': round(self.ops * self.items / seconds, 2),
+            'latency': dict((key, round(percentile(samples, pct), 6))
+                            for key, pct in (('p50', 50), ('p90', 90),
+                                             ('p99', 99), ('max', 100))),
+            'peak_bytes': peak,
+        }
+
+
+def benchmarks(client, dataset, size):
+    """The benchmarks to run against a dataset of *size* objects."""
+    reps = repeats(size)
+    bulk = min(size, 1000)
+    vhost = 'vhost-0'
+
+    def exhaust(iterable):
+        for item in iterable:
+            pass
+
+    def fill_backlog():
+        for i in range(100):
+            client.publish(vhost, 'amq.default', 'queue.0', 'payload %d' % i)
+
+    def fill_dead_letters():
+        client.publish_many(vhost, 'amq.default',
+                            (('queue.0', 'dead letter %d' % i)
+                             for i in range(10000)))
+
+    def bulk_queues():
+        return [(dataset.vhost_names()[i % dataset.vhosts], 'queue.%d' % i)
+                for i in range(bulk)]
+
+    watcher = Watcher(client, thresholds={'messages': [1000]})
+    topology = Topology(client)
+
+    def revive():
+        with dataset.lock:
+            dataset.deleted.clear()
+            dataset.purged.clear()
+
+    return [
+        Benchmark('get_queues', lambda i: client.get_queues(), reps, size),
+        Benchmark('get_queues_stream',
+                  lambda i: exhaust(client.get_queues(stream=True)),
+                  reps, size),
+        Benchmark('get_queues_columns',
+                  lambda i: client.get_queues(columns=['name', 'vhost',
+                                                       'messages']),
+                  reps, size),
+        Benchmark('iter_queues',
+                  lambda i: exhaust(client.iter_queues(page_size=500)),
+                  reps, size),
+        Benchmark('get_connections', lambda i: client.get_connections(),
+                  reps, size),
+        Benchmark('get_bindings', lambda i: client.get_bindings(), reps,
+                  size),
+        Benchmark('watch_queues', lambda i: watcher.poll(), reps, size),
+        Benchmark('topology_refresh', lambda i: topology.refresh(), reps,
+                  size),
+        Benchmark('publish',
+                  lambda i: client.publish(vhost, 'amq.default', 'queue.0',
+                                           'payload %d' % i), 200),
+        Benchmark('publish_many',
+                  lambda i: client.publish_many(
+                      vhost, 'amq.default',
+                      (('queue.0', b'payload %d' % j) for j in range(1000))),
+                  3, 1000),
+        Benchmark('get_messages',
+                  lambda i: client.get_messages(vhost, 'queue.0', count=10,
+                                                requeue=True),
+                  100, 10, setup=fill_backlog),
+        Benchmark('iter_messages',
+                  lambda i: exhaust(client.iter_messages(vhost, 'queue.0')),
+                  1, 10000, setup=fill_dead_letters),
+        Benchmark('purge_queues',
+                  lambda i: client.purge_queues(bulk_queues()), 3, bulk,
+                  setup=revive),
+        Benchmark('delete_queues',
+                  lambda i: client.delete_queues(bulk_queues()), 1, bulk,
+                  setup=revive),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated dataset sizes')
+    parser.add_argument('--only', help='comma separated benchmark names')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='workers for the bulk operations')
+    parser.add_argument('--codec', default='auto',
+                        help='JSON codec: auto, json or orjson')
+    parser.add_argument('--pause-gc', action='store_true',
+                        help='pause the garbage collector while decoding '
+                             'large responses')
+    parser.add_argument('--transport', default='requests',
+                        help='transport: requests or stdlib')
+    parser.add_argument('--output', help='also write results to this file')
+    args = parser.parse_args(argv)
+    only = set(args.only.split(',')) if args.only else None
+    codec = get_codec(args.codec)
+    codec.pause_gc = args.pause_gc
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        dataset = Dataset(queues=size)
+        with FakeManagementAPI(dataset) as server:
+            with Client(server.address, 'guest', 'guest', timeout=600,
+                        max_concurrency=args.concurrency,
+                        pool_maxsize=args.concurrency, codec=codec,
+                        transport=args.transport) as client:
+                for bench in benchmarks(client, dataset, size):
+                    if only and bench.name not in only:
+                        continue
+                    result = bench.run(size)
+                    results.append(result)
+                    sys.stderr.write('%-20s %8d  %10.1f items/s  p50 %.4fs\n'
+                                     % (bench.name, size,
+                                        result['items_per_sec'],
+                                        result['latency']['p50']))
+
+    report = {
+        'suite': 'management_api',
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'pyrabbit': getattr(pyrabbit, '__version__', None),
+        'codec': args.codec,
+        'pause_gc': args.pause_gc,
+        'transport': args.transport,
+        'timestamp': int(time.time()),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""
+The aio module provides :class:`AsyncClient`, a coroutine-based counterpart
+to :class:`pyrabbit.api.Client` for use inside asyncio applications.
+
+It uses the same URL table and raises the same exceptions as the blocking
+client. HTTP is done with aiohttp, which is imported on first use, so this
+module requires Python 3.5+ and ``pip install aiohttp``. It isn't installed
+on Python 2, where it wouldn't compile.
+"""
+
+import asyncio
+import base64
+from urllib.parse import quote, urljoin
+
+from . import http
+from .codec import get_codec
+from .api import APIError, Client, _raise_for_http_error
+
+
+class AsyncHTTPClient(object):
+    """
+    The asyncio equivalent of :class:`pyrabbit.http.HTTPClient`. All calls
+    share one aiohttp session, whose connector keeps a pool of keep-alive
+    connections, so many calls can be in flight on one event loop.
+
+    """
+
+    def __init__(self, api_url, uname, passwd, timeout=5, scheme='http',
+                 limit=100, limit_per_host=0, keepalive_timeout=15,
+                 codec=None):
+        """
+        :param string api_url: The base URL for the broker API.
+        :param string uname: Username credential used to authenticate.
+        :param string passwd: Password used to authenticate w/ REST API
+        :param int timeout: Integer number of seconds to wait for each call.
+        :param string scheme: HTTP scheme used to connect
+        :param int limit: Maximum number of simultaneous connections in the
+            pool. 0 means no limit.
+        :param int limit_per_host: Maximum number of simultaneous connections
+            to one host. 0 means no limit.
+        :param int keepalive_timeout: Seconds an idle pooled connection is
+            kept open.
+        :param codec: The JSON codec responses are decoded with; see
+            :mod:`pyrabbit.codec`.
+
+        """
+        self.uname = uname
+        self.passwd = passwd
+        self.timeout = timeout
+        self.base_url = '%s://%s' % (scheme, api_url)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.codec = get_codec(codec)
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _get_session(self):
+        # The session must be created inside a running event loop, so it's
+        # done lazily on the first call rather than in __init__.
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Authorization': self._auth_header()},
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def _auth_header(self):
+        creds = ('%s:%s' % (self.uname, self.passwd)).encode('utf-8')
+        return 'Basic ' + base64.b64encode(creds).decode('ascii')
+
+    async def close(self):
+        """
+        Close the session and all of its pooled connections.
+
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def do_call(self, path, method, body=None, headers=None):
+        """
+        Send an HTTP request to the REST API. Arguments and return value are
+        the same as :meth:`pyrabbit.http.HTTPClient.do_call`.
+
+        """
+        import aiohttp
+        url = urljoin(self.base_url, path)
+        session = self._get_session()
+        try:
+            async with session.request(method, url, data=body,
+                                       headers=headers) as resp:
+                status = resp.status
+                data = await resp.read()
+        except asyncio.TimeoutError:
+            raise http.NetworkError("Timeout while trying to connect to "
+                                    "RabbitMQ")
+        except aiohttp.ClientError as err:
+            raise http.NetworkError("Error during request %s %s" %
+                                    (type(err), err))
+
+        if status in http.EMPTY_STATUSES or not data:
+            content = None
+        else:
+            try:
+                content = self.codec.loads(data)
+            except ValueError:
+                content = None
+
+        # 'success' HTTP status codes are 200-206
+        if status < 200 or status > 206:
+            raise http.HTTPError(content, status,
+                                 data.decode('utf-8', 'replace'), path, body)
+        else:
+            if content:
+                return content
+            else:
+                return None
+
+
+class AsyncClient(object):
+    """
+    Coroutine version of :class:`pyrabbit.api.Client`. Each method takes the
+    same arguments and returns the same data as its blocking namesake, but
+    must be awaited::
+
+        async with AsyncClient('localhost:15672', 'guest', 'guest') as cl:
+            queues = await cl.get_queues('/')
+
+    """
+    urls = Client.urls
+    json_headers = Client.json_headers
+
+    def __init__(self, api_url, user, passwd, timeout=5, scheme='http',
+                 limit=100, limit_per_host=0, keepalive_timeout=15,
+                 codec=None):
+        """
+        :param string api_url: base url for the broker API
+        :param string user: Username used to authenticate to the API.
+        :param string passwd: Password used to authenticate to the API.
+        :param int timeout: Integer number of seconds to wait for each call.
+        :param string scheme: HTTP scheme used to make the connection
+        :param int limit: Maximum number of simultaneous connections.
+        :param int limit_per_host: Maximum number of simultaneous
+            connections to one host.
+        :param int keepalive_timeout: Seconds an idle pooled connection is
+            kept open.
+        :param codec: The JSON codec for request and response bodies; see
+            :mod:`pyrabbit.codec`.
+
+        """
+        self.api_url = api_url
+        self.user = user
+        self.passwd = passwd
+        self.timeout = timeout
+        self.scheme = scheme
+        self.http = AsyncHTTPClient(
+            self.api_url,
+            self.user,
+            self.passwd,
+            self.timeout,
+            self.scheme,
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            codec=codec
+        )
+        self.codec = self.http.codec
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Release the pooled HTTP connections held by this client.
+
+        """
+        await self.http.close()
+
+    async def _call(self, path, method, body=None, headers=None):
+        """
+        Wrapper around http.do_call that transforms some HTTPError into
+        our own exceptions
+        """
+        try:
+            resp = await self.http.do_call(path, method, body, headers)
+        except http.HTTPError as err:
+            _raise_for_http_error(err, path, self.user)
+            raise
+        return resp
+
+    async def is_alive(self, vhost='%2F'):
+        """See :meth:`pyrabbit.api.Client.is_alive`."""
+        uri = self.urls['live_test'] % vhost
+
+        try:
+            resp = await self._call(uri, 'GET')
+        except http.HTTPError as err:
+            if err.status == 404:
+                raise APIError("No vhost named '%s'" % vhost)
+            raise
+
+        return resp['status'] == 'ok'
+
+    async def get_whoami(self):
+        """See :meth:`pyrabbit.api.Client.get_whoami`."""
+        return await self._call(self.urls['whoami'], 'GET')
+
+    async def get_overview(self):
+        """See :meth:`pyrabbit.api.Client.get_overview`."""
+        return await self._call(self.urls['overview'], 'GET')
+
+    async def get_nodes(self):
+        """See :meth:`pyrabbit.api.Client.get_nodes`."""
+        return await self._call(self.urls['all_nodes'], 'GET')
+
+    async def get_users(self):
+        """See :meth:`pyrabbit.api.Client.get_users`."""
+        return await self._call(self.urls['all_users'], 'GET')
+
+    ################################################
+    ###         VHOSTS
+    ################################################
+    async def get_all_vhosts(self):
+        """See :meth:`pyrabbit.api.Client.get_all_vhosts`."""
+        return await self._call(self.urls['all_vhosts'], 'GET')
+
+    async def get_vhost_names(self):
+        """See :meth:`pyrabbit.api.Client.get_vhost_names`."""
+        vhosts = await self.get_all_vhosts()
+        return [i['name'] for i in vhosts]
+
+    async def get_vhost(self, vname):
+        """See :meth:`pyrabbit.api.Client.get_vhost`."""
+        path = self.urls['vhosts_by_name'] % quote(vname, '')
+        return await self._call(path, 'GET', headers=self.json_headers)
+
+    async def create_vhost(self, vname):
+        """See :meth:`pyrabbit.api.Client.create_vhost`."""
+        path = self.urls['vhosts_by_name'] % quote(vname, '')
+        return await self._call(path, 'PUT', headers=self.json_headers)
+
+    async def delete_vhost(self, vname):
+        """See :meth:`pyrabbit.api.Client.delete_vhost`."""
+        path = self.urls['vhosts_by_name'] % quote(vname, '')
+        return await self._call(path, 'DELETE')
+
+    ###############################################
+    ##           PERMISSIONS
+    ###############################################
+    async def get_permissions(self):
+        """See :meth:`pyrabbit.api.Client.get_permissions`."""
+        return await self._call(self.urls['all_permissions'], 'GET')
+
+    async def get_vhost_permissions(self, vname):
+        """See :meth:`pyrabbit.api.Client.get_vhost_permissions`."""
+        path = self.urls['vhost_permissions_get'] % (quote(vname, ''),)
+        return await self._call(path, 'GET')
+
+    async def get_user_permissions(self, username):
+        """See :meth:`pyrabbit.api.Client.get_user_permissions`."""
+        path = self.urls['user_permissions'] % (username,)
+        return await self._call(path, 'GET')
+
+    async def set_vhost_permissions(self, vname, username, config, rd, wr):
+        """See :meth:`pyrabbit.api.Client.set_vhost_permissions`."""
+        body = self.codec.dumps({"configure": config, "read": rd, "write": wr})
+        path = self.urls['vhost_permissions'] % (quote(vname, ''), username)
+        return await self._call(path, 'PUT', body,
+                                headers=self.json_headers)
+
+    async def delete_permission(self, vname, username):
+        """See :meth:`pyrabbit.api.Client.delete_permission`."""
+        path = self.urls['vhost_permissions'] % (quote(vname, ''), username)
+        return await self._call(path, 'DELETE')
+
+    async def get_permission(self, vname, username):
+        """See :meth:`pyrabbit.api.Client.get_permission`."""
+        path = self.urls['vhost_permissions'] % (quote(vname, ''), username)
+        return await self._call(path, 'GET')
+
+    ###############################################
+    ##           EXCHANGES
+    ###############################################
+    async def get_exchanges(self, vhost=None):
+        """See :meth:`pyrabbit.api.Client.get_exchanges`."""
+        if vhost:
+            path = self.urls['exchanges_by_vhost'] % quote(vhost, '')
+        else:
+            path = self.urls['all_exchanges']
+        return await self._call(path, 'GET')
+
+    async def get_exchange(self, vhost, name):
+        """See :meth:`pyrabbit.api.Client.get_exchange`."""
+        path = self.urls['exchange_by_name'] % (quote(vhost, ''),
+                                                quote(name, ''))
+        return await self._call(path, 'GET')
+
+    async def create_exchange(self, vhost, name, xtype, auto_delete=False,
+                              durable=True, internal=False, arguments=None):
+        """See :meth:`pyrabbit.api.Client.create_exchange`."""
+        path = self.urls['exchange_by_name'] % (quote(vhost, ''),
+                                                quote(name, ''))
+        body = self.codec.dumps({"type": xtype, "auto_delete": auto_delete,
+                           "durable": durable, "internal": internal,
+                           "arguments": arguments or list()})
+        await self._call(path, 'PUT', body, headers=self.json_headers)
+        return True
+
+    async def publish(self, vhost, xname, rt_key, payload,
+                      payload_enc='string', properties=None):
+        """See :meth:`pyrabbit.api.Client.publish`."""
+        path = self.urls['publish_to_exchange'] % (quote(vhost, ''),
+                                                   quote(xname, ''))
+        body = self.codec.dumps({'routing_key': rt_key, 'payload': payload,
+                           'payload_encoding': payload_enc,
+                           'properties': properties or {}})
+        result = await self._call(path, 'POST', body)
+        return result['routed']
+
+    async def delete_exchange(self, vhost, name):
+        """See :meth:`pyrabbit.api.Client.delete_exchange`."""
+        path = self.urls['exchange_by_name'] % (quote(vhost, ''),
+                                                quote(name, ''))
+        await self._call(path, 'DELETE')
+        return True
+
+    #############################################
+    ##              QUEUES
+    #############################################
+    async def get_queues(self, vhost=None):
+        """See :meth:`pyrabbit.api.Client.get_queues`."""
+        if vhost:
+            path = self.urls['queues_by_vhost'] % quote(vhost, '')
+        else:
+            path = self.urls['all_queues']
+        queues = await self._call(path, 'GET')
+        return queues or list()
+
+    async def get_queue(self, vhost, name):
+        """See :meth:`pyrabbit.api.Client.get_queue`."""
+        path = self.urls['queues_by_name'] % (quote(vhost, ''),
+                                              quote(name, ''))
+        return await self._call(path, 'GET')
+
+    async def get_queue_depth(self, vhost, name):
+        """See :meth:`pyrabbit.api.Client.get_queue_depth`."""
+        queue = await self.get_queue(vhost, name)
+        return queue['messages']
+
+    async def purge_queue(self, vhost, name):
+        """See :meth:`pyrabbit.api.Client.purge_queue`."""
+        path = self.urls['purge_queue'] % (quote(vhost, ''), quote(name, ''))
+        return await self._call(path, 'DELETE')
+
+    async def create_queue(self, vhost, name, **kwargs):
+        """See :meth:`pyrabbit.api.Client.create_queue`."""
+        path = self.urls['queues_by_name'] % (quote(vhost, ''),
+                                              quote(name, ''))
+        return await self._call(path, 'PUT', self.codec.dumps(kwargs),
+                                headers=self.json_headers)
+
+    async def delete_queue(self, vhost, qname):
+        """See :meth:`pyrabbit.api.Client.delete_queue`."""
+        path = self.urls['queues_by_name'] % (quote(vhost, ''),
+                                              quote(qname, ''))
+        return await self._call(path, 'DELETE', headers=self.json_headers)
+
+    async def get_messages(self, vhost, qname, count=1, requeue=False,
+                           truncate=None, encoding='auto'):
+        """See :meth:`pyrabbit.api.Client.get_messages`."""
+        base_body = {'count': count, 'requeue': requeue, 'encoding': encoding}
+        if truncate:
+            base_body['truncate'] = truncate
+        path = self.urls['get_from_queue'] % (quote(vhost, ''),
+                                              quote(qname, ''))
+        return await self._call(path, 'POST', self.codec.dumps(base_body),
+                                headers=self.json_headers)
+
+    #########################################
+    # CONNS/CHANS & BINDINGS
+    #########################################
+    async def get_connections(self):
+        """See :meth:`pyrabbit.api.Client.get_connections`."""
+        return await self._call(self.urls['all_connections'], 'GET')
+
+    async def get_connection(self, name):
+        """See :meth:`pyrabbit.api.Client.get_connection`."""
+        path = self.urls['connections_by_name'] % quote(name, '')
+        return await self._call(path, 'GET')
+
+    async def delete_connection(self, name):
+        """See :meth:`pyrabbit.api.Client.delete_connection`."""
+        path = self.urls['connections_by_name'] % quote(name, '')
+        await self._call(path, 'DELETE')
+        return True
+
+    async def get_channels(self):
+        """See :meth:`pyrabbit.api.Client.get_channels`."""
+        return await self._call(self.urls['all_channels'], 'GET')
+
+    async def get_channel(self, name):
+        """See :meth:`pyrabbit.api.Client.get_channel`."""
+        path = self.urls['channels_by_name'] % quote(name, '')
+        return await self._call(path, 'GET')
+
+    async def get_bindings(self, vhost=None):
+        """See :meth:`pyrabbit.api.Client.get_bindings`."""
+        if vhost:
+            path = self.urls['bindings_by_vhost'] % quote(vhost, '')
+        else:
+            path = self.urls['all_bindings']
+        return await self._call(path, 'GET')
+
+    async def get_queue_bindings(self, vhost, qname):
+        """See :meth:`pyrabbit.api.Client.get_queue_bindings`."""
+        path = self.urls['bindings_on_queue'] % (quote(vhost, ''),
+                                                 quote(qname, ''))
+        return await self._call(path, 'GET')
+
+    async def create_binding(self, vhost, exchange, queue, rt_key=None,
+                             args=None):
+        """See :meth:`pyrabbit.api.Client.create_binding`."""
+        body = self.codec.dumps({'routing_key': rt_key, 'arguments': args or []})
+        path = self.urls['bindings_between_exch_queue'] % (
+            quote(vhost, ''), quote(exchange, ''), quote(queue, ''))
+        return await self._call(path, 'POST', body=body,
+                                headers=self.json_headers)
+
+    async def delete_binding(self, vhost, exchange, queue, rt_key):
+        """See :meth:`pyrabbit.api.Client.delete_binding`."""
+        path = self.urls['rt_bindings_between_exch_queue'] % (
+            quote(vhost, ''), quote(exchange, ''), quote(queue, ''), rt_key)
+        return await self._call(path, 'DELETE', headers=self.json_headers)
+
+    async def create_user(self, username, password, tags="",
+                          password_hash=None):
+        """See :meth:`pyrabbit.api.Client.create_user`."""
+        path = self.urls['users_by_name'] % username
+        user = {'tags': tags}
+        if password_hash is not None:
+            user['password_hash'] = password_hash
+        else:
+            user['password'] = password
+        body = self.codec.dumps(user)
+        return await self._call(path, 'PUT', body=body,
+                                headers=self.json_headers)
+
+    async def delete_user(self, username):
+        """See :meth:`pyrabbit.api.Client.delete_user`."""
+        path = self.urls['users_by_name'] % username
+        return await self._call(path, 'DELETE')
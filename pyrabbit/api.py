@@ -5,14 +5,24 @@ decorators used by the class.
 """
 
 from . import http
+from .bulk import BulkResult, PublishResult, run_concurrently, run_streaming
+from .cache import ResponseCache
+from .metrics import Metrics
+from . import definitions
+from . import records
+from .records import _string_types
+import base64
+import collections
 import functools
-import json
+import re
+import threading
+import time
 try:
     # python 2.x
-    from urllib import quote
+    from urllib import quote, urlencode
 except ImportError:
     # python 3.x
-    from urllib.parse import quote
+    from urllib.parse import quote, urlencode
 
 
 class APIError(Exception):
@@ -31,6 +41,117 @@ class PermissionError(Exception):
     pass
 
 
+def _raise_for_http_error(err, path, user):
+    """
+    Translate an :class:`http.HTTPError` into one of our own exceptions where
+    we have a more specific one. Returns quietly otherwise, so callers can
+    re-raise the original error.
+
+    """
+    if err.status == 401:
+        raise PermissionError('Insufficient permissions to query ' +
+            '%s with user %s :%s' % (path, user, err))
+
+
+_routes = None
+_routes_lock = threading.Lock()
+_route_memo = {}
+
+
+def _compiled_routes():
+    """
+    The (regex, key) pairs for :attr:`Client.urls`, compiled on first use.
+    The table is built in full before it's published, so callers on other
+    threads never see part of it.
+
+    """
+    global _routes
+    routes = _routes
+    if routes is None:
+        with _routes_lock:
+            routes = _routes
+            if routes is None:
+                routes = []
+                for key, template in sorted(Client.urls.items()):
+                    pattern = '/'.join('[^/]+' if part == '%s' else
+                                       re.escape(part)
+                                       for part in template.split('/'))
+                    routes.append((re.compile(pattern + '$'), key))
+                _routes = routes
+    return routes
+
+
+def _endpoint_for(path):
+    """
+    Work out which :attr:`Client.urls` entry *path* was built from, e.g.
+    'queues/%2F/myqueue' -> 'queues_by_name'. Returns None for paths that
+    don't match any entry.
+
+    """
+    path = path.split('?', 1)[0]
+    try:
+        return _route_memo[path]
+    except KeyError:
+        pass
+    endpoint = None
+    for regex, key in _compiled_routes():
+        if regex.match(path):
+            endpoint = key
+            break
+    if len(_route_memo) >= 4096:
+        # Paths embed object names, so there's no bound on how many we see.
+        _route_memo.clear()
+    _route_memo[path] = endpoint
+    return endpoint
+
+
+def _payload_size(message):
+    """
+    The size in bytes of *message*'s payload once decoded, worked out
+    without decoding base64 payloads.
+
+    """
+    payload = message.get('payload') or ''
+    if message.get('payload_encoding') == 'base64':
+        return len(payload) // 4 * 3 - len(payload) + len(payload.rstrip('='))
+    if isinstance(payload, bytes):
+        return len(payload)
+    return len(payload.encode('utf-8'))
+
+
+class _Prefetch(object):
+    """
+    Runs a single call in a background thread so the caller can do other
+    work while it's in flight. :meth:`result` waits for the call and returns
+    its value or re-raises its exception.
+
+    """
+    def __init__(self, func, *args):
+        self._value = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(func, args))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, func, args):
+        try:
+            self._value = func(*args)
+        except Exception as err:
+            self._error = err
+
+    def result(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+#: Message counts for a queue, as returned by :meth:`Client.get_queue_depths`.
+#: ``messages`` is the total, the sum of the other two.
+QueueDepth = collections.namedtuple(
+    'QueueDepth', ['messages', 'messages_ready', 'messages_unacknowledged'])
+
+
 class Client(object):
     """
     Abstraction of the RabbitMQ Management HTTP API.
@@ -48,6 +169,7 @@ class Client(object):
             'all_users': 'users',
             'all_permissions': 'permissions',
             'all_bindings': 'bindings',
+            'bindings_by_vhost': 'bindings/%s',
             'whoami': 'whoami',
             'queues_by_vhost': 'queues/%s',
             'queues_by_name': 'queues/%s/%s',
@@ -62,57 +184,299 @@ class Client(object):
             'bindings_on_queue': 'queues/%s/%s/bindings',
             'bindings_between_exch_queue': 'bindings/%s/e/%s/q/%s',
             'rt_bindings_between_exch_queue': 'bindings/%s/e/%s/q/%s/%s',
+            'bindings_between_exchs': 'bindings/%s/e/%s/e/%s',
+            'rt_bindings_between_exchs': 'bindings/%s/e/%s/e/%s/%s',
             'get_from_queue': 'queues/%s/%s/get',
             'publish_to_exchange': 'exchanges/%s/%s/publish',
             'vhosts_by_name': 'vhosts/%s',
             'vhost_permissions': 'permissions/%s/%s',
             'users_by_name': 'users/%s',
             'user_permissions': 'users/%s/permissions',
-            'vhost_permissions_get': 'vhosts/%s/permissions'
+            'vhost_permissions_get': 'vhosts/%s/permissions',
+            'definitions': 'definitions',
+            'definitions_by_vhost': 'definitions/%s'
             }
 
     json_headers = {"content-type": "application/json"}
 
-    def __init__(self, api_url, user, passwd, timeout=5, scheme='http'):
-        """
-        :param string api_url: base url for the broker API
+    #: Above this many names, :meth:`get_queue_depths` lists the whole vhost
+    #: once instead of fetching each queue separately.
+    depth_listing_threshold = 8
+
+    #: :meth:`iter_messages` sizes its batches to take about this many
+    #: seconds to fetch...
+    message_batch_seconds = 0.25
+    #: ...and to hold no more than about this many bytes of payload.
+    message_batch_bytes = 4 << 20
+
+    def __init__(self, api_url, user, passwd, timeout=5, scheme='http',
+                 pool_connections=10, pool_maxsize=10, pool_block=False,
+                 pool_idle_timeout=None, max_concurrency=1, cache=None,
+                 coalesce=False, result_type='dicts', probe_interval=5,
+                 hedge=None, retry=None, circuit_breaker=None, metrics=None,
+                 transport=None, codec=None):
+        """
+        :param api_url: base url for the broker API, or a list of them to
+            spread calls over the nodes of a cluster. See
+            :class:`pyrabbit.http.HTTPClient` for how calls are routed.
         :param string user: Username used to authenticate to the API.
         :param string passwd: Password used to authenticate to the API.
         :param int timeout: Integer number of seconds to wait for each call.
         :param string scheme: HTTP scheme used to make the connection
+        :param int pool_connections: Number of per-host connection pools the
+            HTTP client keeps around.
+        :param int pool_maxsize: Maximum number of keep-alive connections to
+            any one host.
+        :param bool pool_block: Wait for a free pooled connection instead of
+            opening extra, throwaway ones once *pool_maxsize* is reached.
+        :param int pool_idle_timeout: Seconds of inactivity after which
+            pooled connections are dropped. None keeps them until
+            :meth:`close`.
+        :param int max_concurrency: Default number of calls the bulk methods
+            (:meth:`purge_queues`, :meth:`delete_queues`, etc.) keep in
+            flight at once. Keep it at or below *pool_maxsize* so every
+            worker gets a pooled connection.
+        :param cache: Cache responses from slow-changing endpoints like
+            the overview, nodes, vhosts, users and permissions. Pass True
+            for a :class:`pyrabbit.cache.ResponseCache` with the default
+            TTLs, or a ResponseCache configured to taste. Off by default.
+        :param bool coalesce: Let identical GETs made concurrently from
+            several threads share a single request. See
+            :attr:`pyrabbit.http.HTTPClient.coalesce_stats` for how many
+            requests this saved.
+        :param string result_type: 'dicts' (the default) to get API objects
+            back as plain dicts, or 'records' to get compact
+            :mod:`pyrabbit.records` objects from the queue, exchange,
+            binding, connection, channel and node methods.
+        :param int probe_interval: With several API urls, seconds between
+            checks of whether a failed node has recovered.
+        :param hedge: A :class:`pyrabbit.http.HedgePolicy` to send a
+            duplicate of any GET that's slow to be answered to another node,
+            using whichever response comes first. Off by default.
+        :param retry: A :class:`pyrabbit.http.RetryPolicy` to retry
+            idempotent calls that fail with a network error or a transient
+            5xx status, with jittered exponential backoff and a retry
+            budget. Off by default.
+        :param circuit_breaker: A :class:`pyrabbit.http.CircuitBreaker`
+            configuring a breaker per node that fails calls fast with
+            :class:`pyrabbit.http.CircuitOpenError` while the node keeps
+            failing. Off by default.
+        :param metrics: Record latency, payload sizes, decode time,
+            statuses and errors of every call, per :attr:`urls` entry. Pass
+            True for a new :class:`pyrabbit.metrics.Metrics`, or one to
+            share between clients. The recorder is available as
+            :attr:`metrics`. Off by default.
+        :param transport: How calls are sent: ``'requests'`` (the
+            default), ``'stdlib'`` for the standard library's http.client,
+            which starts up much faster, or an object such as a
+            :class:`pyrabbit.testing.FakeBroker`. See
+            :class:`pyrabbit.http.HTTPClient`.
+        :param codec: The JSON codec for request and response bodies:
+            ``'json'``, ``'orjson'``, or ``'auto'`` (the default) for orjson
+            if it's installed. See :mod:`pyrabbit.codec`.
 
         Populates server attributes using passed-in parameters and
         the HTTP API's 'overview' information.
+
+        The client holds pooled connections open between calls; use it as a
+        context manager, or call :meth:`close`, to release them.
         """
         self.api_url = api_url
         self.user = user
         self.passwd = passwd
         self.timeout = timeout
         self.scheme = scheme
+        self.max_concurrency = max_concurrency
+        if result_type not in ('dicts', 'records'):
+            raise ValueError("result_type must be 'dicts' or 'records', "
+                             "not %r" % (result_type,))
+        self.result_type = result_type
+        if cache is True:
+            cache = ResponseCache()
+        elif cache is False:
+            cache = None
+        self.cache = cache
+        if metrics is True:
+            metrics = Metrics()
+        elif metrics is False:
+            metrics = None
+        self.metrics = metrics
         self.http = http.HTTPClient(
             self.api_url,
             self.user,
             self.passwd,
             self.timeout,
-            self.scheme
+            self.scheme,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            pool_idle_timeout=pool_idle_timeout,
+            coalesce=coalesce,
+            probe_interval=probe_interval,
+            hedge=hedge,
+            retry=retry,
+            circuit_breaker=circuit_breaker,
+            metrics=metrics,
+            transport=transport,
+            codec=codec
         )
+        self.codec = self.http.codec
 
         return
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Release the pooled HTTP connections held by this client.
+
+        """
+        self.http.close()
+
     def _call(self, path, method, body=None, headers=None):
         """
         Wrapper around http.do_call that transforms some HTTPError into
-        our own exceptions
+        our own exceptions, and serves GETs from the response cache when
+        one is configured.
+        """
+        if self.cache is not None:
+            return self._cached_call(path, method, body, headers)
+        return self._uncached_call(path, method, body, headers)
+
+    def _cached_call(self, path, method, body=None, headers=None):
+        endpoint = _endpoint_for(path)
+        if method == 'GET' and self.cache.cacheable(endpoint):
+            hit, resp = self.cache.get(path)
+            if hit:
+                return resp
+            resp = self._uncached_call(path, method, body, headers,
+                                       endpoint)
+            self.cache.set(endpoint, path, resp)
+            return resp
+
+        try:
+            return self._uncached_call(path, method, body, headers, endpoint)
+        finally:
+            if method != 'GET':
+                self.cache.invalidate_for_write(endpoint)
+
+    def _uncached_call(self, path, method, body=None, headers=None,
+                       endpoint=None):
+        try:
+            if self.metrics is None:
+                return self.http.do_call(path, method, body, headers)
+            return self.http.do_call(path, method, body, headers,
+                                     label=endpoint or _endpoint_for(path))
+        except http.HTTPError as err:
+            _raise_for_http_error(err, path, self.user)
+            raise
+
+    def _records(self, record_class, data):
+        """
+        Convert *data* to instances of *record_class* if this client was
+        asked for records rather than dicts.
+        """
+        if self.result_type == 'records':
+            return records.wrap(record_class, data)
+        return data
+
+    def _stream(self, path):
+        """
+        Like :meth:`_call` for GETs of list endpoints, but returns a
+        generator that decodes the listing incrementally as it arrives.
         """
         try:
-            resp = self.http.do_call(path, method, body, headers)
+            if self.metrics is None:
+                return self.http.stream_call(path, 'GET')
+            return self.http.stream_call(path, 'GET',
+                                         label=_endpoint_for(path))
         except http.HTTPError as err:
-            if err.status == 401:
-                raise PermissionError('Insufficient permissions to query ' +
-                    '%s with user %s :%s' % (path, self.user, err))
+            _raise_for_http_error(err, path, self.user)
             raise
-        return resp
 
+    @staticmethod
+    def _with_query(path, params):
+        """
+        Append *params* to *path* as a query string, skipping any whose
+        value is None. Booleans are sent the way the API expects them.
+
+        """
+        query = []
+        for key in sorted(params):
+            value = params[key]
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = 'true' if value else 'false'
+            query.append((key, value))
+        if not query:
+            return path
+        return '%s?%s' % (path, urlencode(query))
+
+    @staticmethod
+    def _columns(columns):
+        """
+        Format a list of field names for the API's 'columns' parameter.
+        Nested fields are given in dotted form, e.g.
+        'message_stats.publish_details.rate'.
+
+        """
+        if columns is None:
+            return None
+        if isinstance(columns, (list, tuple, set, frozenset)):
+            columns = ','.join(columns)
+        return columns
+
+    def _iter_pages(self, path, page_size, name, use_regex, prefetch,
+                    columns=None):
+        """
+        Walk a paginated listing one page at a time, yielding its items.
+        With *prefetch*, the next page is requested while the current one
+        is being consumed.
+
+        """
+        def fetch(page):
+            params = {'page': page, 'page_size': page_size, 'name': name,
+                      'use_regex': use_regex or None,
+                      'columns': self._columns(columns)}
+            return self._call(self._with_query(path, params), 'GET')
+
+        resp = fetch(1)
+        while True:
+            if not isinstance(resp, dict):
+                # Servers without pagination support send back the plain,
+                # complete listing.
+                for item in resp or []:
+                    yield item
+                return
+
+            page = resp.get('page', 1)
+            more = page < resp.get('page_count', 0)
+            pending = None
+            if more and prefetch:
+                pending = _Prefetch(fetch, page + 1)
+
+            for item in resp.get('items', []):
+                yield item
+
+            if not more:
+                return
+            resp = pending.result() if pending else fetch(page + 1)
+
+    def _bulk(self, func, items, concurrency=None):
+        """
+        Run *func* over *items* (each a tuple of positional arguments) using
+        up to *concurrency* worker threads, defaulting to the client's
+        *max_concurrency*.
+
+        """
+        if concurrency is None:
+            concurrency = self.max_concurrency
+        return run_concurrently(lambda args: func(*args), items, concurrency)
 
     def is_alive(self, vhost='%2F'):
         """
@@ -177,7 +541,7 @@ class Client(object):
 
         """
         nodes = self._call(Client.urls['all_nodes'], 'GET')
-        return nodes
+        return self._records(records.Node, nodes)
 
     def get_users(self):
         """
@@ -190,6 +554,79 @@ class Client(object):
         users = self._call(Client.urls['all_users'], 'GET')
         return users
 
+    def get_definitions(self, vhost=None):
+        """
+        Export the broker's topology as a definitions document.
+
+        :param string vhost: Only export the exchanges, queues and bindings
+            of this vhost. If None (the default), export everything.
+        :returns dict: A definitions document. See
+            :mod:`pyrabbit.definitions`.
+        """
+        if vhost:
+            path = Client.urls['definitions_by_vhost'] % quote(vhost, '')
+        else:
+            path = Client.urls['definitions']
+        return self._call(path, 'GET')
+
+    def apply_definitions(self, defs, vhost=None, chunk_size=5000):
+        """
+        Create many objects at once by importing a definitions document,
+        instead of making one create_* call per object.
+
+        Large documents are sent in chunks of *chunk_size* objects, in
+        dependency order (vhosts and users first, bindings last). The broker
+        imports a document all-or-nothing, so when a chunk is rejected it is
+        split in half and each half retried, until the objects at fault are
+        isolated. Everything else still gets applied.
+
+        :param defs: A :class:`pyrabbit.definitions.Definitions`, or a
+            definitions document as a dict.
+        :param string vhost: Import into this vhost only. Objects then don't
+            need a 'vhost' field, and the document may only hold exchanges,
+            queues and bindings.
+        :param int chunk_size: Maximum number of objects per request.
+        :returns: :class:`pyrabbit.bulk.BulkResult`, with one
+            ('section', object) item per object. It's truthy only if every
+            object was applied.
+        :raises: PermissionError if the user can't import definitions.
+        """
+        if not isinstance(defs, definitions.Definitions):
+            defs = definitions.Definitions(defs)
+        if vhost:
+            for section in definitions.GLOBAL_SECTIONS:
+                if defs.sections[section]:
+                    raise ValueError("'%s' can't be imported into a single "
+                                     "vhost" % section)
+            path = Client.urls['definitions_by_vhost'] % quote(vhost, '')
+        else:
+            path = Client.urls['definitions']
+
+        result = BulkResult()
+        items = list(defs.items())
+        for start in range(0, len(items), chunk_size):
+            self._import_chunk(path, items[start:start + chunk_size], result)
+        return result
+
+    def _import_chunk(self, path, items, result):
+        body = self.codec.dumps(definitions.document_for(items))
+        try:
+            self._call(path, 'POST', body, headers=Client.json_headers)
+        except http.HTTPError as err:
+            if len(items) == 1:
+                result.errors.append((items[0], err))
+                return
+            # Bisect to find out which objects the broker objects to.
+            middle = len(items) // 2
+            self._import_chunk(path, items[:middle], result)
+            self._import_chunk(path, items[middle:], result)
+            return
+        except http.NetworkError as err:
+            # We can't tell what, if anything, was applied.
+            result.errors.extend((item, err) for item in items)
+            return
+        result.results.extend((item, True) for item in items)
+
     ################################################
     ###         VHOSTS
     ################################################
@@ -305,7 +742,7 @@ class Client(object):
         http://www.rabbitmq.com/admin-guide.html#access-control
         """
         vname = quote(vname, '')
-        body = json.dumps({"configure": config, "read": rd, "write": wr})
+        body = self.codec.dumps({"configure": config, "read": rd, "write": wr})
         path = Client.urls['vhost_permissions'] % (vname, username)
         return self._call(path, 'PUT', body,
                                  headers=Client.json_headers)
@@ -336,11 +773,14 @@ class Client(object):
     ###############################################
     ##           EXCHANGES
     ###############################################
-    def get_exchanges(self, vhost=None):
+    def get_exchanges(self, vhost=None, stream=False):
         """
         :returns: A list of dicts
         :param string vhost: A vhost to query for exchanges, or None (default),
             which triggers a query for all exchanges in all vhosts.
+        :param bool stream: If True, return a generator that decodes the
+            exchanges one at a time as the response arrives, instead of a
+            list. Memory use then stays flat however large the listing is.
 
         """
         if vhost:
@@ -349,8 +789,40 @@ class Client(object):
         else:
             path = Client.urls['all_exchanges']
 
+        if stream:
+            return self._records(records.Exchange, self._stream(path))
         exchanges = self._call(path, 'GET')
-        return exchanges
+        return self._records(records.Exchange, exchanges)
+
+    def iter_exchanges(self, vhost=None, page_size=100, name=None,
+                       use_regex=False, prefetch=True, columns=None):
+        """
+        Like :meth:`get_exchanges`, but fetches the listing a page at a time
+        using the API's server-side pagination and yields one exchange at a
+        time, so the whole listing is never held in memory at once.
+
+        :param string vhost: A vhost to list exchanges for, or None (default)
+            for all exchanges in all vhosts.
+        :param int page_size: Number of exchanges to fetch per request.
+        :param string name: Only list exchanges whose name contains this
+            string (or matches it as a regex if *use_regex* is True).
+        :param bool use_regex: Treat *name* as a regular expression.
+        :param bool prefetch: Fetch the next page while the current one is
+            being consumed.
+        :param list columns: Only return these fields of each exchange.
+            Nested fields are given in dotted form, e.g.
+            'message_stats.publish_details.rate'.
+        :returns: a generator of dicts, each representing an exchange.
+
+        """
+        if vhost:
+            vhost = quote(vhost, '')
+            path = Client.urls['exchanges_by_vhost'] % vhost
+        else:
+            path = Client.urls['all_exchanges']
+        pages = self._iter_pages(path, page_size, name, use_regex, prefetch,
+                                 columns)
+        return self._records(records.Exchange, pages)
 
     def get_exchange(self, vhost, name):
         """
@@ -365,7 +837,7 @@ class Client(object):
         name = quote(name, '')
         path = Client.urls['exchange_by_name'] % (vhost, name)
         exch = self._call(path, 'GET')
-        return exch
+        return self._records(records.Exchange, exch)
 
     def create_exchange(self,
                         vhost,
@@ -410,7 +882,7 @@ class Client(object):
                      "durable": durable, "internal": internal,
                      "arguments": arguments or list()}
 
-        body = json.dumps(base_body)
+        body = self.codec.dumps(base_body)
         self._call(path, 'PUT', body,
                           headers=Client.json_headers)
         return True
@@ -432,12 +904,64 @@ class Client(object):
         vhost = quote(vhost, '')
         xname = quote(xname, '')
         path = Client.urls['publish_to_exchange'] % (vhost, xname)
-        body = json.dumps({'routing_key': rt_key, 'payload': payload,
+        body = self.codec.dumps({'routing_key': rt_key, 'payload': payload,
                            'payload_encoding': payload_enc,
                            'properties': properties or {}})
         result = self._call(path, 'POST', body)
         return result['routed']
 
+    def publish_many(self, vhost, xname, messages, concurrency=None):
+        """
+        Publish many messages to an exchange, with up to *concurrency*
+        publishes in flight at once over the client's pooled connections.
+        A failure to publish one message doesn't stop the others.
+
+        Messages are taken from *messages* as they're needed, so it can be
+        a generator of any length. Payloads that are bytes (or a bytearray
+        or memoryview) are sent base64 encoded; str payloads as they are.
+
+        :param string vhost: vhost housing the target exchange
+        :param string xname: name of the target exchange
+        :param iterable messages: ``(routing_key, payload)`` or
+            ``(routing_key, payload, properties)`` tuples.
+        :param int concurrency: Maximum number of publishes in flight.
+            Defaults to the client's *max_concurrency*.
+        :returns: :class:`pyrabbit.bulk.PublishResult`, with the number of
+            messages routed and unrouted, any errors, and the rate achieved.
+        """
+        vhost = quote(vhost, '')
+        xname = quote(xname, '')
+        path = Client.urls['publish_to_exchange'] % (vhost, xname)
+        if concurrency is None:
+            concurrency = self.max_concurrency
+        result = PublishResult()
+
+        def publish(message):
+            body = self._publish_body(*message)
+            return self._call(path, 'POST', body)['routed']
+
+        def done(message, ok, value):
+            if not ok:
+                result.errors.append((message, value))
+            elif value:
+                result.routed += 1
+            else:
+                result.unrouted += 1
+
+        result.seconds = run_streaming(publish, messages, done, concurrency)
+        return result
+
+    def _publish_body(self, rt_key, payload, properties=None):
+        body = {'routing_key': rt_key, 'properties': properties or {}}
+        if (isinstance(payload, (bytes, bytearray, memoryview)) and
+                not isinstance(payload, _string_types)):
+            body['payload'] = base64.b64encode(payload).decode('ascii')
+            body['payload_encoding'] = 'base64'
+        else:
+            body['payload'] = payload
+            body['payload_encoding'] = 'string'
+        return self.codec.dumps(body)
+
     def delete_exchange(self, vhost, name):
         """
         Delete the named exchange from the named vhost. The API returns a 204
@@ -454,10 +978,23 @@ class Client(object):
         self._call(path, 'DELETE')
         return True
 
+    def delete_exchanges(self, exchanges, concurrency=None):
+        """
+        Delete many exchanges, running up to *concurrency* deletes at once.
+        A failure to delete one exchange doesn't stop the others.
+
+        :param list exchanges: A list of ('vhost', 'name') tuples.
+        :param int concurrency: Maximum number of calls in flight. Defaults
+            to the client's *max_concurrency*.
+        :returns: :class:`pyrabbit.bulk.BulkResult`, which is truthy only if
+            every exchange was deleted.
+        """
+        return self._bulk(self.delete_exchange, exchanges, concurrency)
+
     #############################################
     ##              QUEUES
     #############################################
-    def get_queues(self, vhost=None):
+    def get_queues(self, vhost=None, columns=None, stream=False):
         """
         Get all queues, or all queues in a vhost if vhost is not None.
         Returns a list.
@@ -465,6 +1002,14 @@ class Client(object):
         :param string vhost: The virtual host to list queues for. If This is
                     None (the default), all queues for the broker instance
                     are returned.
+        :param list columns: Only return these fields of each queue, e.g.
+                    ['name', 'vhost', 'messages', 'consumers']. Nested fields
+                    are given in dotted form, e.g.
+                    'message_stats.publish_details.rate'.
+        :param bool stream: If True, return a generator that decodes queues
+                    one at a time as the response arrives, instead of a
+                    list. Memory use then stays flat however many queues
+                    the broker has.
         :returns: A list of dicts, each representing a queue.
         :rtype: list of dicts
 
@@ -475,8 +1020,41 @@ class Client(object):
         else:
             path = Client.urls['all_queues']
 
+        path = self._with_query(path, {'columns': self._columns(columns)})
+        if stream:
+            return self._records(records.Queue, self._stream(path))
         queues = self._call(path, 'GET')
-        return queues or list()
+        return self._records(records.Queue, queues or list())
+
+    def iter_queues(self, vhost=None, page_size=100, name=None,
+                    use_regex=False, prefetch=True, columns=None):
+        """
+        Like :meth:`get_queues`, but fetches the listing a page at a time
+        using the API's server-side pagination and yields one queue at a
+        time, so the whole listing is never held in memory at once.
+
+        :param string vhost: The virtual host to list queues for, or None
+            (default) for all queues on the broker.
+        :param int page_size: Number of queues to fetch per request.
+        :param string name: Only list queues whose name contains this string
+            (or matches it as a regex if *use_regex* is True).
+        :param bool use_regex: Treat *name* as a regular expression.
+        :param bool prefetch: Fetch the next page while the current one is
+            being consumed.
+        :param list columns: Only return these fields of each queue.
+            Nested fields are given in dotted form, e.g.
+            'message_stats.publish_details.rate'.
+        :returns: a generator of dicts, each representing a queue.
+
+        """
+        if vhost:
+            vhost = quote(vhost, '')
+            path = Client.urls['queues_by_vhost'] % vhost
+        else:
+            path = Client.urls['all_queues']
+        pages = self._iter_pages(path, page_size, name, use_regex, prefetch,
+                                 columns)
+        return self._records(records.Queue, pages)
 
     def get_queue(self, vhost, name):
         """
@@ -494,7 +1072,7 @@ class Client(object):
         name = quote(name, '')
         path = Client.urls['queues_by_name'] % (vhost, name)
         queue = self._call(path, 'GET')
-        return queue
+        return self._records(records.Queue, queue)
 
     def get_queue_depth(self, vhost, name):
         """
@@ -516,45 +1094,68 @@ class Client(object):
 
         return depth
 
-    def get_queue_depths(self, vhost, names=None):
+    def get_queue_depths(self, vhost, names=None, concurrency=None):
         """
         Get the number of messages currently sitting in either the queue
         names listed in 'names', or all queues in 'vhost' if no 'names' are
         given.
 
+        Only the message counts are requested from the API. For all queues,
+        or many names, that's done with a single listing of the vhost that's
+        filtered here; for a handful of names (up to
+        :attr:`depth_listing_threshold`) each queue is fetched on its own,
+        *concurrency* at a time, which is cheaper than listing a big vhost.
+
         :param str vhost: Vhost where queues in 'names' live.
-        :param list names: OPTIONAL - Specific queues to show depths for. If
-                None, show depths for all queues in 'vhost'.
+        :param list names: OPTIONAL - Specific queues to get depths for. If
+                None, get depths for all queues in 'vhost'.
+        :param int concurrency: Maximum number of single-queue calls in
+                flight. Defaults to the client's *max_concurrency*.
+        :returns: a dict mapping queue name to a :class:`QueueDepth`. Named
+                queues that don't exist are left out.
+        :rtype: dict
         """
-
         vhost = quote(vhost, '')
-        if not names:
-            # get all queues in vhost
-            path = Client.urls['queues_by_vhost'] % vhost
-            queues = self._call(path, 'GET')
-            for queue in queues:
-                depth = queue['messages']
-                print("\t%s: %s" % (queue, depth))
+        columns = self._columns(QueueDepth._fields + ('name',))
+
+        if names and len(names) <= self.depth_listing_threshold:
+            def fetch(name):
+                path = Client.urls['queues_by_name'] % (vhost, quote(name, ''))
+                return self._call(self._with_query(path, {'columns': columns}),
+                                  'GET')
+
+            result = run_concurrently(fetch, names,
+                                      concurrency or self.max_concurrency)
+            for name, err in result.errors:
+                if not (isinstance(err, http.HTTPError) and err.status == 404):
+                    raise err
+            queues = [queue for name, queue in result.results]
         else:
-            # get the named queues only.
-            for name in names:
-                depth = self.get_queue_depth(vhost, name)
-                print("\t%s: %s" % (name, depth))
+            path = Client.urls['queues_by_vhost'] % vhost
+            queues = self._call(self._with_query(path, {'columns': columns}),
+                                'GET') or []
+            if names:
+                wanted = set(names)
+                queues = [q for q in queues if q['name'] in wanted]
+
+        return dict((q['name'], QueueDepth(*[q.get(field) or 0
+                                             for field in QueueDepth._fields]))
+                    for q in queues)
 
-    def purge_queues(self, queues):
+    def purge_queues(self, queues, concurrency=None):
         """
-        Purge all messages from one or more queues.
+        Purge all messages from one or more queues, running up to
+        *concurrency* purges at once. A failure to purge one queue doesn't
+        stop the others.
 
-        :param list queues: A list of ('qname', 'vhost') tuples.
-        :returns: True on success
+        :param list queues: A list of ('vhost', 'qname') tuples.
+        :param int concurrency: Maximum number of calls in flight. Defaults
+            to the client's *max_concurrency*.
+        :returns: :class:`pyrabbit.bulk.BulkResult`, which is truthy only if
+            every queue was purged.
 
         """
-        for name, vhost in queues:
-            vhost = quote(vhost, '')
-            name = quote(name, '')
-            path = Client.urls['purge_queue'] % (vhost, name)
-            self._call(path, 'DELETE')
-        return True
+        return self._bulk(self.purge_queue, queues, concurrency)
 
     def purge_queue(self, vhost, name):
         """
@@ -590,7 +1191,7 @@ class Client(object):
         name = quote(name, '')
         path = Client.urls['queues_by_name'] % (vhost, name)
 
-        body = json.dumps(kwargs)
+        body = self.codec.dumps(kwargs)
 
         return self._call(path,
                                  'PUT',
@@ -612,6 +1213,19 @@ class Client(object):
         path = Client.urls['queues_by_name'] % (vhost, qname)
         return self._call(path, 'DELETE', headers=Client.json_headers)
 
+    def delete_queues(self, queues, concurrency=None):
+        """
+        Delete many queues, running up to *concurrency* deletes at once. A
+        failure to delete one queue doesn't stop the others.
+
+        :param list queues: A list of ('vhost', 'qname') tuples.
+        :param int concurrency: Maximum number of calls in flight. Defaults
+            to the client's *max_concurrency*.
+        :returns: :class:`pyrabbit.bulk.BulkResult`, which is truthy only if
+            every queue was deleted.
+        """
+        return self._bulk(self.delete_queue, queues, concurrency)
+
     def get_messages(self, vhost, qname, count=1,
                      requeue=False, truncate=None, encoding='auto'):
         """
@@ -633,7 +1247,7 @@ class Client(object):
         base_body = {'count': count, 'requeue': requeue, 'encoding': encoding}
         if truncate:
             base_body['truncate'] = truncate
-        body = json.dumps(base_body)
+        body = self.codec.dumps(base_body)
 
         qname = quote(qname, '')
         path = Client.urls['get_from_queue'] % (vhost, qname)
@@ -641,16 +1255,155 @@ class Client(object):
                                      headers=Client.json_headers)
         return messages
 
+    def iter_messages(self, vhost, qname, requeue=False, truncate=None,
+                      encoding='auto', max_messages=None, max_bytes=None,
+                      sink=None, separator=b'\n', batch_size=10,
+                      max_batch_size=5000):
+        """
+        Get messages from a queue in batches, yielding them one at a time,
+        until the queue is empty or a budget is used up. Only one batch is
+        held in memory at a time.
+
+        Batches start at *batch_size* messages and then adapt to how long
+        they take to fetch and how big their payloads are, at most doubling
+        each time, aiming for :attr:`message_batch_seconds` per request and
+        :attr:`message_batch_bytes` of payload.
+
+        Every message fetched is gone from the queue unless *requeue* is
+        True, so they're all yielded even if that takes the byte budget a
+        little over, and any left in the current batch when the generator
+        is closed early are lost. Requeued messages go back to the head of
+        the queue, so peeking with *requeue* fetches a single batch, of
+        *max_messages* (or *max_batch_size*) messages.
+
+        :param string vhost: Name of vhost containing the queue
+        :param string qname: Name of the queue to consume from
+        :param bool requeue: Whether to requeue the messages after getting
+            them.
+        :param int truncate: The length, in bytes, beyond which the server
+            will truncate each payload before returning it.
+        :param string encoding: 'auto' or 'base64'; see
+            :meth:`get_messages`.
+        :param int max_messages: Stop after this many messages.
+        :param int max_bytes: Stop once this many bytes of payload have
+            been fetched, counted once decoded.
+        :param sink: A binary file to write each payload to, decoded and
+            followed by *separator*. The payload is then left out of the
+            message yielded.
+        :param bytes separator: Written after each payload in *sink*.
+        :param int batch_size: Number of messages in the first batch.
+        :param int max_batch_size: Most messages fetched in one request.
+        :returns: a generator of message dicts
+        """
+        vhost = quote(vhost, '')
+        qname = quote(qname, '')
+        path = Client.urls['get_from_queue'] % (vhost, qname)
+        base_body = {'requeue': requeue, 'encoding': encoding}
+        if truncate:
+            base_body['truncate'] = truncate
+
+        batch = max(1, min(batch_size, max_batch_size))
+        if requeue:
+            batch = max_messages or max_batch_size
+        taken = taken_bytes = 0
+        while True:
+            count = batch
+            if max_messages is not None:
+                count = min(count, max_messages - taken)
+            if max_bytes is not None and taken:
+                # Don't fetch many more messages than the budget has room
+                # for, going by their average size so far.
+                average = float(taken_bytes) / taken or 1
+                count = min(count, max(1, int((max_bytes - taken_bytes) /
+                                              average)))
+            base_body['count'] = count
+            start = time.time()
+            messages = self._call(path, 'POST', self.codec.dumps(base_body),
+                                  headers=Client.json_headers) or []
+            elapsed = time.time() - start
+
+            batch_bytes = 0
+            for message in messages:
+                if sink is None:
+                    batch_bytes += _payload_size(message)
+                else:
+                    payload = message.pop('payload', None) or ''
+                    if message.get('payload_encoding') == 'base64':
+                        payload = base64.b64decode(payload)
+                    else:
+                        payload = payload.encode('utf-8')
+                    sink.write(payload)
+                    if separator:
+                        sink.write(separator)
+                    batch_bytes += len(payload)
+                yield message
+
+            taken += len(messages)
+            taken_bytes += batch_bytes
+            if (requeue or len(messages) < count or
+                    (max_messages is not None and taken >= max_messages) or
+                    (max_bytes is not None and taken_bytes >= max_bytes)):
+                return
+            batch = self._next_batch_size(batch, len(messages), elapsed,
+                                          batch_bytes, max_batch_size)
+
+    def _next_batch_size(self, batch, count, elapsed, nbytes, most):
+        """
+        The size for the batch of messages after one of *count* messages
+        that took *elapsed* seconds and held *nbytes* of payload.
+
+        """
+        ideal = float(most)
+        if elapsed > 0:
+            ideal = min(ideal, self.message_batch_seconds * count / elapsed)
+        if nbytes > 0:
+            ideal = min(ideal, float(self.message_batch_bytes) * count /
+                        nbytes)
+        return int(max(1, min(ideal, batch * 2, most)))
+
     #########################################
     # CONNS/CHANS & BINDINGS
     #########################################
-    def get_connections(self):
-        """
+    def get_connections(self, columns=None, stream=False):
+        """
+        :param list columns: Only return these fields of each connection.
+            Nested fields are given in dotted form, e.g.
+            'recv_oct_details.rate'.
+        :param bool stream: If True, return a generator that decodes the
+            connections one at a time as the response arrives, instead of a
+            list. Memory use then stays flat however large the listing is.
         :returns: list of dicts, or an empty list if there are no connections.
         """
         path = Client.urls['all_connections']
+        path = self._with_query(path, {'columns': self._columns(columns)})
+        if stream:
+            return self._records(records.Connection,
+                                 self._stream(path))
         conns = self._call(path, 'GET')
-        return conns
+        return self._records(records.Connection, conns)
+
+    def iter_connections(self, page_size=100, name=None, use_regex=False,
+                         prefetch=True, columns=None):
+        """
+        Like :meth:`get_connections`, but fetches the listing a page at a
+        time using the API's server-side pagination and yields one
+        connection at a time.
+
+        :param int page_size: Number of connections to fetch per request.
+        :param string name: Only list connections whose name contains this
+            string (or matches it as a regex if *use_regex* is True).
+        :param bool use_regex: Treat *name* as a regular expression.
+        :param bool prefetch: Fetch the next page while the current one is
+            being consumed.
+        :param list columns: Only return these fields of each connection.
+            Nested fields are given in dotted form, e.g.
+            'message_stats.publish_details.rate'.
+        :returns: a generator of dicts, each representing a connection.
+        """
+        path = Client.urls['all_connections']
+        pages = self._iter_pages(path, page_size, name, use_regex, prefetch,
+                                 columns)
+        return self._records(records.Connection, pages)
 
     def get_connection(self, name):
         """
@@ -663,7 +1416,7 @@ class Client(object):
         name = quote(name, '')
         path = Client.urls['connections_by_name'] % name
         conn = self._call(path, 'GET')
-        return conn
+        return self._records(records.Connection, conn)
 
     def delete_connection(self, name):
         """
@@ -679,14 +1432,38 @@ class Client(object):
         self._call(path, 'DELETE')
         return True
 
-    def get_channels(self):
+    def delete_connections(self, names, concurrency=None):
+        """
+        Close many connections, running up to *concurrency* calls at once. A
+        failure to close one connection doesn't stop the others.
+
+        :param list names: A list of connection names.
+        :param int concurrency: Maximum number of calls in flight. Defaults
+            to the client's *max_concurrency*.
+        :returns: :class:`pyrabbit.bulk.BulkResult`, which is truthy only if
+            every connection was closed.
+        """
+        return run_concurrently(self.delete_connection, names,
+                                concurrency or self.max_concurrency)
+
+    def get_channels(self, columns=None, stream=False):
         """
         Return a list of dicts containing details about broker connections.
+
+        :param list columns: Only return these fields of each channel.
+            Nested fields are given in dotted form, e.g.
+            'message_stats.publish_details.rate'.
+        :param bool stream: If True, return a generator that decodes the
+            channels one at a time as the response arrives, instead of a
+            list. Memory use then stays flat however large the listing is.
         :returns: list of dicts
         """
         path = Client.urls['all_channels']
+        path = self._with_query(path, {'columns': self._columns(columns)})
+        if stream:
+            return self._records(records.Channel, self._stream(path))
         chans = self._call(path, 'GET')
-        return chans
+        return self._records(records.Channel, chans)
 
     def get_channel(self, name):
         """
@@ -699,16 +1476,26 @@ class Client(object):
         name = quote(name, '')
         path = Client.urls['channels_by_name'] % name
         chan = self._call(path, 'GET')
-        return chan
+        return self._records(records.Channel, chan)
 
-    def get_bindings(self):
+    def get_bindings(self, vhost=None, stream=False):
         """
+        :param string vhost: A vhost to list bindings for, or None (default)
+            for the bindings in all vhosts.
+        :param bool stream: If True, return a generator that decodes the
+            bindings one at a time as the response arrives, instead of a
+            list. Memory use then stays flat however large the listing is.
         :returns: list of dicts
 
         """
-        path = Client.urls['all_bindings']
+        if vhost:
+            path = Client.urls['bindings_by_vhost'] % quote(vhost, '')
+        else:
+            path = Client.urls['all_bindings']
+        if stream:
+            return self._records(records.Binding, self._stream(path))
         bindings = self._call(path, 'GET')
-        return bindings
+        return self._records(records.Binding, bindings)
 
     def get_queue_bindings(self, vhost, qname):
         """
@@ -723,7 +1510,7 @@ class Client(object):
         qname = quote(qname, '')
         path = Client.urls['bindings_on_queue'] % (vhost, qname)
         bindings = self._call(path, 'GET')
-        return bindings
+        return self._records(records.Binding, bindings)
 
     def get_bindings_from_exchange(self, vhost, exch):
         pass
@@ -749,7 +1536,7 @@ class Client(object):
         vhost = quote(vhost, '')
         exchange = quote(exchange, '')
         queue = quote(queue, '')
-        body = json.dumps({'routing_key': rt_key, 'arguments': args or []})
+        body = self.codec.dumps({'routing_key': rt_key, 'arguments': args or []})
         path = Client.urls['bindings_between_exch_queue'] % (vhost,
                                                              exchange,
                                                              queue)
@@ -777,17 +1564,76 @@ class Client(object):
                                                                 rt_key)
         return self._call(path, 'DELETE', headers=Client.json_headers)
 
-    def create_user(self, username, password, tags=""):
+    def create_exchange_binding(self, vhost, source, destination,
+                                rt_key=None, args=None):
         """
-        Creates a user.
+        Creates a binding from one exchange to another on a given vhost.
+
+        :param string vhost: vhost housing both exchanges
+        :param string source: the exchange messages are routed from
+        :param string destination: the exchange messages are routed to
+        :param string rt_key: the routing key to use for the binding
+        :param dict args: extra arguments to associate w/ the binding.
+        """
+        vhost = quote(vhost, '')
+        source = quote(source, '')
+        destination = quote(destination, '')
+        body = self.codec.dumps({'routing_key': rt_key, 'arguments': args or {}})
+        path = Client.urls['bindings_between_exchs'] % (vhost, source,
+                                                        destination)
+        return self._call(path, 'POST', body=body,
+                          headers=Client.json_headers)
+
+    def delete_exchange_binding(self, vhost, source, destination, rt_key):
+        """
+        Deletes a binding from one exchange to another on a given vhost.
+
+        :param string vhost: vhost housing both exchanges
+        :param string source: the exchange messages are routed from
+        :param string destination: the exchange messages are routed to
+        :param string rt_key: the binding's properties key, as found in the
+            'properties_key' field of the binding
+        """
+        vhost = quote(vhost, '')
+        source = quote(source, '')
+        destination = quote(destination, '')
+        path = Client.urls['rt_bindings_between_exchs'] % (vhost, source,
+                                                           destination,
+                                                           rt_key)
+        return self._call(path, 'DELETE', headers=Client.json_headers)
+
+    def delete_bindings(self, bindings, concurrency=None):
+        """
+        Delete many bindings, running up to *concurrency* deletes at once. A
+        failure to delete one binding doesn't stop the others.
+
+        :param list bindings: A list of ('vhost', 'exchange', 'queue',
+            'rt_key') tuples.
+        :param int concurrency: Maximum number of calls in flight. Defaults
+            to the client's *max_concurrency*.
+        :returns: :class:`pyrabbit.bulk.BulkResult`, which is truthy only if
+            every binding was deleted.
+        """
+        return self._bulk(self.delete_binding, bindings, concurrency)
+
+    def create_user(self, username, password, tags="", password_hash=None):
+        """
+        Creates a user, or updates an existing one.
 
         :param string username: The name to give to the new user
         :param string password: Password for the new user
         :param string tags: Comma-separated list of tags for the user
+        :param string password_hash: The user's password hash, as found in
+            exported definitions, sent instead of *password* if given.
         :returns: boolean
         """
         path = Client.urls['users_by_name'] % username
-        body = json.dumps({'password': password, 'tags': tags})
+        user = {'tags': tags}
+        if password_hash is not None:
+            user['password_hash'] = password_hash
+        else:
+            user['password'] = password
+        body = self.codec.dumps(user)
         return self._call(path, 'PUT', body=body,
                                  headers=Client.json_headers)
 
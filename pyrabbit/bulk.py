@@ -0,0 +1,198 @@
+"""
+Helpers for running many API calls at once. The Client's bulk methods
+(purge_queues, delete_queues, etc.) are built on :func:`run_concurrently`,
+which spreads calls over a bounded pool of worker threads and collects the
+outcome of each one in a :class:`BulkResult`. :func:`run_streaming` does
+the same for iterables too long to hold in memory, such as the messages
+given to publish_many.
+"""
+
+import threading
+import time
+
+
+class BulkResult(object):
+    """
+    The outcome of a bulk operation.
+
+    ``results`` is a list of ``(item, return_value)`` tuples for the calls
+    that succeeded, and ``errors`` a list of ``(item, exception)`` tuples for
+    the ones that raised. Both are in the order the items were given.
+
+    A BulkResult is truthy only if every call succeeded.
+
+    """
+
+    def __init__(self, results=None, errors=None):
+        self.results = results or []
+        self.errors = errors or []
+
+    def __bool__(self):
+        return not self.errors
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        return len(self.results) + len(self.errors)
+
+    def __repr__(self):
+        return '<BulkResult: %d succeeded, %d failed>' % (len(self.results),
+                                                         len(self.errors))
+
+    @property
+    def succeeded(self):
+        """A list of the items whose call succeeded."""
+        return [item for item, result in self.results]
+
+    @property
+    def failed(self):
+        """A list of the items whose call raised."""
+        return [item for item, err in self.errors]
+
+
+class PublishResult(object):
+    """
+    The outcome of :meth:`pyrabbit.api.Client.publish_many`.
+
+    ``routed`` and ``unrouted`` count the messages the broker did and
+    didn't route to a queue, and ``errors`` is a list of ``(message,
+    exception)`` tuples for those that couldn't be published. ``seconds`` is
+    how long publishing took.
+
+    A PublishResult is truthy only if every message was published, routed
+    or not.
+
+    """
+
+    def __init__(self):
+        self.routed = 0
+        self.unrouted = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def __bool__(self):
+        return not self.errors
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return ('<PublishResult: %d routed, %d unrouted, %d failed, '
+                '%.1f msgs/sec>' % (self.routed, self.unrouted,
+                                    len(self.errors), self.rate))
+
+    @property
+    def published(self):
+        """The number of messages the broker accepted."""
+        return self.routed + self.unrouted
+
+    @property
+    def rate(self):
+        """Messages published per second."""
+        if not self.seconds:
+            return 0.0
+        return self.published / self.seconds
+
+
+def run_concurrently(func, items, concurrency=1):
+    """
+    Call ``func(item)`` for every item in *items*, with at most *concurrency*
+    calls in flight at once. Exceptions raised by *func* are collected
+    rather than propagated, so one bad item doesn't stop the rest.
+
+    :param callable func: Called once per item.
+    :param iterable items: The items to process.
+    :param int concurrency: Maximum number of worker threads. 1 (or less)
+        runs the calls one after another in the calling thread.
+    :returns: :class:`BulkResult`
+
+    """
+    items = list(items)
+    outcomes = [None] * len(items)
+
+    def call(index):
+        try:
+            outcomes[index] = (True, func(items[index]))
+        except Exception as err:
+            outcomes[index] = (False, err)
+
+    if concurrency is None or concurrency <= 1 or len(items) <= 1:
+        for index in range(len(items)):
+            call(index)
+    else:
+        indexes = iter(range(len(items)))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    index = next(indexes, None)
+                if index is None:
+                    return
+                call(index)
+
+        workers = [threading.Thread(target=worker)
+                   for i in range(min(concurrency, len(items)))]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    result = BulkResult()
+    for item, (ok, value) in zip(items, outcomes):
+        if ok:
+            result.results.append((item, value))
+        else:
+            result.errors.append((item, value))
+    return result
+
+
+def run_streaming(func, items, done, concurrency=1):
+    """
+    Like :func:`run_concurrently`, but items are taken from *items* only as
+    workers become free, and outcomes aren't kept: each one is handed to
+    ``done(item, ok, value)`` instead, where *ok* says whether *func*
+    returned *value* or raised it. Calls to *done* are serialized.
+
+    An exception raised by *items* itself stops the run, and is re-raised
+    once the calls in flight have finished.
+
+    :returns: The number of seconds the run took.
+
+    """
+    items = iter(items)
+    lock = threading.Lock()
+    end = object()
+    raised = []
+    start = time.time()
+
+    def worker():
+        while True:
+            with lock:
+                if raised:
+                    return
+                try:
+                    item = next(items, end)
+                except Exception as err:
+                    raised.append(err)
+                    return
+            if item is end:
+                return
+            try:
+                outcome = (True, func(item))
+            except Exception as err:
+                outcome = (False, err)
+            with lock:
+                done(item, *outcome)
+
+    if concurrency is None or concurrency <= 1:
+        worker()
+    else:
+        workers = [threading.Thread(target=worker)
+                   for i in range(concurrency)]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            thread.join()
+    if raised:
+        raise raised[0]
+    return time.time() - start
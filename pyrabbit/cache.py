@@ -0,0 +1,174 @@
+"""
+An in-memory cache for responses from slow-changing API endpoints, so that
+code asking for the overview, node list, vhosts, users or permissions many
+times a second doesn't load the management plugin with identical queries.
+
+Caching is opt-in, per :class:`pyrabbit.api.Client`::
+
+    cl = Client('localhost:15672', 'guest', 'guest', cache=ResponseCache())
+
+Entries are keyed by request path (including any query string), expire after
+a per-endpoint TTL, and the least recently used are evicted once *maxsize*
+is reached. Write calls made through the same client drop the entries they
+could have made stale.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+#: TTLs, in seconds, used when none are given. Keys are names from
+#: :attr:`pyrabbit.api.Client.urls`. Endpoints not listed aren't cached.
+DEFAULT_TTLS = {
+    'overview': 5,
+    'all_nodes': 10,
+    'all_vhosts': 30,
+    'vhosts_by_name': 30,
+    'all_users': 30,
+    'all_permissions': 30,
+    'vhost_permissions': 30,
+    'vhost_permissions_get': 30,
+    'user_permissions': 30,
+    'whoami': 60,
+}
+
+_QUEUE_READS = ('overview', 'all_queues', 'queues_by_vhost',
+                'queues_by_name')
+_BINDING_READS = ('all_bindings', 'bindings_by_source_exch',
+                  'bindings_by_dest_exch', 'bindings_on_queue')
+_PERMISSION_READS = ('all_permissions', 'vhost_permissions',
+                     'vhost_permissions_get', 'user_permissions')
+
+#: Which cached endpoints a write to a given endpoint can make stale. Writes
+#: to endpoints not listed here (deleting a vhost, say) clear the whole
+#: cache.
+INVALIDATES = {
+    'users_by_name': ('all_users', 'users_by_name', 'whoami') +
+        _PERMISSION_READS,
+    'vhost_permissions': _PERMISSION_READS,
+    'exchange_by_name': ('overview', 'all_exchanges', 'exchanges_by_vhost',
+                         'exchange_by_name') + _BINDING_READS,
+    'queues_by_name': _QUEUE_READS + _BINDING_READS,
+    'purge_queue': _QUEUE_READS,
+    'get_from_queue': _QUEUE_READS,
+    'publish_to_exchange': _QUEUE_READS + ('all_exchanges',
+                                           'exchanges_by_vhost',
+                                           'exchange_by_name'),
+    'bindings_between_exch_queue': _BINDING_READS,
+    'rt_bindings_between_exch_queue': _BINDING_READS,
+    'bindings_between_exchs': _BINDING_READS,
+    'rt_bindings_between_exchs': _BINDING_READS,
+    'connections_by_name': ('overview', 'all_connections',
+                            'connections_by_name', 'all_channels',
+                            'channels_by_name'),
+}
+
+
+class ResponseCache(object):
+    """
+    A thread-safe TTL + LRU cache of decoded API responses.
+
+    Callers always get their own copy of a cached value, so mutating a
+    result can't corrupt what later callers see.
+
+    """
+
+    def __init__(self, ttls=None, maxsize=256, clock=time.time):
+        """
+        :param dict ttls: Seconds to cache each endpoint for, keyed by
+            :attr:`pyrabbit.api.Client.urls` name. Defaults to
+            :data:`DEFAULT_TTLS`. Endpoints without a TTL aren't cached.
+        :param int maxsize: Maximum number of responses to hold.
+        :param callable clock: Returns the current time in seconds.
+
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cacheable(self, endpoint):
+        """True if responses from *endpoint* are cached at all."""
+        return bool(self.ttls.get(endpoint))
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        :param string key: The request path.
+        :returns: a (hit, value) tuple. *value* is None on a miss.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            # Mark as most recently used.
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            value = entry[2]
+        return True, copy.deepcopy(value)
+
+    def set(self, endpoint, key, value):
+        """
+        Store a response, if *endpoint* is one we cache.
+
+        :param string endpoint: The :attr:`pyrabbit.api.Client.urls` name
+            the request path was built from.
+        :param string key: The request path.
+        :param value: The decoded response.
+
+        """
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (self.clock() + ttl, endpoint, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *endpoints):
+        """
+        Drop cached responses for the named endpoints, or everything if no
+        endpoints are named.
+
+        """
+        with self._lock:
+            if not endpoints:
+                self._entries.clear()
+                return
+            stale = [key for key, entry in self._entries.items()
+                     if entry[1] in endpoints]
+            for key in stale:
+                del self._entries[key]
+
+    def invalidate_for_write(self, endpoint):
+        """
+        Drop whatever a write to *endpoint* could have made stale.
+
+        """
+        affected = INVALIDATES.get(endpoint)
+        if affected is None:
+            self.invalidate()
+        else:
+            self.invalidate(*affected)
+
+    def clear(self):
+        """Drop every cached response."""
+        self.invalidate()
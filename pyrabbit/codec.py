@@ -0,0 +1,132 @@
+"""
+JSON codecs for the bodies of requests and responses.
+
+Decoding large listings is where a client spends most of its CPU time, so
+:class:`pyrabbit.http.HTTPClient` and :class:`pyrabbit.api.Client` take a
+*codec*: ``'json'`` for the standard library's module, ``'orjson'`` for the
+much faster `orjson <https://github.com/ijl/orjson>`_, or ``'auto'`` (the
+default) for orjson when it's installed and json otherwise. Any object with
+the same ``dumps`` and ``loads`` methods will do as well.
+
+Either way, responses are decoded straight from the bytes received, without
+decoding them to text first.
+
+Decoding a big listing allocates millions of containers, none of which can
+be garbage yet, and the cyclic garbage collector runs over and over while
+it does. A codec made with ``pause_gc=True`` disables the collector while
+it decodes bodies of :data:`GC_PAUSE_BYTES` or more. That's process-wide,
+so only opt in where nothing else needs the collector in the meantime.
+"""
+
+import gc
+import json
+import sys
+import threading
+
+# json.loads accepts bytes from Python 3.6 on, and Python 2's str is bytes.
+_LOADS_BYTES = sys.version_info < (3,) or sys.version_info >= (3, 6)
+
+#: Bodies of at least this many bytes are decoded with the garbage collector
+#: paused, by codecs made with ``pause_gc=True``.
+GC_PAUSE_BYTES = 1 << 20
+
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+
+def _loads_paused(loads, data):
+    """
+    Call *loads* on *data* with garbage collection paused. Pauses taken by
+    several threads at once nest, and a collector the application disabled
+    is left disabled.
+
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        return loads(data)
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+class JSONCodec(object):
+    """
+    The standard library's :mod:`json`. With *pause_gc*, large bodies are
+    decoded with the garbage collector paused.
+
+    """
+
+    name = 'json'
+
+    def __init__(self, pause_gc=False):
+        self.pause_gc = pause_gc
+
+    def dumps(self, obj):
+        """Encode *obj*; returns a str."""
+        return json.dumps(obj)
+
+    def loads(self, data):
+        """Decode *data*, bytes or str. Raises ValueError if it's invalid."""
+        if not _LOADS_BYTES and isinstance(data, bytes):
+            data = data.decode('utf-8')
+        if self.pause_gc and len(data) >= GC_PAUSE_BYTES:
+            return _loads_paused(json.loads, data)
+        return json.loads(data)
+
+
+class OrjsonCodec(object):
+    """
+    `orjson <https://github.com/ijl/orjson>`_, which encodes to bytes.
+    Raises ImportError if it isn't installed. With *pause_gc*, large bodies
+    are decoded with the garbage collector paused.
+
+    """
+
+    name = 'orjson'
+
+    def __init__(self, pause_gc=False):
+        import orjson
+        self.pause_gc = pause_gc
+        self._orjson = orjson
+        # json accepts keys that aren't strings, so existing callers may
+        # depend on it.
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        """Encode *obj*; returns bytes."""
+        return self._orjson.dumps(obj, option=self._options)
+
+    def loads(self, data):
+        """Decode *data*, bytes or str. Raises ValueError if it's invalid."""
+        if self.pause_gc and len(data) >= GC_PAUSE_BYTES:
+            return _loads_paused(self._orjson.loads, data)
+        return self._orjson.loads(data)
+
+
+def get_codec(codec='auto'):
+    """
+    Return the codec for *codec*: one of the names above, None (the same as
+    ``'auto'``), or a codec object, which is returned as is.
+
+    """
+    if codec is None or codec == 'auto':
+        try:
+            return OrjsonCodec()
+        except ImportError:
+            return JSONCodec()
+    if codec == 'json':
+        return JSONCodec()
+    if codec == 'orjson':
+        return OrjsonCodec()
+    if isinstance(codec, str):
+        raise ValueError("Unknown codec %r, expected 'auto', 'json' or "
+                         "'orjson'" % codec)
+    return codec
@@ -0,0 +1,117 @@
+"""
+Builds definitions documents: the JSON format RabbitMQ uses to export and
+import whole topologies (vhosts, users, permissions, exchanges, queues and
+bindings). Importing one document with
+:meth:`pyrabbit.api.Client.apply_definitions` replaces thousands of
+individual create_* calls.
+
+The add_* methods take the same arguments as the Client methods they stand
+in for::
+
+    defs = Definitions()
+    defs.add_vhost('app')
+    defs.add_exchange('app', 'events', 'topic')
+    defs.add_queue('app', 'audit', durable=True)
+    defs.add_binding('app', 'events', 'audit', '#')
+    result = client.apply_definitions(defs)
+"""
+
+#: Document sections in the order they have to be imported in, so that
+#: nothing refers to an object that doesn't exist yet.
+SECTIONS = ('vhosts', 'users', 'permissions', 'exchanges', 'queues',
+            'bindings')
+
+#: Sections that are broker-wide and can't be imported into a single vhost.
+GLOBAL_SECTIONS = ('vhosts', 'users', 'permissions')
+
+
+class Definitions(object):
+    """
+    An in-memory definitions document, built up one object at a time.
+
+    """
+
+    def __init__(self, document=None):
+        """
+        :param dict document: An existing definitions document (as exported
+            by the broker, say) to start from.
+
+        """
+        self.sections = dict((section, []) for section in SECTIONS)
+        for section in SECTIONS:
+            self.sections[section].extend((document or {}).get(section, []))
+
+    def __len__(self):
+        return sum(len(objs) for objs in self.sections.values())
+
+    def add_vhost(self, vname):
+        """See :meth:`pyrabbit.api.Client.create_vhost`."""
+        self.sections['vhosts'].append({'name': vname})
+
+    def add_user(self, username, password, tags=""):
+        """See :meth:`pyrabbit.api.Client.create_user`."""
+        self.sections['users'].append({'name': username,
+                                       'password': password, 'tags': tags})
+
+    def add_permission(self, vname, username, config, rd, wr):
+        """See :meth:`pyrabbit.api.Client.set_vhost_permissions`."""
+        self.sections['permissions'].append({'vhost': vname,
+                                             'user': username,
+                                             'configure': config,
+                                             'read': rd, 'write': wr})
+
+    def add_exchange(self, vhost, name, xtype, auto_delete=False,
+                     durable=True, internal=False, arguments=None):
+        """See :meth:`pyrabbit.api.Client.create_exchange`."""
+        self.sections['exchanges'].append({'vhost': vhost, 'name': name,
+                                           'type': xtype,
+                                           'auto_delete': auto_delete,
+                                           'durable': durable,
+                                           'internal': internal,
+                                           'arguments': arguments or {}})
+
+    def add_queue(self, vhost, name, durable=True, auto_delete=False,
+                  arguments=None):
+        """See :meth:`pyrabbit.api.Client.create_queue`."""
+        self.sections['queues'].append({'vhost': vhost, 'name': name,
+                                        'durable': durable,
+                                        'auto_delete': auto_delete,
+                                        'arguments': arguments or {}})
+
+    def add_binding(self, vhost, exchange, destination, rt_key=None,
+                    args=None, destination_type='queue'):
+        """
+        See :meth:`pyrabbit.api.Client.create_binding`. Set
+        *destination_type* to 'exchange' for an exchange-to-exchange
+        binding.
+
+        """
+        self.sections['bindings'].append({'vhost': vhost, 'source': exchange,
+                                          'destination': destination,
+                                          'destination_type': destination_type,
+                                          'routing_key': rt_key or '',
+                                          'arguments': args or {}})
+
+    def items(self):
+        """
+        Yield every object as a (section, object) tuple, in import order.
+
+        """
+        for section in SECTIONS:
+            for obj in self.sections[section]:
+                yield section, obj
+
+    def to_document(self):
+        """Return the definitions as a dict, ready to be JSON encoded."""
+        return document_for(self.items())
+
+
+def document_for(items):
+    """
+    Build a definitions document from (section, object) tuples.
+
+    """
+    doc = {}
+    for section, obj in items:
+        doc.setdefault(section, []).append(obj)
+    return doc
@@ -1,14 +1,22 @@
 
+import codecs
+import collections
+import copy
 import json
 import os
+import random
 import socket
-import requests
-import requests.exceptions
-from requests.auth import HTTPBasicAuth
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 try:
     from urlparse import urljoin, urlparse, urlunparse
 except ImportError:
     from urllib.parse import urljoin, urlparse, urlunparse
+from .codec import get_codec
 
 class HTTPError(Exception):
     """
@@ -47,29 +55,990 @@ class NetworkError(Exception):
     pass
 
 
+class CircuitOpenError(NetworkError):
+    """
+    Raised without contacting the server while the circuit breaker of every
+    endpoint that could take the request is open.
+
+    """
+    pass
+
+
+_WHITESPACE = ' \t\n\r'
+#: What can follow an element of an array.
+_AFTER_ELEMENT = _WHITESPACE + ',]'
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """
+    Incrementally decode a JSON array from an iterable of byte chunks,
+    yielding each top-level element as soon as it has been received in
+    full. Only one element (plus whatever partial data is buffered) is held
+    in memory at a time.
+
+    If the document turns out not to be an array, it's decoded whole and
+    yielded as a single item.
+
+    :param iterable chunks: Byte strings making up the JSON document.
+    :param string encoding: Character encoding of the document.
+
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # Skip whitespace and element separators up to the next value.
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if started and pos < len(buf) and buf[pos] == ',':
+            pos += 1
+            continue
+        if started and pos < len(buf) and buf[pos] == ']':
+            return
+
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != '[':
+                    # Not an array: nothing to gain by streaming it.
+                    rest = buf[pos:] + ''.join(text.decode(chunk)
+                                               for chunk in chunks)
+                    rest += text.decode(b'', True)
+                    yield json.loads(rest)
+                    return
+                started = True
+                pos += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                value, end = None, None
+            # A number or literal may continue in the next chunk, and the
+            # decoder happily stops at '0' in '0.' or '1' in '1e', so only
+            # accept a value once what follows it can end an element.
+            if end is not None and (end < len(buf) and
+                                    buf[end] in _AFTER_ELEMENT or
+                                    eof and end == len(buf)):
+                yield value
+                pos = end
+                continue
+
+        if eof:
+            if not started:
+                # An empty body; there's nothing to yield.
+                return
+            raise ValueError("Truncated JSON array in response")
+
+        # Drop what has already been consumed before buffering more.
+        if pos:
+            buf = buf[pos:]
+            pos = 0
+        try:
+            buf += text.decode(next(chunks))
+        except StopIteration:
+            buf += text.decode(b'', True)
+            eof = True
+
+
+class Response(object):
+    """
+    An HTTP response, for transports that don't go through requests. It
+    offers the parts of :class:`requests.Response` that :class:`HTTPClient`
+    uses.
+
+    The body is either given whole as *content*, or read on demand from
+    the file-like *raw*. In that case *release* is called once the body
+    has been read to the end, with True, or the response closed before
+    then, with False, so that the transport can reuse or drop its
+    connection.
+
+    """
+
+    def __init__(self, status_code, content=b'', headers=None, reason=None,
+                 raw=None, release=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.reason = reason
+        self.raw = raw
+        self._content = content if raw is None else None
+        self._release = release
+
+    def __repr__(self):
+        return '<Response [%d]>' % self.status_code
+
+    def _finish(self, complete):
+        release, self._release = self._release, None
+        if release is not None:
+            release(complete)
+
+    @property
+    def content(self):
+        if self._content is None:
+            try:
+                self._content = self.raw.read()
+            except Exception:
+                self.close()
+                raise
+            self._finish(True)
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1):
+        if self._content is not None:
+            for start in range(0, len(self._content), chunk_size):
+                yield self._content[start:start + chunk_size]
+            return
+        while True:
+            try:
+                chunk = self.raw.read(chunk_size)
+            except Exception:
+                self.close()
+                raise
+            if not chunk:
+                break
+            yield chunk
+        self._content = b''
+        self._finish(True)
+
+    def close(self):
+        if self._release is not None:
+            self.raw.close()
+            self._finish(False)
+
+
+#: Success statuses whose responses carry nothing worth decoding.
+EMPTY_STATUSES = (201, 204)
+
+#: Methods that can safely be sent to another node if the first one fails.
+READ_METHODS = ('GET', 'HEAD')
+
+#: Methods that have the same effect however many times they're sent.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+
+class Endpoint(object):
+    """
+    One management API node that an :class:`HTTPClient` talks to, along
+    with what the client has learned about its health and speed.
+
+    """
+    #: Weight given to the newest sample in the moving average of latency.
+    latency_weight = 0.3
+
+    def __init__(self, base_url, breaker=None):
+        self.base_url = base_url
+        #: This endpoint's :class:`CircuitBreaker`, or None.
+        self.breaker = breaker
+        #: False while the node is ejected from rotation after a failure.
+        self.healthy = True
+        #: Moving average of response times in seconds, None until the
+        #: first response.
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+
+    def __repr__(self):
+        return '<Endpoint %s healthy=%s latency=%s>' % (self.base_url,
+                                                        self.healthy,
+                                                        self.latency)
+
+    def record_success(self, elapsed):
+        self.requests += 1
+        self.healthy = True
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += self.latency_weight * (elapsed - self.latency)
+
+    def record_failure(self):
+        self.requests += 1
+        self.failures += 1
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    def stats(self):
+        """Return this endpoint's state as a dict."""
+        return {'url': self.base_url, 'healthy': self.healthy,
+                'latency': self.latency, 'requests': self.requests,
+                'failures': self.failures,
+                'circuit': self.breaker.state if self.breaker else None}
+
+
+class HedgePolicy(object):
+    """
+    Settings and statistics for hedged reads. When a GET hasn't been
+    answered within a delay taken from a percentile of recent response
+    times, a duplicate is sent to another endpoint (or the same one, if
+    there is only one) and whichever answers first is used. The slower
+    request's connection is dropped without reading its body.
+
+    This trims the latency tail caused by one slow node, at the price of a
+    few percent more requests. Only plain GETs are hedged; streamed calls
+    and writes never are.
+
+    """
+
+    def __init__(self, percentile=95, min_delay=0.005, max_delay=1.0,
+                 window=200, min_samples=20):
+        """
+        :param float percentile: Hedge once a request has taken longer than
+            this percentile of recent response times.
+        :param float min_delay: Never hedge sooner than this many seconds.
+        :param float max_delay: Never wait longer than this before hedging,
+            and the delay used until enough samples have been seen.
+        :param int window: Number of recent response times to keep.
+        :param int min_samples: Samples needed before the percentile is
+            trusted.
+
+        """
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+
+    def delay(self):
+        """Seconds to wait for the first response before hedging."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.max_delay
+            ordered = sorted(self._samples)
+        index = int(round((len(ordered) - 1) * self.percentile / 100.0))
+        return min(self.max_delay, max(self.min_delay, ordered[index]))
+
+    def record(self, elapsed, hedged, hedge_won):
+        with self._lock:
+            self._samples.append(elapsed)
+            self.requests += 1
+            if hedged:
+                self.hedged += 1
+                if hedge_won:
+                    self.hedge_wins += 1
+                else:
+                    self.primary_wins += 1
+
+    def stats(self):
+        """
+        Return a dict with the number of hedgeable requests, how many were
+        hedged, the hedge rate, how often each side of a hedged request won
+        and the current hedging delay.
+
+        """
+        with self._lock:
+            requests, hedged = self.requests, self.hedged
+            result = {'requests': requests, 'hedged': hedged,
+                      'hedge_rate': float(hedged) / requests if requests
+                      else 0.0,
+                      'hedge_wins': self.hedge_wins,
+                      'primary_wins': self.primary_wins}
+        result['delay'] = self.delay()
+        return result
+
+
+class RetryPolicy(object):
+    """
+    When and how often to retry a failed request.
+
+    Only idempotent methods are retried, and only after a network error or
+    one of *statuses* (by default the 502/503/504 a node answers with while
+    it restarts). Retries wait an exponentially growing, fully jittered
+    delay, so that many clients failing at once don't all come back at the
+    same moment; a numeric Retry-After header from the server is honoured up
+    to *max_backoff*.
+
+    Retries also draw on a budget: every request adds *budget_ratio* of a
+    token, up to *budget_cap*, and every retry spends one. Once the budget
+    is spent, failures are raised right away, so retries can add at most
+    about *budget_ratio* extra load to a struggling server.
+
+    One policy can be shared by several clients, pooling their budget.
+
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.1, max_backoff=5.0,
+                 methods=IDEMPOTENT_METHODS, statuses=(502, 503, 504),
+                 budget_ratio=0.2, budget_cap=10, sleep=time.sleep):
+        """
+        :param int max_attempts: Most times to send one request, counting
+            the first.
+        :param float backoff: Upper bound, in seconds, of the delay before
+            the first retry. It doubles with each further retry.
+        :param float max_backoff: Longest delay between attempts.
+        :param tuple methods: HTTP methods that may be retried.
+        :param tuple statuses: Response statuses that are retried.
+        :param float budget_ratio: Retry tokens earned per request.
+        :param int budget_cap: Most retry tokens that can be saved up,
+            which is also how many are available at first.
+        :param callable sleep: Waits for the given number of seconds.
+
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.methods = methods
+        self.statuses = statuses
+        self.budget_ratio = budget_ratio
+        self.budget_cap = budget_cap
+        self.sleep = sleep
+        self._tokens = float(budget_cap)
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    def record_request(self):
+        """Earn retry budget for a request about to be sent."""
+        with self._lock:
+            self._tokens = min(self.budget_cap,
+                               self._tokens + self.budget_ratio)
+
+    def should_retry(self, method, attempt, status=None):
+        """
+        Decide whether to retry, spending a token from the budget if so.
+
+        :param string method: The request's HTTP method.
+        :param int attempt: Number of attempts made so far.
+        :param int status: The response status, or None after a network
+            error.
+
+        """
+        if method not in self.methods or attempt >= self.max_attempts:
+            return False
+        if status is not None and status not in self.statuses:
+            return False
+        with self._lock:
+            if self._tokens < 1:
+                self.budget_exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+        return True
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait before the next attempt, after *attempt* attempts.
+
+        :param retry_after: The Retry-After header of the failed response,
+            if any.
+
+        """
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        wait = random.uniform(0, ceiling)
+        try:
+            wait = max(wait, float(retry_after))
+        except (TypeError, ValueError):
+            # Missing, or an HTTP date, which isn't worth parsing here.
+            pass
+        return min(wait, self.max_backoff)
+
+    def stats(self):
+        """
+        Return a dict with the number of retries made, how many were
+        refused because the budget was spent, and the tokens left.
+
+        """
+        with self._lock:
+            return {'retries': self.retries,
+                    'budget_exhausted': self.budget_exhausted,
+                    'budget': self._tokens}
+
+
+class CircuitBreaker(object):
+    """
+    Stops requests to an endpoint that keeps failing, giving an overloaded
+    management API room to recover instead of piling more work on it.
+
+    After *failure_threshold* consecutive failures (network errors and 5xx
+    responses) the circuit opens, and requests to the endpoint fail at once
+    with :class:`CircuitOpenError`, or go to another endpoint if there is
+    one. Once *reset_timeout* seconds have passed, a single trial request is
+    let through (the circuit is half-open): if it succeeds the circuit
+    closes, otherwise it opens again for another *reset_timeout*.
+
+    An :class:`HTTPClient` gives each of its endpoints its own copy (see
+    :meth:`copy`) of the breaker it's given, and guards them with its own
+    lock; a breaker isn't thread-safe by itself.
+
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 clock=time.time):
+        """
+        :param int failure_threshold: Consecutive failures that open the
+            circuit.
+        :param float reset_timeout: Seconds to keep the circuit open before
+            letting a trial request through.
+        :param callable clock: Returns the current time in seconds.
+
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial_out = False
+
+    def copy(self):
+        """A new, closed breaker with the same settings."""
+        return CircuitBreaker(self.failure_threshold, self.reset_timeout,
+                              self.clock)
+
+    def available(self):
+        """
+        True if a request would currently be let through. Unlike
+        :meth:`allow`, this doesn't claim the half-open trial.
+
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return self.clock() - self.opened_at >= self.reset_timeout
+        return not self._trial_out
+
+    def allow(self):
+        """
+        Ask to send a request. Returns False, and counts the rejection, if
+        the circuit won't let it through.
+
+        """
+        if not self.available():
+            self.rejected += 1
+            return False
+        if self.state != self.CLOSED:
+            self.state = self.HALF_OPEN
+            self._trial_out = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_out = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_out = False
+        if (self.state == self.HALF_OPEN or
+                self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = self.clock()
+
+
+class _Flight(object):
+    """A GET in progress that other callers can wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.followers = 0
+        self.result = None
+        self.error = None
+
+
 class HTTPClient(object):
     """
-    A wrapper for requests. Abstracts away
+    A wrapper for HTTP requests. Abstracts away
     things like path building, return value parsing, etc.,
     so the api module code stays clean and easy to read/use.
 
+    Calls are sent through a transport from :mod:`pyrabbit.transport`,
+    which keeps connections alive and reuses them between calls. They're
+    opened lazily on first use, and released by :meth:`close` or by
+    leaving a ``with`` block.
+
     """
 
-    def __init__(self, api_url, uname, passwd, timeout=5, scheme='http'):
+    def __init__(self, api_url, uname, passwd, timeout=5, scheme='http',
+                 pool_connections=10, pool_maxsize=10, pool_block=False,
+                 pool_idle_timeout=None, coalesce=False, probe_interval=5,
+                 hedge=None, retry=None, circuit_breaker=None, metrics=None,
+                 transport=None, codec=None):
         """
-        :param string api_url: The base URL for the broker API.
+        :param api_url: The base URL for the broker API, or a list of them
+            for a cluster. With several, reads are spread over the healthy
+            nodes, favouring the fastest, and fail over to another node if
+            one can't be reached or returns a 5xx error. Writes go to the
+            first healthy node in the list. Failing nodes are taken out of
+            rotation until a background probe finds them working again.
         :param string uname: Username credential used to authenticate.
         :param string passwd: Password used to authenticate w/ REST API
         :param int timeout: Integer number of seconds to wait for each call.
         :param string scheme: HTTP scheme used to connect
+        :param int pool_connections: Number of per-host connection pools to
+            keep around (requests transport only).
+        :param int pool_maxsize: Maximum number of connections kept open to
+            any one host.
+        :param bool pool_block: If True, callers wait for a free connection
+            once *pool_maxsize* connections to a host are busy instead of
+            opening (and then discarding) extra ones (requests transport
+            only).
+        :param int pool_idle_timeout: Number of seconds the pool may sit
+            unused before its sockets are closed. None (the default) keeps
+            them open until :meth:`close` is called.
+        :param bool coalesce: If True, identical GETs made concurrently
+            (e.g. from many threads) share a single request. The first
+            caller gets the decoded response; the others get their own deep
+            copy of it. :attr:`coalesce_stats` counts how many requests were
+            actually issued and how many were saved.
+        :param int probe_interval: Seconds between checks of whether a
+            failed node has recovered.
+        :param hedge: A :class:`HedgePolicy` to send duplicate GETs when
+            the first is slow to answer, or None (the default) to never
+            hedge.
+        :param retry: A :class:`RetryPolicy` for retrying idempotent
+            requests that fail with a network error or a transient 5xx
+            status, or None (the default) to never retry.
+        :param circuit_breaker: A :class:`CircuitBreaker` whose settings
+            are used for a breaker on each endpoint, or None (the default)
+            for no circuit breaking.
+        :param metrics: A :class:`pyrabbit.metrics.Metrics` to record
+            every call in, or None (the default) to record nothing.
+        :param transport: What to send requests through: ``'requests'``
+            (the default) for a pooled :class:`requests.Session`,
+            ``'stdlib'`` for the lighter, dependency-free
+            :class:`pyrabbit.transport.StdlibTransport`, or an object with
+            a ``request(method, url, data, headers, timeout, stream, auth)``
+            method returning a :class:`Response` (or requests.Response) and
+            raising :class:`NetworkError` if the server can't be reached,
+            such as a :class:`pyrabbit.testing.FakeBroker`.
+        :param codec: The JSON codec responses are decoded with; see
+            :mod:`pyrabbit.codec`. By default orjson if it's installed,
+            json otherwise.
 
         """
-        self.auth = HTTPBasicAuth(uname, passwd)
+        # Imported here as the transport module builds on this one.
+        from .transport import BasicAuth, TRANSPORTS
+
+        self.auth = BasicAuth(uname, passwd)
         self.timeout = timeout
-        api_url = '%s://%s' % (scheme, api_url)
-        self.base_url = api_url
+        if not isinstance(api_url, (list, tuple)):
+            api_url = [api_url]
+        self.endpoints = [Endpoint('%s://%s' % (scheme, url),
+                                   circuit_breaker and circuit_breaker.copy())
+                          for url in api_url]
+        self.base_url = self.endpoints[0].base_url
+        self.probe_interval = probe_interval
+        self.probe_path = 'overview'
+        self.hedge = hedge
+        self.retry = retry
+        self.metrics = metrics
+        self.codec = get_codec(codec)
+        self._prober = None
+        self._stop_probing = threading.Event()
+        self._endpoints_lock = threading.Lock()
+
+        if transport is None:
+            transport = 'requests'
+        if transport == 'requests':
+            transport = TRANSPORTS[transport](
+                pool_connections, pool_maxsize, pool_block, pool_idle_timeout)
+        elif transport == 'stdlib':
+            transport = TRANSPORTS[transport](pool_maxsize, pool_idle_timeout)
+        elif isinstance(transport, str):
+            raise ValueError("Unknown transport %r, expected one of %s"
+                             % (transport, ', '.join(sorted(TRANSPORTS))))
+        self.transport = transport
+
+        self.coalesce = coalesce
+        self.coalesce_stats = {'issued': 0, 'saved': 0}
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close all pooled connections. The client remains usable; a new pool
+        is created on the next call.
+
+        """
+        self._stop_probing.set()
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            close()
+
+    def endpoint_stats(self):
+        """
+        Return a list of dicts describing each endpoint: its URL, whether
+        it's currently in rotation, its average latency in seconds, and
+        request and failure counts.
+
+        """
+        with self._endpoints_lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _candidates(self, method):
+        """
+        The endpoints to try for a request, in order. Reads go first to the
+        faster of two randomly picked healthy nodes, which spreads the load
+        while favouring quick nodes, and fail over to the other healthy
+        nodes fastest first; writes go to the healthy nodes in the order
+        given. A node with no latency measured yet ranks as the average of
+        the measured ones, behind any it ties with. Ejected nodes, then
+        nodes whose circuit breaker is open, are tried last rather than not
+        at all.
+
+        """
+        with self._endpoints_lock:
+            tripped = [e for e in self.endpoints
+                       if e.breaker is not None and not e.breaker.available()]
+            healthy = [e for e in self.endpoints
+                       if e.healthy and e not in tripped]
+            ejected = [e for e in self.endpoints
+                       if not e.healthy and e not in tripped]
+        if method in READ_METHODS and len(healthy) > 1:
+            known = [e.latency for e in healthy if e.latency is not None]
+            typical = sum(known) / len(known) if known else 0.0
+
+            def latency(endpoint):
+                if endpoint.latency is None:
+                    return (typical, 1)
+                return (endpoint.latency, 0)
+            best = min(random.sample(healthy, 2), key=latency)
+            healthy = [best] + sorted((e for e in healthy if e is not best),
+                                      key=latency)
+        return healthy + ejected + tripped
+
+    def _admit(self, endpoint):
+        """
+        Raise :class:`CircuitOpenError` if *endpoint*'s circuit breaker
+        won't let a request through.
+
+        """
+        with self._endpoints_lock:
+            if endpoint.breaker is None or endpoint.breaker.allow():
+                return
+        raise CircuitOpenError("Circuit open for %s" % endpoint.base_url)
+
+    def _endpoint_failed(self, endpoint):
+        with self._endpoints_lock:
+            endpoint.record_failure()
+            if len(self.endpoints) < 2:
+                # Nowhere else to send requests, so nothing to gain by
+                # ejecting it.
+                return
+            endpoint.healthy = False
+            if self._prober is None:
+                self._stop_probing.clear()
+                self._prober = threading.Thread(target=self._probe)
+                self._prober.daemon = True
+                self._prober.start()
+
+    def _probe(self):
+        """
+        Background loop that checks ejected endpoints every
+        *probe_interval* seconds and puts them back into rotation once they
+        answer again. Exits once every endpoint is healthy.
+
+        """
+        try:
+            while not self._stop_probing.wait(self.probe_interval):
+                with self._endpoints_lock:
+                    ejected = [e for e in self.endpoints if not e.healthy]
+                    if not ejected:
+                        # Checked and cleared under the same lock, so an
+                        # endpoint ejected from now on starts a new prober.
+                        self._prober = None
+                        return
+                for endpoint in ejected:
+                    try:
+                        resp, elapsed = self._send(endpoint, self.probe_path,
+                                                   'GET')
+                        resp.close()
+                    except Exception:
+                        # Whatever went wrong, the node isn't usable yet.
+                        continue
+                    if 200 <= resp.status_code <= 206:
+                        with self._endpoints_lock:
+                            endpoint.record_success(elapsed)
+        finally:
+            with self._endpoints_lock:
+                if self._prober is threading.current_thread():
+                    self._prober = None
+
+    def _send(self, endpoint, path, method, body=None, headers=None,
+              stream=False):
+        url = urljoin(endpoint.base_url, path)
+        start = time.time()
+        resp = self.transport.request(method, url, data=body, headers=headers,
+                                      timeout=self.timeout, stream=stream,
+                                      auth=self.auth)
+        return resp, time.time() - start
+
+    def _read_errors(self):
+        """
+        The exceptions the transport may raise while a response body is
+        read, after :meth:`_send` has returned.
+
+        """
+        return getattr(self.transport, 'errors', ())
+
+    def _request(self, path, method, body=None, headers=None, stream=False):
+        """
+        Send a request, retrying it as the retry policy allows. A
+        :class:`CircuitOpenError` is never retried: the point of it is to
+        leave the server alone for a while.
+
+        """
+        if self.retry is None:
+            return self._route(path, method, body, headers, stream)
+
+        self.retry.record_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            try:
+                resp = self._route(path, method, body, headers, stream)
+            except CircuitOpenError:
+                raise
+            except NetworkError:
+                if not self.retry.should_retry(method, attempt):
+                    raise
+            else:
+                if not self.retry.should_retry(method, attempt,
+                                               resp.status_code):
+                    return resp
+                retry_after = resp.headers.get('Retry-After')
+                resp.close()
+            self.retry.sleep(self.retry.delay(attempt, retry_after))
+
+    def _route(self, path, method, body=None, headers=None, stream=False):
+        """
+        Send a request to the best endpoint for it. Reads that fail with a
+        network error or 5xx response are retried on the other endpoints,
+        and any request is sent on to the next endpoint if one's circuit
+        breaker is open.
+
+        """
+        if self.hedge is not None and method == 'GET' and not stream:
+            return self._hedged_request(path, method, body, headers)
+
+        candidates = self._candidates(method)
+        for attempt, endpoint in enumerate(candidates):
+            retry = (method in READ_METHODS and
+                     attempt < len(candidates) - 1)
+            try:
+                self._admit(endpoint)
+            except CircuitOpenError:
+                # Nothing was sent, so any method can go elsewhere.
+                if attempt < len(candidates) - 1:
+                    continue
+                raise
+            try:
+                resp, elapsed = self._send(endpoint, path, method, body,
+                                           headers, stream)
+            except NetworkError:
+                self._endpoint_failed(endpoint)
+                if retry:
+                    continue
+                raise
+            if resp.status_code >= 500:
+                self._endpoint_failed(endpoint)
+                if retry:
+                    resp.close()
+                    continue
+            else:
+                with self._endpoints_lock:
+                    endpoint.record_success(elapsed)
+            return resp
+
+    def _hedged_request(self, path, method, body=None, headers=None):
+        """
+        Send the request to the best endpoint and, if it hasn't answered
+        within the hedge delay (or fails first), send a duplicate to the
+        next one. The first good response wins; the other is discarded.
+
+        """
+        candidates = self._candidates(method)
+        attempts = [candidates[0], candidates[1 % len(candidates)]]
+        answers = queue.Queue()
+        decided = threading.Event()
+
+        def attempt(endpoint, hedge):
+            try:
+                self._admit(endpoint)
+            except CircuitOpenError as err:
+                answers.put((hedge, None, None, err))
+                return
+            try:
+                resp, elapsed = self._send(endpoint, path, method, body,
+                                           headers, stream=True)
+            except NetworkError as err:
+                self._endpoint_failed(endpoint)
+                answers.put((hedge, None, None, err))
+                return
+            if resp.status_code >= 500:
+                self._endpoint_failed(endpoint)
+            else:
+                with self._endpoints_lock:
+                    endpoint.record_success(elapsed)
+            if decided.is_set():
+                # Lost the race: drop the connection rather than read a
+                # body nobody wants.
+                resp.close()
+                return
+            try:
+                resp.content
+            except self._read_errors() as err:
+                answers.put((hedge, None, None, NetworkError(
+                    "Error during request %s %s" % (type(err), err))))
+                return
+            answers.put((hedge, resp, elapsed, None))
+
+        def guarded_attempt(endpoint, hedge):
+            # Make sure the waiting caller always hears back.
+            try:
+                attempt(endpoint, hedge)
+            except Exception as err:
+                answers.put((hedge, None, None, err))
+
+        def launch(hedge):
+            thread = threading.Thread(target=guarded_attempt,
+                                      args=(attempts[hedge], hedge))
+            thread.daemon = True
+            thread.start()
+
+        start = time.time()
+        launch(0)
+        sent = 1
+        failures = []
+        timeout = self.hedge.delay()
+        while True:
+            try:
+                answer = answers.get(timeout=timeout)
+            except queue.Empty:
+                # The first request is slow: hedge it.
+                launch(1)
+                sent, timeout = 2, None
+                continue
+
+            hedge, resp, elapsed, err = answer
+            if err is None and resp.status_code < 500:
+                decided.set()
+                self.hedge.record(time.time() - start, sent > 1, hedge == 1)
+                return resp
+
+            failures.append(answer)
+            if len(failures) < sent:
+                # The other request may still succeed.
+                continue
+            if sent == 1:
+                # The first request failed before the hedge delay was up,
+                # so go straight to the other endpoint.
+                launch(1)
+                sent, timeout = 2, None
+                continue
+            break
+
+        decided.set()
+        hedge, resp, elapsed, err = failures[-1]
+        if err is not None:
+            raise err
+        return resp
+
+    def _observe(self, label, method, start, body=None, status=None,
+                 response_bytes=0, decode_seconds=0.0, error=None):
+        if self.metrics is None:
+            return
+        self.metrics.observe(label, method, time.time() - start, status,
+                             len(body) if body else 0, response_bytes,
+                             decode_seconds,
+                             error and type(error).__name__)
 
-    def do_call(self, path, method, body=None, headers=None):
+    def stream_call(self, path, method='GET', body=None, headers=None,
+                    chunk_size=65536, label=None):
+        """
+        Like :meth:`do_call`, but for responses holding a JSON array: the
+        array's elements are decoded as they arrive from the socket and
+        handed out one at a time by the returned generator, so memory use
+        doesn't grow with the size of the response.
+
+        Errors in the HTTP status are raised right away, before the
+        generator is returned.
+
+        :param int chunk_size: Number of bytes to read from the socket at a
+            time.
+        :param string label: See :meth:`do_call`. A streamed call is
+            recorded once its generator is exhausted or closed; decoding
+            time isn't separated from the rest.
+        :returns: a generator of decoded array elements
+
+        """
+        start = time.time()
+        try:
+            resp = self._request(path, method, body, headers, stream=True)
+        except NetworkError as err:
+            self._observe(label, method, start, body, error=err)
+            raise
+
+        # 'success' HTTP status codes are 200-206
+        if resp.status_code < 200 or resp.status_code > 206:
+            try:
+                content = self.codec.loads(resp.content)
+            except ValueError:
+                content = None
+            finally:
+                resp.close()
+            err = HTTPError(content, resp.status_code, resp.text, path, body)
+            self._observe(label, method, start, body, resp.status_code,
+                          len(resp.content or b''), error=err)
+            raise err
+
+        return self._iter_response(resp, chunk_size, label, start, method,
+                                   body)
+
+    def _iter_response(self, resp, chunk_size, label=None, start=None,
+                       method='GET', body=None):
+        received = [0]
+        error = None
+
+        def chunks():
+            for chunk in resp.iter_content(chunk_size):
+                received[0] += len(chunk)
+                yield chunk
+
+        source = chunks()
+        try:
+            for item in iter_json_array(source):
+                yield item
+            # Read to the end of the body (normally nothing but the last
+            # chunk's terminator) so the connection can be reused.
+            for chunk in source:
+                pass
+        except self._read_errors() as err:
+            error = NetworkError("Error during request %s %s" %
+                                 (type(err), err))
+            raise error
+        finally:
+            resp.close()
+            if start is not None:
+                self._observe(label, method, start, body, resp.status_code,
+                              received[0], error=error)
+
+    def do_call(self, path, method, body=None, headers=None, label=None):
         """
         Send an HTTP request to the REST API.
 
@@ -80,27 +1049,86 @@ class HTTPClient(object):
             body of the HTTP request.
         :param dictionary headers:
             "{header-name: header-value}" dictionary.
+        :param string label: Name the call is recorded under in
+            :attr:`metrics`, normally the :attr:`pyrabbit.api.Client.urls`
+            key the path was built from.
 
         """
-        url = urljoin(self.base_url, path)
-        try:
-            resp = requests.request(method, url, data=body, headers=headers,
-                                    auth=self.auth, timeout=self.timeout)
-        except requests.exceptions.Timeout as out:
-            raise NetworkError("Timeout while trying to connect to RabbitMQ")
-        except requests.exceptions.RequestException as err:
-            # All other requests exceptions inherit from RequestException
-            raise NetworkError("Error during request %s %s" % (type(err), err))
+        if self.coalesce and method == 'GET':
+            return self._coalesced_call(path, method, body, headers, label)
+        return self._do_call(path, method, body, headers, label)
+
+    def _coalesced_call(self, path, method, body=None, headers=None,
+                        label=None):
+        """
+        Make the call unless an identical one is already in flight, in
+        which case wait for that one and share its outcome.
+
+        """
+        key = (path, tuple(sorted((headers or {}).items())))
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.coalesce_stats['issued'] += 1
+            else:
+                flight.followers += 1
+                self.coalesce_stats['saved'] += 1
+
+        if leader:
+            result = None
+            try:
+                result = self._do_call(path, method, body, headers, label)
+                return result
+            except Exception as err:
+                flight.error = err
+                raise
+            finally:
+                with self._flights_lock:
+                    del self._flights[key]
+                # Nobody can join the flight now. The followers copy from a
+                # snapshot of their own, taken before the leader's caller
+                # can modify the result.
+                if flight.followers and flight.error is None:
+                    flight.result = copy.deepcopy(result)
+                flight.done.set()
 
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        # Callers may well modify what they get back, so they can't all
+        # share the leader's object.
+        return copy.deepcopy(flight.result)
+
+    def _do_call(self, path, method, body=None, headers=None, label=None):
+        start = time.time()
         try:
-            content = resp.json()
-        except ValueError as out:
+            resp = self._request(path, method, body, headers)
+        except NetworkError as err:
+            self._observe(label, method, start, body, error=err)
+            raise
+
+        decode_start = time.time()
+        data = resp.content
+        if resp.status_code in EMPTY_STATUSES or not data:
             content = None
+        else:
+            try:
+                content = self.codec.loads(data)
+            except ValueError:
+                content = None
+        decode_seconds = time.time() - decode_start
 
         # 'success' HTTP status codes are 200-206
         if resp.status_code < 200 or resp.status_code > 206:
-            raise HTTPError(content, resp.status_code, resp.text, path, body)
+            err = HTTPError(content, resp.status_code, resp.text, path, body)
+            self._observe(label, method, start, body, resp.status_code,
+                          len(data), decode_seconds, err)
+            raise err
         else:
+            self._observe(label, method, start, body, resp.status_code,
+                          len(data), decode_seconds)
             if content:
                 return content
             else:
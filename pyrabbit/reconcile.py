@@ -0,0 +1,391 @@
+"""
+Reconciles a broker's topology with a desired state, making only the changes
+needed to get there instead of re-declaring everything.
+
+The desired state is a definitions document, or a
+:class:`pyrabbit.definitions.Definitions` built up in code. Live state is
+read with one listing call per section, both sides are indexed by each
+object's identity (e.g. (vhost, name) for queues), and the two indexes are
+compared in a single pass, so the whole diff is O(n)::
+
+    plan = reconcile.plan_changes(client, desired, prune=True)
+    print(plan)
+    result = reconcile.execute(client, plan, concurrency=8)
+
+or, in one go, ``reconcile.reconcile(client, desired, prune=True)``.
+
+Only the sections the desired state has objects in are managed, and when
+pruning, only exchanges, queues, bindings and permissions in vhosts the
+desired state mentions are deleted. Vhosts and users the desired state
+leaves out are only deleted with *prune_global* as well.
+Built-in objects (the default '/' vhost, the default exchange, amq.*
+exchanges and the default exchange's implicit bindings) and the client's own
+user are never deleted.
+
+Queue and exchange properties can't be changed in place. Objects whose
+properties differ are reported in :attr:`Plan.conflicts` and left alone.
+"""
+
+import json
+
+from .bulk import BulkResult, run_concurrently
+from .definitions import Definitions, SECTIONS, document_for
+
+#: Fields compared for each section, with the default used when the desired
+#: state leaves a field out.
+COMPARED = {
+    'vhosts': {},
+    'users': {'tags': ''},
+    'permissions': {'configure': '', 'write': '', 'read': ''},
+    'exchanges': {'type': 'direct', 'durable': True, 'auto_delete': False,
+                  'internal': False, 'arguments': {}},
+    'queues': {'durable': True, 'auto_delete': False, 'arguments': {}},
+    'bindings': {},
+}
+
+#: Sections whose objects can be brought up to date by declaring them again.
+UPDATABLE = ('users', 'permissions')
+
+
+def _arguments_key(arguments):
+    return json.dumps(arguments or {}, sort_keys=True)
+
+
+def identity(section, obj):
+    """
+    The key an object is indexed by: what makes it the same object on the
+    broker regardless of its other properties.
+
+    """
+    if section in ('vhosts', 'users'):
+        return obj['name']
+    if section == 'permissions':
+        return (obj['vhost'], obj['user'])
+    if section == 'bindings':
+        return (obj['vhost'], obj['source'], obj['destination_type'],
+                obj['destination'], obj.get('routing_key') or '',
+                _arguments_key(obj.get('arguments')))
+    return (obj['vhost'], obj['name'])
+
+
+def _normalize(section, field, value):
+    if field == 'arguments':
+        return value or {}
+    if field == 'tags':
+        # Newer brokers send tags as a list, older ones as a string.
+        if not isinstance(value, list):
+            value = (value or '').split(',')
+        return sorted(tag.strip() for tag in value if tag.strip())
+    return value
+
+
+def _differences(section, desired, live):
+    changed = []
+    for field, default in sorted(COMPARED[section].items()):
+        want = _normalize(section, field, desired.get(field, default))
+        have = _normalize(section, field, live.get(field, default))
+        if want != have:
+            changed.append(field)
+    return changed
+
+
+def _builtin(section, obj, user):
+    if section == 'vhosts':
+        return obj['name'] == '/'
+    if section == 'exchanges':
+        return obj['name'] == '' or obj['name'].startswith('amq.')
+    if section == 'bindings':
+        return obj['source'] == ''
+    if section == 'users':
+        return obj['name'] == user
+    return False
+
+
+class Plan(object):
+    """
+    The changes needed to bring a broker to the desired state.
+
+    ``creates``, ``updates`` and ``deletes`` are lists of (section, object)
+    tuples. ``conflicts`` is a list of (section, desired, live, fields)
+    tuples for objects that exist with different properties that can't be
+    changed in place.
+
+    """
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.deletes = []
+        self.conflicts = []
+
+    def __bool__(self):
+        return bool(self.creates or self.updates or self.deletes)
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def __repr__(self):
+        return ('<Plan: %d creates, %d updates, %d deletes, %d conflicts>' %
+                (len(self.creates), len(self.updates), len(self.deletes),
+                 len(self.conflicts)))
+
+
+def diff(desired, live, prune=False, sections=None, user=None,
+         prune_global=False):
+    """
+    Work out what needs to change to turn *live* into *desired*.
+
+    :param desired: The desired state, as a
+        :class:`pyrabbit.definitions.Definitions` or a document dict.
+    :param live: The live state, in the same form.
+    :param bool prune: Also plan deletes of live exchanges, queues, bindings
+        and permissions that aren't in the desired state, in the vhosts it
+        mentions.
+    :param sections: The sections to compare. Defaults to the ones the
+        desired state has objects in.
+    :param string user: A user never to delete; normally the one making
+        the changes.
+    :param bool prune_global: With *prune*, also plan deletes of live
+        vhosts and users that aren't in the desired state, and so of
+        everything in those vhosts.
+    :returns: :class:`Plan`
+
+    """
+    if not isinstance(desired, Definitions):
+        desired = Definitions(desired)
+    if not isinstance(live, Definitions):
+        live = Definitions(live)
+    if sections is None:
+        sections = [s for s in SECTIONS if desired.sections[s]]
+
+    vhosts = set()
+    for section in sections:
+        for obj in desired.sections[section]:
+            vhosts.add(obj['name'] if section == 'vhosts' else
+                       obj.get('vhost'))
+
+    plan = Plan()
+    for section in SECTIONS:
+        if section not in sections:
+            continue
+        live_index = dict((identity(section, obj), obj)
+                          for obj in live.sections[section])
+        wanted = set()
+        for obj in desired.sections[section]:
+            key = identity(section, obj)
+            wanted.add(key)
+            current = live_index.get(key)
+            if current is None:
+                plan.creates.append((section, obj))
+                continue
+            changed = _differences(section, obj, current)
+            if not changed:
+                continue
+            if section in UPDATABLE:
+                plan.updates.append((section, obj))
+            else:
+                plan.conflicts.append((section, obj, current, changed))
+
+        if not prune:
+            continue
+        for key, obj in live_index.items():
+            if key in wanted or _builtin(section, obj, user):
+                continue
+            if section in ('vhosts', 'users'):
+                if not prune_global:
+                    continue
+            elif obj.get('vhost') not in vhosts:
+                continue
+            plan.deletes.append((section, obj))
+
+    # Delete dependents before the objects they depend on.
+    order = dict((section, i) for i, section in enumerate(SECTIONS))
+    plan.deletes.sort(key=lambda item: -order[item[0]])
+    return plan
+
+
+def fetch_live(client, sections=SECTIONS):
+    """
+    Read the live state of the given sections from the broker, with one
+    listing call per section.
+
+    :returns: a definitions document dict
+
+    """
+    def plain(objs):
+        return [obj if isinstance(obj, dict) else obj.to_dict()
+                for obj in objs or []]
+
+    fetchers = {
+        'vhosts': client.get_all_vhosts,
+        'users': client.get_users,
+        'permissions': client.get_permissions,
+        'exchanges': client.get_exchanges,
+        'queues': lambda: client.get_queues(
+            columns=['name', 'vhost', 'durable', 'auto_delete',
+                     'arguments']),
+        'bindings': client.get_bindings,
+    }
+    return dict((section, plain(fetchers[section]()))
+                for section in sections)
+
+
+def plan_changes(client, desired, prune=False, sections=None,
+                 prune_global=False):
+    """
+    Read the live state from the broker and :func:`diff` it against
+    *desired*.
+
+    :returns: :class:`Plan`
+
+    """
+    if not isinstance(desired, Definitions):
+        desired = Definitions(desired)
+    if sections is None:
+        sections = [s for s in SECTIONS if desired.sections[s]]
+    live = fetch_live(client, sections)
+    return diff(desired, live, prune, sections, client.user, prune_global)
+
+
+def _create_call(client, section, obj):
+    if section == 'vhosts':
+        return client.create_vhost(obj['name'])
+    if section == 'users':
+        return client.create_user(obj['name'], obj.get('password', ''),
+                                  obj.get('tags', ''),
+                                  obj.get('password_hash'))
+    if section == 'permissions':
+        return client.set_vhost_permissions(obj['vhost'], obj['user'],
+                                            obj.get('configure', ''),
+                                            obj.get('read', ''),
+                                            obj.get('write', ''))
+    if section == 'exchanges':
+        return client.create_exchange(obj['vhost'], obj['name'],
+                                      obj.get('type', 'direct'),
+                                      obj.get('auto_delete', False),
+                                      obj.get('durable', True),
+                                      obj.get('internal', False),
+                                      obj.get('arguments') or {})
+    if section == 'queues':
+        return client.create_queue(obj['vhost'], obj['name'],
+                                   durable=obj.get('durable', True),
+                                   auto_delete=obj.get('auto_delete', False),
+                                   arguments=obj.get('arguments') or {})
+    if obj['destination_type'] == 'exchange':
+        return client.create_exchange_binding(obj['vhost'], obj['source'],
+                                              obj['destination'],
+                                              obj.get('routing_key'),
+                                              obj.get('arguments'))
+    return client.create_binding(obj['vhost'], obj['source'],
+                                 obj['destination'], obj.get('routing_key'),
+                                 obj.get('arguments'))
+
+
+def _delete_call(client, section, obj):
+    if section == 'vhosts':
+        return client.delete_vhost(obj['name'])
+    if section == 'users':
+        return client.delete_user(obj['name'])
+    if section == 'permissions':
+        return client.delete_permission(obj['vhost'], obj['user'])
+    if section == 'exchanges':
+        return client.delete_exchange(obj['vhost'], obj['name'])
+    if section == 'queues':
+        return client.delete_queue(obj['vhost'], obj['name'])
+    if obj['destination_type'] == 'exchange':
+        return client.delete_exchange_binding(obj['vhost'], obj['source'],
+                                              obj['destination'],
+                                              obj['properties_key'])
+    return client.delete_binding(obj['vhost'], obj['source'],
+                                 obj['destination'], obj['properties_key'])
+
+
+def _run_by_section(client, call, items, action, concurrency, result):
+    """
+    Run *call* over *items* section by section, in the order given, so that
+    e.g. all queues exist before any bindings to them are made.
+
+    """
+    for section in SECTIONS if action != 'delete' else reversed(SECTIONS):
+        batch = [obj for s, obj in items if s == section]
+        if not batch:
+            continue
+        outcome = run_concurrently(lambda obj: call(client, section, obj),
+                                   batch, concurrency)
+        result.results.extend(((action, section, obj), value)
+                              for obj, value in outcome.results)
+        result.errors.extend(((action, section, obj), err)
+                             for obj, err in outcome.errors)
+
+
+def execute(client, plan, concurrency=None, use_definitions=True):
+    """
+    Carry out a :class:`Plan`.
+
+    Creates and updates are sent as a single definitions import (see
+    :meth:`pyrabbit.api.Client.apply_definitions`), or, with
+    *use_definitions* False, as individual calls for users who aren't
+    allowed to import definitions. Deletes are always individual calls.
+    Individual calls run up to *concurrency* at a time, a section at a time.
+    A user can only be updated if its desired state has a ``password`` or
+    ``password_hash``; otherwise the update fails with a ValueError.
+
+    :param int concurrency: Maximum number of calls in flight. Defaults to
+        the client's *max_concurrency*.
+    :returns: :class:`pyrabbit.bulk.BulkResult` with one
+        ('create'|'update'|'delete', section, object) item per change.
+
+    """
+    concurrency = concurrency or client.max_concurrency
+    result = BulkResult()
+
+    # Declaring a user again without a credential would reset its password.
+    updates = []
+    for section, obj in plan.updates:
+        if (section == 'users' and 'password' not in obj and
+                'password_hash' not in obj):
+            result.errors.append((('update', section, obj), ValueError(
+                "Not updating user %r: the desired state has no password "
+                "or password_hash for it" % obj['name'])))
+        else:
+            updates.append((section, obj))
+
+    upserts = ([('create', item) for item in plan.creates] +
+               [('update', item) for item in updates])
+    if use_definitions and upserts:
+        actions = dict(((s, identity(s, obj)), action)
+                       for action, (s, obj) in upserts)
+        imported = client.apply_definitions(
+            document_for(item for action, item in upserts))
+        for (s, obj), value in imported.results:
+            action = actions[(s, identity(s, obj))]
+            result.results.append(((action, s, obj), value))
+        for (s, obj), err in imported.errors:
+            action = actions[(s, identity(s, obj))]
+            result.errors.append(((action, s, obj), err))
+    else:
+        _run_by_section(client, _create_call, plan.creates, 'create',
+                        concurrency, result)
+        _run_by_section(client, _create_call, updates, 'update',
+                        concurrency, result)
+
+    _run_by_section(client, _delete_call, plan.deletes, 'delete',
+                    concurrency, result)
+    return result
+
+
+def reconcile(client, desired, prune=False, dry_run=False, concurrency=None,
+              use_definitions=True, prune_global=False):
+    """
+    Plan the changes needed to reach *desired* and, unless *dry_run* is
+    set, carry them out. See :func:`plan_changes` and :func:`execute`.
+
+    :returns: a (:class:`Plan`, :class:`pyrabbit.bulk.BulkResult`) tuple.
+        The result is None for a dry run.
+
+    """
+    plan = plan_changes(client, desired, prune, prune_global=prune_global)
+    if dry_run:
+        return plan, None
+    return plan, execute(client, plan, concurrency, use_definitions)
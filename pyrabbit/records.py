@@ -0,0 +1,189 @@
+"""
+Compact, typed stand-ins for the dicts the API returns. A Client created
+with ``result_type='records'`` hands these back from its queue, exchange,
+binding, connection, channel and node methods instead of dicts.
+
+Each record keeps the commonly used fields in ``__slots__`` attributes, and
+repeated strings like vhost and node names are interned. Everything else the
+API sent (message_stats, backing_queue_status, etc.) is held as a compact
+JSON string and only decoded the first time it's asked for. Together that
+makes a record a fraction of the size of the dict it replaces.
+
+Fields are read as attributes (``queue.messages``) or, to ease porting code
+written against dicts, by key (``queue['messages']``). Fields the API didn't
+send are None.
+"""
+
+import json
+
+try:
+    from sys import intern as _intern
+except ImportError:
+    # python 2.x, where intern is a builtin that only takes byte strings,
+    # and json decodes to unicode.
+    import __builtin__
+
+    def _intern(value):
+        if isinstance(value, str):
+            return __builtin__.intern(value)
+        return value
+
+try:
+    _string_types = (str, unicode)
+except NameError:
+    _string_types = (str,)
+
+_MISSING = object()
+
+
+class Record(object):
+    """
+    Base class for all records. Subclasses list their attribute fields in
+    ``fields``, and the ones worth interning in ``interned``.
+
+    """
+    __slots__ = ('_extra',)
+    fields = ()
+    interned = ()
+
+    def __init__(self, data):
+        """
+        :param dict data: An object as decoded from the API.
+
+        """
+        data = dict(data)
+        for field in self.fields:
+            value = data.pop(field, None)
+            if field in self.interned and isinstance(value, _string_types):
+                value = _intern(value)
+            setattr(self, field, value)
+        if data:
+            self._extra = json.dumps(data, separators=(',', ':'))
+        else:
+            self._extra = None
+
+    @property
+    def extra(self):
+        """
+        A dict of the fields not kept as attributes. Decoded on first use.
+
+        """
+        if self._extra is None:
+            self._extra = {}
+        elif isinstance(self._extra, _string_types):
+            self._extra = json.loads(self._extra)
+        return self._extra
+
+    def __getattr__(self, name):
+        # Only called for names that aren't slots, so this is where the
+        # less common fields are looked up.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.extra[name]
+        except KeyError:
+            raise AttributeError("%s has no field '%s'" %
+                                 (type(self).__name__, name))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        """Like dict.get()."""
+        value = getattr(self, key, _MISSING)
+        if value is _MISSING:
+            return default
+        return value
+
+    def to_dict(self):
+        """
+        Return the record as a plain dict, as the API sent it.
+
+        """
+        result = dict(self.extra)
+        for field in self.fields:
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = value
+        return result
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        key = ', '.join('%s=%r' % (field, getattr(self, field))
+                        for field in self.fields[:2])
+        return '<%s %s>' % (type(self).__name__, key)
+
+
+class Queue(Record):
+    fields = ('name', 'vhost', 'node', 'state', 'durable', 'auto_delete',
+              'exclusive', 'messages', 'messages_ready',
+              'messages_unacknowledged', 'consumers')
+    __slots__ = fields
+    interned = frozenset(('vhost', 'node', 'state'))
+
+
+class Exchange(Record):
+    fields = ('name', 'vhost', 'type', 'durable', 'auto_delete', 'internal')
+    __slots__ = fields
+    interned = frozenset(('vhost', 'type'))
+
+
+class Binding(Record):
+    fields = ('source', 'vhost', 'destination', 'destination_type',
+              'routing_key', 'properties_key')
+    __slots__ = fields
+    interned = frozenset(('source', 'vhost', 'destination_type'))
+
+
+class Connection(Record):
+    fields = ('name', 'vhost', 'user', 'node', 'state', 'host', 'port',
+              'peer_host', 'peer_port', 'channels', 'protocol')
+    __slots__ = fields
+    interned = frozenset(('vhost', 'user', 'node', 'state', 'host',
+                          'peer_host', 'protocol'))
+
+
+class Channel(Record):
+    fields = ('name', 'vhost', 'user', 'node', 'state', 'number',
+              'consumer_count', 'messages_unacknowledged', 'prefetch_count')
+    __slots__ = fields
+    interned = frozenset(('vhost', 'user', 'node', 'state'))
+
+
+class Node(Record):
+    fields = ('name', 'type', 'running', 'mem_used', 'mem_limit', 'fd_used',
+              'fd_total', 'sockets_used', 'sockets_total', 'proc_used',
+              'proc_total', 'disk_free', 'disk_free_limit', 'uptime')
+    __slots__ = fields
+    interned = frozenset(('name', 'type'))
+
+
+def wrap(record_class, data):
+    """
+    Convert API output to records: a dict becomes one record, and a list or
+    generator of dicts a list or generator of records. None is passed
+    through.
+
+    """
+    if data is None:
+        return None
+    if isinstance(data, dict):
+        return record_class(data)
+    if isinstance(data, list):
+        return [record_class(item) for item in data]
+    return (record_class(item) for item in data)
@@ -0,0 +1,301 @@
+"""
+Periodic sampling of queue, node and overview statistics into fixed-size
+time series, for rates and trends without keeping ever-growing lists::
+
+    sampler = Sampler(client, interval=10, capacity=60)
+    sampler.start()
+    ...
+    sampler.rate('queues', 'message_stats.publish', ('/', 'jobs'), 60)
+    sampler.growth('queues', 'messages', ('/', 'jobs'), 300)
+    sampler.churn('queues', 'consumers', ('/', 'jobs'), 300)
+    sampler.rate('overview', 'message_stats.publish')
+    sampler.stop()
+
+Each :class:`Source` polls one endpoint and keeps a few numeric fields of
+every object it returns. The last *capacity* values of an object are held
+in one :class:`array.array` of doubles, used as a ring buffer, and the poll
+times once per source, so memory is fixed by the number of objects,
+fields and *capacity* (8 bytes each) however long the sampler runs.
+Objects missing from a poll, such as deleted queues, are dropped.
+"""
+
+import array
+import threading
+import time
+
+NAN = float('nan')
+
+
+def _lookup(obj, field):
+    """The value of dotted *field* in *obj* as a float, or NaN."""
+    for part in field.split('.'):
+        if not hasattr(obj, 'get'):
+            return NAN
+        obj = obj.get(part)
+        if obj is None:
+            return NAN
+    try:
+        return float(obj)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class Source(object):
+    """
+    An endpoint for a :class:`Sampler` to poll.
+
+    """
+
+    def __init__(self, name, fetch, fields, key=None):
+        """
+        :param string name: What the source's series are looked up by.
+        :param callable fetch: Called with the client; returns a list of
+            objects, or a single one.
+        :param list fields: The numeric fields to keep, dotted for nested
+            ones, e.g. 'message_stats.publish'.
+        :param callable key: Returns the key an object is stored under, e.g.
+            its (vhost, name). None for sources with a single object, which
+            is stored under None.
+
+        """
+        self.name = name
+        self.fetch = fetch
+        self.fields = list(fields)
+        self.key = key
+
+
+QUEUE_FIELDS = ['messages', 'messages_ready', 'messages_unacknowledged',
+                'consumers', 'message_stats.publish',
+                'message_stats.deliver_get', 'message_stats.ack']
+
+NODE_FIELDS = ['mem_used', 'fd_used', 'sockets_used', 'proc_used',
+               'disk_free']
+
+OVERVIEW_FIELDS = ['queue_totals.messages', 'queue_totals.messages_ready',
+                   'queue_totals.messages_unacknowledged',
+                   'message_stats.publish', 'message_stats.deliver_get',
+                   'message_stats.ack', 'object_totals.connections',
+                   'object_totals.channels', 'object_totals.consumers',
+                   'object_totals.queues']
+
+#: The sources a :class:`Sampler` can be given by name.
+SOURCES = {
+    'queues': Source(
+        'queues',
+        lambda client: client.get_queues(
+            columns=['vhost', 'name'] + QUEUE_FIELDS),
+        QUEUE_FIELDS, key=lambda queue: (queue['vhost'], queue['name'])),
+    'nodes': Source('nodes', lambda client: client.get_nodes(), NODE_FIELDS,
+                    key=lambda node: node['name']),
+    'overview': Source('overview', lambda client: client.get_overview(),
+                       OVERVIEW_FIELDS),
+}
+
+
+class _Track(object):
+    """One object's values: *capacity* rows of one value per field."""
+    __slots__ = ('first', 'data')
+
+    def __init__(self, first, size):
+        #: The poll the object was first seen in.
+        self.first = first
+        self.data = array.array('d', [NAN]) * size
+
+
+class _Store(object):
+    """The poll times and per-object values of one source."""
+
+    def __init__(self, source, capacity):
+        self.source = source
+        self.width = len(source.fields)
+        self.columns = dict((field, i) for i, field in
+                            enumerate(source.fields))
+        self.times = array.array('d', [0.0]) * capacity
+        self.polls = 0
+        self.tracks = {}
+
+    def record(self, objects, now):
+        capacity = len(self.times)
+        poll = self.polls
+        base = (poll % capacity) * self.width
+        key, fields = self.source.key, self.source.fields
+        tracks, old = {}, self.tracks
+        for obj in objects:
+            name = key(obj) if key is not None else None
+            track = old.get(name)
+            if track is None:
+                track = _Track(poll, capacity * self.width)
+            data = track.data
+            for i, field in enumerate(fields):
+                data[base + i] = _lookup(obj, field)
+            tracks[name] = track
+        self.times[poll % capacity] = now
+        self.tracks = tracks
+        self.polls = poll + 1
+
+    def series(self, field, key, window):
+        track = self.tracks.get(key)
+        if track is None:
+            return []
+        try:
+            column = self.columns[field]
+        except KeyError:
+            raise ValueError("%r isn't sampled from %s" %
+                             (field, self.source.name))
+        capacity = len(self.times)
+        last = self.polls - 1
+        first = max(track.first, last - capacity + 1)
+        since = None
+        if window is not None:
+            since = self.times[last % capacity] - window
+        points = []
+        for poll in range(first, last + 1):
+            slot = poll % capacity
+            when = self.times[slot]
+            value = track.data[slot * self.width + column]
+            if (since is None or when >= since) and value == value:
+                points.append((when, value))
+        return points
+
+
+class Sampler(object):
+    """
+    Polls its sources every *interval* seconds in a background thread,
+    between :meth:`start` and :meth:`stop`, keeping the last *capacity*
+    samples of each object. :meth:`sample` takes one round of samples in
+    the calling thread instead.
+
+    A failed poll is counted in :attr:`errors`, with the exception kept in
+    :attr:`last_error`, and the sampler carries on.
+
+    """
+
+    def __init__(self, client, sources=('queues', 'nodes', 'overview'),
+                 interval=10, capacity=60, clock=time.time):
+        """
+        :param client: The :class:`pyrabbit.api.Client` to poll with.
+        :param list sources: Names from :data:`SOURCES` and/or
+            :class:`Source` objects.
+        :param float interval: Seconds between the starts of polls.
+        :param int capacity: Samples kept per object.
+        :param callable clock: Returns the current time in seconds.
+
+        """
+        self.client = client
+        self.interval = interval
+        self.capacity = capacity
+        self.clock = clock
+        self._stores = {}
+        for source in sources:
+            if not isinstance(source, Source):
+                source = SOURCES[source]
+            self._stores[source.name] = _Store(source, capacity)
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start polling in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling, waiting for a poll in progress to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = self.clock()
+            self.sample()
+            self._stop.wait(max(0, self.interval -
+                                (self.clock() - started)))
+
+    def sample(self):
+        """Poll every source once."""
+        for store in self._stores.values():
+            try:
+                objects = store.source.fetch(self.client)
+            except Exception as err:
+                self.errors += 1
+                self.last_error = err
+                continue
+            if objects is None:
+                objects = []
+            elif not isinstance(objects, list):
+                objects = [objects]
+            now = self.clock()
+            with self._lock:
+                store.record(objects, now)
+
+    def keys(self, source):
+        """The keys of the objects in *source*'s latest poll."""
+        with self._lock:
+            return list(self._stores[source].tracks)
+
+    def series(self, source, field, key=None, window=None):
+        """
+        The samples of *field* of the object under *key*, as a list of
+        ``(time, value)`` pairs, oldest first. Samples where the field was
+        missing are left out.
+
+        :param float window: Only return samples from the last this many
+            seconds, counting back from the latest poll.
+
+        """
+        with self._lock:
+            return self._stores[source].series(field, key, window)
+
+    def latest(self, source, field, key=None):
+        """The latest value of *field*, or None."""
+        points = self.series(source, field, key)
+        return points[-1][1] if points else None
+
+    def rate(self, source, field, key=None, window=None):
+        """
+        The per-second rate of increase of counter *field*, such as
+        'message_stats.publish' for msgs/sec, over *window* seconds. A
+        counter that goes down is taken to have been reset to zero, as
+        happens when a node restarts. None with fewer than two samples.
+
+        """
+        points = self.series(source, field, key, window)
+        if len(points) < 2 or points[-1][0] == points[0][0]:
+            return None
+        increase = 0.0
+        for (t0, previous), (t1, value) in zip(points, points[1:]):
+            increase += value - previous if value >= previous else value
+        return increase / (points[-1][0] - points[0][0])
+
+    def growth(self, source, field, key=None, window=None):
+        """
+        The per-second change of gauge *field*, such as a queue's
+        'messages' depth, from the first to the last sample in *window*
+        seconds. Negative while it shrinks. None with fewer than two
+        samples.
+
+        """
+        points = self.series(source, field, key, window)
+        if len(points) < 2 or points[-1][0] == points[0][0]:
+            return None
+        return ((points[-1][1] - points[0][1]) /
+                (points[-1][0] - points[0][0]))
+
+    def churn(self, source, field, key=None, window=None):
+        """
+        The total of the changes, up and down, between consecutive samples
+        of *field* in *window* seconds; for 'consumers', roughly how many
+        consumers came and went.
+
+        """
+        points = self.series(source, field, key, window)
+        return sum(abs(value - previous) for (t0, previous), (t1, value)
+                   in zip(points, points[1:]))
@@ -0,0 +1,960 @@
+"""
+A stateful, in-memory fake of the RabbitMQ management API, for tests and
+load simulations that shouldn't need a broker or even a socket.
+
+:class:`FakeBroker` plugs into a client as its transport::
+
+    broker = FakeBroker()
+    client = Client('localhost:15672/api/', 'guest', 'guest',
+                    transport=broker)
+    client.create_vhost('app')
+    client.create_queue('app', 'jobs')
+    client.publish('app', 'amq.default', 'jobs', 'hello')
+    broker.queue('app', 'jobs')['messages']     # -> 1
+
+It keeps vhosts, users, permissions, exchanges, queues (with their
+messages), bindings and connections, and implements the routes in
+:attr:`pyrabbit.api.Client.urls` with the broker's semantics: objects need
+their vhost, re-declaring with different properties is refused, deleting a
+queue or exchange drops its bindings, deleting a vhost drops everything in
+it, and published messages are routed through direct, fanout, topic and
+exchange-to-exchange bindings. Listings support the API's pagination,
+filtering and ``columns`` parameters, and definitions can be exported and
+imported.
+
+Credentials are checked, but permissions and user tags aren't enforced.
+
+To study how code behaves against a slow or struggling broker, give the
+fake a *latency*, random *error_rate* and *network_error_rate*, or script
+failures with :meth:`FakeBroker.fail`.
+"""
+
+import base64
+import collections
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+try:
+    from urllib.parse import parse_qsl, unquote, urlparse
+except ImportError:
+    # python 2.x
+    from urllib import unquote
+    from urlparse import parse_qsl, urlparse
+
+from .http import NetworkError, Response
+
+#: Exchanges every vhost is created with, and their types.
+DEFAULT_EXCHANGES = (('', 'direct'), ('amq.direct', 'direct'),
+                     ('amq.fanout', 'fanout'), ('amq.headers', 'headers'),
+                     ('amq.match', 'headers'), ('amq.topic', 'topic'))
+
+NODE = 'rabbit@fake'
+
+#: How user passwords are hashed; the broker's default.
+HASHING_ALGORITHM = 'rabbit_password_hashing_sha256'
+
+_MISSING = object()
+
+
+class _Error(Exception):
+    """An error response from the fake API."""
+    def __init__(self, status, reason):
+        Exception.__init__(self, reason)
+        self.status = status
+        self.reason = reason
+
+    @property
+    def body(self):
+        errors = {400: 'bad_request', 401: 'not_authorised',
+                  403: 'access_refused', 404: 'Object Not Found'}
+        return {'error': errors.get(self.status, 'error'),
+                'reason': self.reason}
+
+
+def _not_found(what):
+    return _Error(404, 'Not Found: %s' % what)
+
+
+def _inequivalent(kind, name, field):
+    return _Error(400, "PRECONDITION_FAILED - inequivalent arg '%s' for %s "
+                       "'%s'" % (field, kind, name))
+
+
+def _arguments(value):
+    # The client sends an empty list where the API means an empty dict.
+    return value or {}
+
+
+def properties_key(routing_key, arguments):
+    """
+    The key the API identifies a binding by among all those between the
+    same source and destination.
+
+    """
+    if not arguments:
+        return routing_key or '~'
+    digest = hashlib.md5(json.dumps(arguments, sort_keys=True)
+                         .encode('utf-8')).hexdigest()[:22]
+    return '%s~%s' % (routing_key, digest)
+
+
+def hash_password(password, salt=None):
+    """
+    Hash *password* the way the broker does by default, for a user's
+    ``password_hash``: a four byte salt followed by the SHA-256 of the salt
+    and the UTF-8 password, base64 encoded.
+
+    """
+    if salt is None:
+        salt = os.urandom(4)
+    digest = hashlib.sha256(salt + password.encode('utf-8')).digest()
+    return base64.b64encode(salt + digest).decode('ascii')
+
+
+def _check_password(password_hash, password):
+    try:
+        salt = base64.b64decode(password_hash)[:4]
+    except (TypeError, ValueError):
+        return False
+    return hash_password(password, salt) == password_hash
+
+
+def topic_matches(pattern, routing_key):
+    """
+    True if a topic exchange binding with *pattern* matches *routing_key*:
+    '*' stands for exactly one word and '#' for zero or more.
+
+    """
+    words, keys = pattern.split('.'), routing_key.split('.')
+
+    def match(w, k):
+        if w == len(words):
+            return k == len(keys)
+        if words[w] == '#':
+            return any(match(w + 1, rest) for rest in range(k, len(keys) + 1))
+        if k == len(keys):
+            return False
+        return words[w] in ('*', keys[k]) and match(w + 1, k + 1)
+
+    return match(0, 0)
+
+
+def _project(obj, columns):
+    result = {}
+    for column in columns:
+        value, target, parts = obj, result, column.split('.')
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return result
+
+
+def _listing(items, query):
+    """Apply the API's filtering, column and pagination parameters."""
+    name = query.get('name')
+    if name:
+        if query.get('use_regex') == 'true':
+            regex = re.compile(name)
+            items = [i for i in items if regex.search(i.get('name', ''))]
+        else:
+            items = [i for i in items if name in i.get('name', '')]
+    columns = query.get('columns')
+    if columns:
+        columns = columns.split(',')
+        items = [_project(i, columns) for i in items]
+    if 'page' not in query:
+        return items
+    page = int(query['page'])
+    size = int(query.get('page_size', 100))
+    start = (page - 1) * size
+    selected = items[start:start + size]
+    return {'items': selected, 'page': page, 'page_size': size,
+            'page_count': max(1, -(-len(items) // size)),
+            'item_count': len(selected), 'filtered_count': len(items),
+            'total_count': len(items)}
+
+
+def _wildcard(pattern):
+    return '*' in pattern.split('.') or '#' in pattern.split('.')
+
+
+class _Bindings(collections.OrderedDict):
+    """
+    Bindings keyed by (vhost, source, destination type, destination,
+    properties key), also indexed by source, by source and routing key,
+    and by destination, so that routing and deletes don't scan every
+    binding.
+
+    """
+
+    def __init__(self):
+        collections.OrderedDict.__init__(self)
+        self._by_source = {}
+        self._by_routing_key = {}
+        self._wildcards = {}
+        self._by_destination = {}
+
+    def _indexes(self, key, binding):
+        yield self._by_source, key[:2]
+        yield self._by_routing_key, key[:2] + (binding['routing_key'],)
+        if _wildcard(binding['routing_key']):
+            yield self._wildcards, key[:2]
+        yield self._by_destination, (key[0],) + key[2:4]
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            for index, at in self._indexes(key, value):
+                index.setdefault(at, collections.OrderedDict())[key] = True
+        collections.OrderedDict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        for index, at in self._indexes(key, self[key]):
+            keys = index[at]
+            del keys[key]
+            if not keys:
+                del index[at]
+        collections.OrderedDict.__delitem__(self, key)
+
+    def _pairs(self, keys):
+        return [(key, self[key]) for key in keys]
+
+    def from_source(self, vhost, source):
+        """The (key, binding) pairs with exchange *source* as source."""
+        return self._pairs(self._by_source.get((vhost, source), ()))
+
+    def to_destination(self, vhost, dtype, destination):
+        """The (key, binding) pairs to *destination* of type *dtype*."""
+        return self._pairs(self._by_destination.get(
+            (vhost, dtype, destination), ()))
+
+    def matching(self, vhost, source, xtype, routing_key):
+        """
+        The (key, binding) pairs from exchange *source*, of type *xtype*,
+        that a message with *routing_key* is routed along.
+
+        """
+        if xtype == 'direct':
+            return self._pairs(self._by_routing_key.get(
+                (vhost, source, routing_key), ()))
+        if xtype != 'topic':
+            # fanout; headers exchanges are treated alike, since matching
+            # on headers isn't modelled.
+            return self.from_source(vhost, source)
+        keys = collections.OrderedDict(
+            (key, True) for key in self._by_routing_key.get(
+                (vhost, source, routing_key), ())
+            if not _wildcard(self[key]['routing_key']))
+        for key in self._wildcards.get((vhost, source), ()):
+            if topic_matches(self[key]['routing_key'], routing_key):
+                keys[key] = True
+        return self._pairs(keys)
+
+
+class FakeBroker(object):
+    """
+    An in-memory broker behind a fake management API. Safe to share
+    between threads and between clients logged in as different users.
+
+    """
+
+    def __init__(self, users=None, latency=0, error_rate=0.0,
+                 error_status=503, network_error_rate=0.0, seed=None,
+                 sleep=time.sleep):
+        """
+        :param dict users: Usernames mapped to passwords. Each gets full
+            permissions on the default vhost '/'. Defaults to guest/guest.
+        :param latency: Seconds to wait before answering each request, or a
+            callable returning them (to draw from a distribution, say).
+        :param float error_rate: Fraction of requests, picked at random,
+            answered with *error_status* instead of being carried out.
+        :param int error_status: Status used for random errors.
+        :param float network_error_rate: Fraction of requests, picked at
+            random, that fail with :class:`pyrabbit.http.NetworkError` as if
+            the broker couldn't be reached.
+        :param seed: Seed for the random failures, to make runs repeatable.
+        :param callable sleep: Waits for the given number of seconds.
+
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.network_error_rate = network_error_rate
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._faults = []
+        self._lock = threading.RLock()
+        self._user = None
+        self._journal = None
+        #: Requests received, by HTTP method.
+        self.requests = collections.defaultdict(int)
+        #: Broker-wide message counts, as reported by the overview.
+        self.message_stats = {'publish': 0, 'deliver_get': 0}
+
+        self.vhosts = collections.OrderedDict()
+        self.users = collections.OrderedDict()
+        self.permissions = collections.OrderedDict()
+        self.exchanges = collections.OrderedDict()
+        self.queues = collections.OrderedDict()
+        self.bindings = _Bindings()
+        self.connections = collections.OrderedDict()
+
+        self.add_vhost('/')
+        for name, password in sorted((users or {'guest': 'guest'}).items()):
+            self.add_user(name, password, 'administrator')
+            self.permissions[('/', name)] = {
+                'vhost': '/', 'user': name, 'configure': '.*',
+                'write': '.*', 'read': '.*'}
+
+    ##################################################
+    # Setting up and inspecting state
+    ##################################################
+    def add_vhost(self, name):
+        """Create a vhost, with its default exchanges."""
+        with self._lock:
+            if name in self.vhosts:
+                return
+            self._set(self.vhosts, name, {'name': name})
+            for xname, xtype in DEFAULT_EXCHANGES:
+                self._set(self.exchanges, (name, xname), {
+                    'name': xname, 'vhost': name, 'type': xtype,
+                    'durable': True, 'auto_delete': False,
+                    'internal': False, 'arguments': {}})
+
+    def add_user(self, name, password, tags='', password_hash=None):
+        """
+        Add or replace a user. Only a hash of the password is kept, and
+        listed in its place; a *password_hash* is kept as given, and lets
+        the user log in if it's one :func:`hash_password` could have made.
+
+        """
+        if password_hash is None:
+            password_hash = hash_password(password or '')
+        user = {'name': name, 'password_hash': password_hash,
+                'hashing_algorithm': HASHING_ALGORITHM, 'tags': tags}
+        with self._lock:
+            self._set(self.users, name, user)
+
+    def add_connection(self, name, vhost='/', user='guest', **fields):
+        """
+        Register a client connection, so there's something for the
+        connection methods to list and close.
+
+        """
+        with self._lock:
+            conn = {'name': name, 'vhost': vhost, 'user': user,
+                    'node': NODE, 'state': 'running', 'channels': 0,
+                    'protocol': 'AMQP 0-9-1'}
+            conn.update(fields)
+            self.connections[name] = conn
+
+    def queue(self, vhost, name):
+        """
+        Return a queue as the API would show it, or None if it doesn't
+        exist.
+
+        """
+        with self._lock:
+            queue = self.queues.get((vhost, name))
+            return self._queue_view(queue) if queue else None
+
+    def fail(self, status=503, count=1, method=None, path=None):
+        """
+        Make the next *count* matching requests fail without being carried
+        out.
+
+        :param int status: HTTP status to answer with, or None to raise
+            :class:`pyrabbit.http.NetworkError` instead.
+        :param string method: Only fail requests with this HTTP method.
+        :param string path: Only fail requests whose path (after /api/)
+            matches this regular expression.
+
+        """
+        with self._lock:
+            self._faults.append([status, count, method,
+                                 re.compile(path) if path else None])
+
+    ##################################################
+    # The transport interface
+    ##################################################
+    def request(self, method, url, data=None, headers=None, timeout=None,
+                stream=False, auth=None):
+        """
+        Handle one API request, as :class:`pyrabbit.http.HTTPClient` sends
+        them to its transport.
+
+        """
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            self.sleep(delay)
+
+        parsed = urlparse(url)
+        path = parsed.path.lstrip('/')
+        if path.startswith('api/'):
+            path = path[len('api/'):]
+        parts = [unquote(part) for part in path.split('/')]
+        if len(parts) > 1 and parts[-1] == '':
+            parts.pop()
+        query = dict(parse_qsl(parsed.query))
+
+        with self._lock:
+            self.requests[method] += 1
+            fault = self._fault(method, path)
+            try:
+                if fault is not None:
+                    raise _Error(fault, 'Injected failure')
+                self._user = self._authenticate(auth)
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+                body = json.loads(data) if data else {}
+                handler = getattr(self, '_%s_%s' % (
+                    method.lower(), parts[0].replace('-', '_')), None)
+                if handler is None:
+                    raise _Error(405, 'Method Not Allowed')
+                status, result = handler(parts[1:], query, body)
+            except _Error as err:
+                status, result = err.status, err.body
+            except (KeyError, ValueError, TypeError) as err:
+                status, result = 400, {'error': 'bad_request',
+                                       'reason': str(err)}
+            finally:
+                self._user = None
+        if status == 204 or result is None:
+            return Response(status, b'', reason='No Content')
+        return Response(status, json.dumps(result).encode('utf-8'),
+                        {'Content-Type': 'application/json'})
+
+    def close(self):
+        """Nothing to release; state survives for the next client."""
+        pass
+
+    def _fault(self, method, path):
+        for fault in self._faults:
+            status, count, fmethod, fpath = fault
+            if fmethod and fmethod != method:
+                continue
+            if fpath and not fpath.search(path):
+                continue
+            fault[1] -= 1
+            if fault[1] <= 0:
+                self._faults.remove(fault)
+            if status is None:
+                raise NetworkError('Injected network failure')
+            return status
+        if self.network_error_rate and (self._random.random() <
+                                        self.network_error_rate):
+            raise NetworkError('Injected network failure')
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    def _authenticate(self, auth):
+        user = self.users.get(getattr(auth, 'username', None))
+        password = getattr(auth, 'password', None)
+        if (user is None or password is None or
+                not _check_password(user['password_hash'], password)):
+            raise _Error(401, 'Login failed')
+        return user
+
+    ##################################################
+    # Views
+    ##################################################
+    def _queue_view(self, queue):
+        depth = len(queue['messages'])
+        view = dict((k, v) for k, v in queue.items() if k != 'messages')
+        view.update({'node': NODE, 'state': 'running', 'exclusive': False,
+                     'policy': None, 'consumers': 0,
+                     'messages': depth, 'messages_ready': depth,
+                     'messages_unacknowledged': 0})
+        return view
+
+    def _binding_view(self, key, binding):
+        return dict(binding, properties_key=key[4])
+
+    def _default_bindings(self, vhost=None, queue=None):
+        """The implicit bindings of queues to the default exchange."""
+        if queue is not None:
+            keys = [(vhost, queue)] if (vhost, queue) in self.queues else []
+        else:
+            keys = self.queues
+        for qvhost, name in keys:
+            if vhost is not None and qvhost != vhost:
+                continue
+            yield {'source': '', 'vhost': qvhost, 'destination': name,
+                   'destination_type': 'queue', 'routing_key': name,
+                   'arguments': {}, 'properties_key': name}
+
+    def _vhost(self, name):
+        if name not in self.vhosts:
+            raise _not_found("vhost '%s'" % name)
+        return name
+
+    def _exchange(self, vhost, name):
+        self._vhost(vhost)
+        if name == 'amq.default':
+            name = ''
+        exchange = self.exchanges.get((vhost, name))
+        if exchange is None:
+            raise _not_found("exchange '%s' in vhost '%s'" % (name, vhost))
+        return exchange
+
+    def _queue(self, vhost, name):
+        self._vhost(vhost)
+        queue = self.queues.get((vhost, name))
+        if queue is None:
+            raise _not_found("queue '%s' in vhost '%s'" % (name, vhost))
+        return queue
+
+    ##################################################
+    # Broker operations
+    ##################################################
+    def _set(self, index, key, value):
+        """Store an object, noting what it replaced if journalling."""
+        if self._journal is not None:
+            self._journal.append((index, key, index.get(key, _MISSING)))
+        index[key] = value
+
+    def _declare_exchange(self, vhost, name, props):
+        self._vhost(vhost)
+        wanted = {'name': name, 'vhost': vhost,
+                  'type': props.get('type', 'direct'),
+                  'durable': props.get('durable', True),
+                  'auto_delete': props.get('auto_delete', False),
+                  'internal': props.get('internal', False),
+                  'arguments': _arguments(props.get('arguments'))}
+        current = self.exchanges.get((vhost, name))
+        if current is not None:
+            for field in ('type', 'durable', 'auto_delete', 'internal',
+                          'arguments'):
+                if current[field] != wanted[field]:
+                    raise _inequivalent('exchange', name, field)
+            return False
+        if name == '' or name.startswith('amq.'):
+            raise _Error(403, "ACCESS_REFUSED - exchange name '%s' "
+                              "contains reserved prefix 'amq.*'" % name)
+        self._set(self.exchanges, (vhost, name), wanted)
+        return True
+
+    def _declare_queue(self, vhost, name, props):
+        self._vhost(vhost)
+        wanted = {'name': name, 'vhost': vhost,
+                  'durable': props.get('durable', True),
+                  'auto_delete': props.get('auto_delete', False),
+                  'arguments': _arguments(props.get('arguments'))}
+        current = self.queues.get((vhost, name))
+        if current is not None:
+            for field in ('durable', 'auto_delete', 'arguments'):
+                if current[field] != wanted[field]:
+                    raise _inequivalent('queue', name, field)
+            return False
+        wanted['messages'] = collections.deque()
+        wanted['message_stats'] = {'publish': 0, 'deliver_get': 0}
+        self._set(self.queues, (vhost, name), wanted)
+        return True
+
+    def _bind(self, vhost, source, dtype, destination, routing_key,
+              arguments):
+        if source in ('', 'amq.default'):
+            raise _Error(403, 'ACCESS_REFUSED - operation not permitted on '
+                              'the default exchange')
+        self._exchange(vhost, source)
+        if dtype == 'q':
+            self._queue(vhost, destination)
+        else:
+            self._exchange(vhost, destination)
+        arguments = _arguments(arguments)
+        routing_key = routing_key or ''
+        key = (vhost, source, 'queue' if dtype == 'q' else 'exchange',
+               destination, properties_key(routing_key, arguments))
+        self._set(self.bindings, key, {'source': source, 'vhost': vhost,
+                                       'destination': destination,
+                                       'destination_type': key[2],
+                                       'routing_key': routing_key,
+                                       'arguments': arguments})
+        return key
+
+    def _unbind(self, bindings):
+        for key, binding in bindings:
+            del self.bindings[key]
+
+    def _delete_queue(self, vhost, name):
+        self._queue(vhost, name)
+        del self.queues[(vhost, name)]
+        self._unbind(self.bindings.to_destination(vhost, 'queue', name))
+
+    def _delete_exchange(self, vhost, name):
+        self._exchange(vhost, name)
+        if name == '' or name.startswith('amq.'):
+            raise _Error(403, "ACCESS_REFUSED - operation not permitted on "
+                              "exchange '%s'" % name)
+        del self.exchanges[(vhost, name)]
+        self._unbind(self.bindings.from_source(vhost, name))
+        self._unbind(self.bindings.to_destination(vhost, 'exchange', name))
+
+    def _route(self, vhost, exchange, routing_key, seen=None):
+        """The queues a message published to *exchange* ends up in."""
+        seen = seen if seen is not None else set()
+        if exchange in seen:
+            return set()
+        seen.add(exchange)
+        if exchange == '':
+            return set([routing_key]) if (vhost, routing_key) in \
+                self.queues else set()
+        xtype = self.exchanges[(vhost, exchange)]['type']
+        queues = set()
+        for key, binding in self.bindings.matching(vhost, exchange, xtype,
+                                                   routing_key):
+            if binding['destination_type'] == 'queue':
+                queues.add(binding['destination'])
+            else:
+                queues |= self._route(vhost, binding['destination'],
+                                      routing_key, seen)
+        return queues
+
+    ##################################################
+    # Routes, named _<method>_<first path segment>
+    ##################################################
+    def _get_overview(self, args, query, body):
+        messages = sum(len(q['messages']) for q in self.queues.values())
+        return 200, {
+            'management_version': '3.12.0', 'rabbitmq_version': '3.12.0',
+            'node': NODE, 'cluster_name': NODE,
+            'object_totals': {'queues': len(self.queues),
+                              'exchanges': len(self.exchanges),
+                              'connections': len(self.connections),
+                              'channels': 0, 'consumers': 0},
+            'queue_totals': {'messages': messages,
+                             'messages_ready': messages,
+                             'messages_unacknowledged': 0},
+            'message_stats': dict(self.message_stats)}
+
+    def _get_whoami(self, args, query, body):
+        return 200, {'name': self._user['name'], 'tags': self._user['tags']}
+
+    def _get_aliveness_test(self, args, query, body):
+        self._vhost(args[0])
+        return 200, {'status': 'ok'}
+
+    def _get_nodes(self, args, query, body):
+        node = {'name': NODE, 'type': 'disc', 'running': True,
+                'mem_used': 0, 'mem_limit': 0, 'fd_used': 0,
+                'fd_total': 0, 'sockets_used': 0, 'sockets_total': 0,
+                'proc_used': 0, 'proc_total': 0, 'disk_free': 0,
+                'disk_free_limit': 0, 'uptime': 0}
+        if args:
+            if args[0] != NODE:
+                raise _not_found("node '%s'" % args[0])
+            return 200, node
+        return 200, [node]
+
+    # vhosts
+    def _get_vhosts(self, args, query, body):
+        if not args:
+            return 200, _listing(list(self.vhosts.values()), query)
+        self._vhost(args[0])
+        if args[1:] == ['permissions']:
+            return 200, [p for p in self.permissions.values()
+                         if p['vhost'] == args[0]]
+        return 200, self.vhosts[args[0]]
+
+    def _put_vhosts(self, args, query, body):
+        created = args[0] not in self.vhosts
+        self.add_vhost(args[0])
+        return (201 if created else 204), None
+
+    def _delete_vhosts(self, args, query, body):
+        vhost = self._vhost(args[0])
+        del self.vhosts[vhost]
+        for index in (self.exchanges, self.queues, self.bindings,
+                      self.permissions):
+            for key in [k for k in index if k[0] == vhost]:
+                del index[key]
+        return 204, None
+
+    # users and permissions
+    def _get_users(self, args, query, body):
+        if not args:
+            return 200, _listing(list(self.users.values()), query)
+        if args[0] not in self.users:
+            raise _not_found("user '%s'" % args[0])
+        if args[1:] == ['permissions']:
+            return 200, [p for p in self.permissions.values()
+                         if p['user'] == args[0]]
+        return 200, self.users[args[0]]
+
+    def _put_users(self, args, query, body):
+        created = args[0] not in self.users
+        self.add_user(args[0], body.get('password', ''),
+                      body.get('tags', ''), body.get('password_hash'))
+        return (201 if created else 204), None
+
+    def _delete_users(self, args, query, body):
+        if args[0] not in self.users:
+            raise _not_found("user '%s'" % args[0])
+        del self.users[args[0]]
+        for key in [k for k in self.permissions if k[1] == args[0]]:
+            del self.permissions[key]
+        return 204, None
+
+    def _get_permissions(self, args, query, body):
+        if not args:
+            return 200, list(self.permissions.values())
+        permission = self.permissions.get(tuple(args[:2]))
+        if permission is None:
+            raise _not_found('permission')
+        return 200, permission
+
+    def _put_permissions(self, args, query, body):
+        vhost, user = self._vhost(args[0]), args[1]
+        if user not in self.users:
+            raise _not_found("user '%s'" % user)
+        created = (vhost, user) not in self.permissions
+        self._set(self.permissions, (vhost, user), {
+            'vhost': vhost, 'user': user,
+            'configure': body.get('configure', ''),
+            'write': body.get('write', ''), 'read': body.get('read', '')})
+        return (201 if created else 204), None
+
+    def _delete_permissions(self, args, query, body):
+        if tuple(args[:2]) not in self.permissions:
+            raise _not_found('permission')
+        del self.permissions[tuple(args[:2])]
+        return 204, None
+
+    # exchanges
+    def _get_exchanges(self, args, query, body):
+        if len(args) <= 1:
+            vhost = self._vhost(args[0]) if args else None
+            return 200, _listing([dict(x) for (v, n), x in
+                                  self.exchanges.items()
+                                  if vhost is None or v == vhost], query)
+        exchange = self._exchange(args[0], args[1])
+        if args[2:] == ['bindings', 'source']:
+            return 200, [self._binding_view(k, b) for k, b in
+                         self.bindings.from_source(args[0],
+                                                   exchange['name'])]
+        if args[2:] == ['bindings', 'destination']:
+            return 200, [self._binding_view(k, b) for k, b in
+                         self.bindings.to_destination(args[0], 'exchange',
+                                                      exchange['name'])]
+        return 200, dict(exchange)
+
+    def _put_exchanges(self, args, query, body):
+        created = self._declare_exchange(args[0], args[1], body)
+        return (201 if created else 204), None
+
+    def _delete_exchanges(self, args, query, body):
+        self._delete_exchange(args[0], args[1])
+        return 204, None
+
+    def _post_exchanges(self, args, query, body):
+        if args[2:] != ['publish']:
+            raise _Error(405, 'Method Not Allowed')
+        exchange = self._exchange(args[0], args[1])
+        routing_key = body.get('routing_key', '')
+        targets = self._route(args[0], exchange['name'], routing_key)
+        message = {'payload': body.get('payload', ''),
+                   'payload_encoding': body.get('payload_encoding',
+                                                'string'),
+                   'properties': body.get('properties') or {},
+                   'exchange': exchange['name'],
+                   'routing_key': routing_key, 'redelivered': False}
+        for name in targets:
+            queue = self.queues[(args[0], name)]
+            queue['messages'].append(dict(message))
+            queue['message_stats']['publish'] += 1
+        self.message_stats['publish'] += 1
+        return 200, {'routed': bool(targets)}
+
+    # queues
+    def _get_queues(self, args, query, body):
+        if len(args) <= 1:
+            vhost = self._vhost(args[0]) if args else None
+            return 200, _listing([self._queue_view(q) for (v, n), q in
+                                  self.queues.items()
+                                  if vhost is None or v == vhost], query)
+        queue = self._queue(args[0], args[1])
+        if args[2:] == ['bindings']:
+            return 200, (list(self._default_bindings(args[0], args[1])) +
+                         [self._binding_view(k, b) for k, b in
+                          self.bindings.to_destination(args[0], 'queue',
+                                                       args[1])])
+        return 200, self._queue_view(queue)
+
+    def _put_queues(self, args, query, body):
+        created = self._declare_queue(args[0], args[1], body)
+        return (201 if created else 204), None
+
+    def _delete_queues(self, args, query, body):
+        if args[2:] == ['contents']:
+            self._queue(args[0], args[1])['messages'].clear()
+        else:
+            self._delete_queue(args[0], args[1])
+        return 204, None
+
+    def _post_queues(self, args, query, body):
+        if args[2:] != ['get']:
+            raise _Error(405, 'Method Not Allowed')
+        queue = self._queue(args[0], args[1])
+        messages = queue['messages']
+        count = min(int(body.get('count', 1)), len(messages))
+        taken = [messages.popleft() for i in range(count)]
+        requeue = body.get('requeue')
+        if requeue is None:
+            requeue = body.get('ackmode', '').startswith('ack_requeue_true')
+        if requeue:
+            for message in taken:
+                message['redelivered'] = True
+            messages.extendleft(reversed(taken))
+        queue['message_stats']['deliver_get'] += count
+        self.message_stats['deliver_get'] += count
+        truncate = body.get('truncate')
+        result = []
+        for i, message in enumerate(taken):
+            message = dict(message)
+            message['payload_bytes'] = len(message['payload'])
+            if truncate:
+                message['payload'] = message['payload'][:int(truncate)]
+            message['message_count'] = (len(messages) if requeue else
+                                        len(messages) + count - i - 1)
+            result.append(message)
+        return 200, result
+
+    # bindings
+    def _get_bindings(self, args, query, body):
+        if len(args) <= 1:
+            vhost = self._vhost(args[0]) if args else None
+            bindings = list(self._default_bindings(vhost))
+            bindings.extend(self._binding_view(k, b)
+                            for k, b in self.bindings.items()
+                            if vhost is None or k[0] == vhost)
+            return 200, _listing(bindings, query)
+        vhost, source, dtype, destination = args[0], args[2], args[3], \
+            args[4]
+        self._exchange(vhost, source)
+        dtype = 'queue' if dtype == 'q' else 'exchange'
+        matches = [self._binding_view(k, b) for k, b in
+                   self.bindings.to_destination(vhost, dtype, destination)
+                   if k[1] == source]
+        if len(args) == 6:
+            for binding in matches:
+                if binding['properties_key'] == args[5]:
+                    return 200, binding
+            raise _not_found('binding')
+        return 200, matches
+
+    def _post_bindings(self, args, query, body):
+        vhost, source, dtype, destination = args[0], args[2], args[3], \
+            args[4]
+        self._vhost(vhost)
+        self._bind(vhost, source, dtype, destination,
+                   body.get('routing_key'), body.get('arguments'))
+        return 201, None
+
+    def _delete_bindings(self, args, query, body):
+        dtype = 'queue' if args[3] == 'q' else 'exchange'
+        key = (args[0], args[2], dtype, args[4], args[5])
+        if key not in self.bindings:
+            raise _not_found('binding')
+        del self.bindings[key]
+        return 204, None
+
+    # connections and channels
+    def _get_connections(self, args, query, body):
+        if not args:
+            return 200, _listing(list(self.connections.values()), query)
+        if args[0] not in self.connections:
+            raise _not_found("connection '%s'" % args[0])
+        return 200, self.connections[args[0]]
+
+    def _delete_connections(self, args, query, body):
+        if args[0] not in self.connections:
+            raise _not_found("connection '%s'" % args[0])
+        del self.connections[args[0]]
+        return 204, None
+
+    def _get_channels(self, args, query, body):
+        if args:
+            raise _not_found("channel '%s'" % args[0])
+        return 200, _listing([], query)
+
+    # definitions
+    def _get_definitions(self, args, query, body):
+        vhost = self._vhost(args[0]) if args else None
+
+        def wanted(obj):
+            return vhost is None or obj['vhost'] == vhost
+
+        doc = {
+            'exchanges': [dict(x) for x in self.exchanges.values()
+                          if wanted(x) and x['name'] and
+                          not x['name'].startswith('amq.')],
+            'queues': [dict((k, v) for k, v in q.items()
+                            if k not in ('messages', 'message_stats'))
+                       for q in self.queues.values() if wanted(q)],
+            'bindings': [dict(b) for b in self.bindings.values()
+                         if wanted(b)],
+        }
+        if vhost is None:
+            doc['vhosts'] = list(self.vhosts.values())
+            doc['users'] = list(self.users.values())
+            doc['permissions'] = list(self.permissions.values())
+        else:
+            for section in doc.values():
+                for obj in section:
+                    obj.pop('vhost', None)
+        return 200, copy.deepcopy(doc)
+
+    def _post_definitions(self, args, query, body):
+        """
+        Import a definitions document, all or nothing: if any object is
+        refused, everything already stored is put back the way it was.
+
+        """
+        scoped = self._vhost(args[0]) if args else None
+        self._journal = []
+        try:
+            self._import(body, scoped)
+        except Exception as err:
+            for index, key, previous in reversed(self._journal):
+                if previous is _MISSING:
+                    del index[key]
+                else:
+                    index[key] = previous
+            if isinstance(err, _Error):
+                # The broker rejects the whole document as a bad request.
+                raise _Error(400, err.reason)
+            raise
+        finally:
+            self._journal = None
+        return 204, None
+
+    def _import(self, doc, scoped):
+        for vhost in doc.get('vhosts', []):
+            self.add_vhost(vhost['name'])
+        for user in doc.get('users', []):
+            self.add_user(user['name'], user.get('password', ''),
+                          user.get('tags', ''), user.get('password_hash'))
+        for perm in doc.get('permissions', []):
+            self._put_permissions([perm['vhost'], perm['user']], {}, perm)
+        for exchange in doc.get('exchanges', []):
+            self._declare_exchange(scoped or exchange['vhost'],
+                                   exchange['name'], exchange)
+        for queue in doc.get('queues', []):
+            self._declare_queue(scoped or queue['vhost'], queue['name'],
+                                queue)
+        for binding in doc.get('bindings', []):
+            dtype = 'q' if binding.get('destination_type',
+                                       'queue') == 'queue' else 'e'
+            self._bind(scoped or binding['vhost'], binding['source'], dtype,
+                       binding['destination'], binding.get('routing_key'),
+                       binding.get('arguments'))
@@ -0,0 +1,231 @@
+"""
+An in-memory index of the exchanges, queues and bindings of a broker, for
+questions about how they're wired together::
+
+    topology = Topology(client)
+    topology.refresh()
+    topology.orphaned_queues()
+    topology.unbound_exchanges('/')
+    topology.feeders('/', 'jobs')
+    topology.refresh('/')
+
+It's loaded with three listings, one each of the exchanges, queues and
+bindings, instead of a request per object, and keeps the bindings indexed
+both by source exchange and by destination, exchange-to-exchange bindings
+included. Looking up an object's bindings then costs a dict lookup and the
+bindings returned, and walking the graph only touches the bindings along
+the way.
+
+Every queue is implicitly bound to the default exchange; those bindings are
+left out of the index.
+"""
+
+import collections
+
+#: The queue fields kept; the rest of each queue is never fetched.
+QUEUE_COLUMNS = ['vhost', 'name', 'durable', 'auto_delete', 'exclusive',
+                 'consumers', 'messages']
+
+
+def _binding_key(binding):
+    return (binding['source'], binding['destination_type'],
+            binding['destination'],
+            binding.get('properties_key', binding.get('routing_key')))
+
+
+def _by_vhost(objects):
+    grouped = {}
+    for obj in objects:
+        grouped.setdefault(obj['vhost'], {})[obj['name']] = obj
+    return grouped
+
+
+class Topology(object):
+    """
+    The exchanges, queues and bindings of a broker, or of some of its
+    vhosts, indexed for graph queries. Objects are looked up by vhost and
+    name; results are names within the vhost asked about, since bindings
+    never cross vhosts.
+
+    """
+
+    def __init__(self, client=None):
+        """
+        :param client: The :class:`pyrabbit.api.Client` to list with. Not
+            needed if the index is only fed through :meth:`update`.
+
+        """
+        self.client = client
+        self._exchanges = {}
+        self._queues = {}
+        #: vhost -> binding key -> binding
+        self._bindings = {}
+        #: (vhost, source exchange) -> binding key -> binding
+        self._out = {}
+        #: (destination type, vhost, destination) -> binding key -> binding
+        self._in = {}
+
+    def refresh(self, vhost=None):
+        """
+        List the exchanges, queues and bindings again, of every vhost or
+        just *vhost*, and bring the index up to date with them. Returns
+        what :meth:`update` does.
+
+        """
+        return self.update(
+            self.client.get_exchanges(vhost),
+            self.client.get_queues(vhost, columns=QUEUE_COLUMNS),
+            self.client.get_bindings(vhost), vhost)
+
+    def update(self, exchanges, queues, bindings, vhost=None):
+        """
+        Replace what's known of every vhost, or just *vhost*, with the
+        listings given. Only bindings that were added or removed since the
+        last update are touched in the index.
+
+        :returns: The number of bindings added and removed, as a tuple.
+
+        """
+        exchanges = _by_vhost(exchanges)
+        queues = _by_vhost(queues)
+        fresh = {}
+        for binding in bindings:
+            if binding['source']:
+                fresh.setdefault(binding['vhost'], {})[
+                    _binding_key(binding)] = binding
+        if vhost is None:
+            vhosts = (set(self._exchanges) | set(self._queues) |
+                      set(self._bindings) | set(exchanges) | set(queues) |
+                      set(fresh))
+        else:
+            vhosts = [vhost]
+        added = removed = 0
+        for name in vhosts:
+            self._set(self._exchanges, name, exchanges.get(name))
+            self._set(self._queues, name, queues.get(name))
+            old = self._bindings.get(name, {})
+            new = fresh.get(name, {})
+            for key, binding in old.items():
+                if key not in new:
+                    self._unlink(name, key)
+                    removed += 1
+            for key, binding in new.items():
+                if key in old:
+                    new[key] = old[key]
+                else:
+                    self._link(name, key, binding)
+                    added += 1
+            self._set(self._bindings, name, new)
+        return added, removed
+
+    @staticmethod
+    def _set(index, vhost, objects):
+        if objects:
+            index[vhost] = objects
+        else:
+            index.pop(vhost, None)
+
+    def _link(self, vhost, key, binding):
+        source, dtype, destination = key[:3]
+        self._out.setdefault((vhost, source), {})[key] = binding
+        self._in.setdefault((dtype, vhost, destination), {})[key] = binding
+
+    def _unlink(self, vhost, key):
+        source, dtype, destination = key[:3]
+        for index, at in ((self._out, (vhost, source)),
+                          (self._in, (dtype, vhost, destination))):
+            bindings = index[at]
+            del bindings[key]
+            if not bindings:
+                del index[at]
+
+    def _scope(self, index, vhost):
+        if vhost is not None:
+            return [(vhost, index.get(vhost, {}))]
+        return index.items()
+
+    def exchange(self, vhost, name):
+        """The exchange *name* in *vhost*, or None."""
+        return self._exchanges.get(vhost, {}).get(name)
+
+    def queue(self, vhost, name):
+        """The queue *name* in *vhost*, or None."""
+        return self._queues.get(vhost, {}).get(name)
+
+    def bindings_from(self, vhost, exchange):
+        """The bindings with *exchange* as their source."""
+        return list(self._out.get((vhost, exchange), {}).values())
+
+    def bindings_to(self, vhost, name, destination_type='queue'):
+        """
+        The bindings to queue *name*, or to exchange *name* if
+        *destination_type* is 'exchange'.
+
+        """
+        return list(self._in.get((destination_type, vhost, name),
+                                 {}).values())
+
+    def orphaned_queues(self, vhost=None):
+        """
+        The queues no exchange is bound to, besides the default exchange,
+        as (vhost, name) tuples.
+
+        """
+        return [(vname, queue) for vname, queues in
+                self._scope(self._queues, vhost) for queue in queues
+                if ('queue', vname, queue) not in self._in]
+
+    def unbound_exchanges(self, vhost=None, builtin=False):
+        """
+        The exchanges that are neither the source nor the destination of
+        any binding, as (vhost, name) tuples. The default exchange and the
+        'amq.*' ones the broker declares are left out unless *builtin*.
+
+        """
+        return [(vname, exchange) for vname, exchanges in
+                self._scope(self._exchanges, vhost) for exchange in exchanges
+                if (builtin or exchange and not exchange.startswith('amq.'))
+                and (vname, exchange) not in self._out
+                and ('exchange', vname, exchange) not in self._in]
+
+    def feeders(self, vhost, queue):
+        """
+        The exchanges that can route messages to *queue*, directly or
+        through exchange-to-exchange bindings, nearest first. Routing keys
+        aren't taken into account.
+
+        """
+        found, seen = [], set()
+        pending = collections.deque([('queue', vhost, queue)])
+        while pending:
+            at = pending.popleft()
+            for binding in self._in.get(at, {}).values():
+                source = binding['source']
+                if source not in seen:
+                    seen.add(source)
+                    found.append(source)
+                    pending.append(('exchange', vhost, source))
+        return found
+
+    def destinations(self, vhost, exchange):
+        """
+        The queues *exchange* can route messages to, directly or through
+        other exchanges, nearest first. Routing keys aren't taken into
+        account.
+
+        """
+        found, seen = [], set([exchange])
+        queues = set()
+        pending = collections.deque([exchange])
+        while pending:
+            at = pending.popleft()
+            for source, dtype, destination, props in self._out.get(
+                    (vhost, at), {}):
+                if dtype == 'queue':
+                    if destination not in queues:
+                        queues.add(destination)
+                        found.append(destination)
+                elif destination not in seen:
+                    seen.add(destination)
+                    pending.append(destination)
+        return found
@@ -0,0 +1,314 @@
+"""
+The transports an :class:`pyrabbit.http.HTTPClient` sends its requests
+through.
+
+:class:`RequestsTransport`, the default, uses a pooled
+:class:`requests.Session`. :class:`StdlibTransport` needs nothing beyond the
+standard library's :mod:`http.client`, keeping connections alive between
+calls just the same; it's the quicker choice for short-lived scripts such as
+cron jobs and monitoring checks, which would otherwise spend longer importing
+requests than talking to the broker::
+
+    client = Client('localhost:15672/api/', 'guest', 'guest',
+                    transport='stdlib')
+
+Neither library is imported until the first request is sent.
+
+Any object with the same ``request`` method can be used as a transport as
+well; see :class:`pyrabbit.testing.FakeBroker`.
+"""
+
+import base64
+import select
+import socket
+import threading
+import time
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+from .http import IDEMPOTENT_METHODS, NetworkError, Response
+
+
+def _httplib():
+    try:
+        import httplib
+    except ImportError:
+        import http.client as httplib
+    return httplib
+
+
+def _requests():
+    import requests
+    import requests.adapters
+    return requests
+
+
+class BasicAuth(object):
+    """
+    HTTP basic authentication credentials. Instances can also be handed to
+    requests as its ``auth``.
+
+    """
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        credentials = ('%s:%s' % (username, password)).encode('latin-1')
+        #: The value of the Authorization header.
+        self.header = 'Basic ' + base64.b64encode(credentials).decode('ascii')
+
+    def __call__(self, request):
+        request.headers['Authorization'] = self.header
+        return request
+
+
+class RequestsTransport(object):
+    """
+    Sends requests through a single, long-lived :class:`requests.Session`
+    so that TCP (and TLS) connections are kept alive and reused between
+    calls. The session is created lazily on first use, and released by
+    :meth:`close`.
+
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, pool_idle_timeout=None):
+        """
+        :param int pool_connections: Number of per-host connection pools to
+            keep around.
+        :param int pool_maxsize: Maximum number of connections kept open to
+            any one host.
+        :param bool pool_block: If True, callers wait for a free connection
+            once *pool_maxsize* connections to a host are busy instead of
+            opening (and then discarding) extra ones.
+        :param int pool_idle_timeout: Number of seconds the pool may sit
+            unused before its sockets are closed. None (the default) keeps
+            them open until :meth:`close` is called.
+
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.pool_idle_timeout = pool_idle_timeout
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._in_flight = 0
+        self._last_used = 0
+
+    @property
+    def errors(self):
+        """Exceptions that reading a response body may raise."""
+        return (_requests().exceptions.RequestException,)
+
+    def _new_session(self):
+        requests = _requests()
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _acquire_session(self):
+        """
+        Returns the pooled session, creating it if needed. If the pool has
+        been idle for longer than *pool_idle_timeout*, its connections are
+        dropped first so we don't try to reuse sockets the server (or a
+        load balancer in between) has likely already closed.
+
+        """
+        with self._session_lock:
+            now = time.time()
+            if (self._session is not None and
+                    self.pool_idle_timeout is not None and
+                    self._in_flight == 0 and
+                    now - self._last_used > self.pool_idle_timeout):
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = self._new_session()
+            self._in_flight += 1
+            self._last_used = now
+            return self._session
+
+    def _release_session(self):
+        with self._session_lock:
+            self._in_flight -= 1
+            self._last_used = time.time()
+
+    def request(self, method, url, data=None, headers=None, timeout=None,
+                stream=False, auth=None):
+        exceptions = _requests().exceptions
+        session = self._acquire_session()
+        try:
+            return session.request(method, url, data=data, headers=headers,
+                                   timeout=timeout, stream=stream, auth=auth)
+        except exceptions.Timeout:
+            raise NetworkError("Timeout while trying to connect to RabbitMQ")
+        except exceptions.RequestException as err:
+            # All other requests exceptions inherit from RequestException
+            raise NetworkError("Error during request %s %s" % (type(err), err))
+        finally:
+            self._release_session()
+
+    def close(self):
+        """
+        Close all pooled connections. The transport remains usable; a new
+        pool is created on the next request.
+
+        """
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+def _dropped(conn):
+    """
+    Whether the server has closed idle connection *conn*: a socket with
+    nothing left to say reads as ready, at end of file.
+
+    """
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (ValueError, select.error, socket.error):
+        return True
+
+
+class StdlibTransport(object):
+    """
+    Sends requests with the standard library's :mod:`http.client`, keeping
+    up to *pool_maxsize* idle connections per host open for reuse.
+
+    Idle connections the server has since closed are noticed and discarded
+    before use. Should one go away mid-request anyway, an idempotent
+    request is sent again on a new connection.
+
+    """
+
+    def __init__(self, pool_maxsize=10, pool_idle_timeout=None,
+                 ssl_context=None):
+        """
+        :param int pool_maxsize: Maximum number of idle connections kept
+            open to any one host.
+        :param int pool_idle_timeout: Number of seconds a connection may
+            sit unused before it's closed rather than reused. None (the
+            default) keeps them until :meth:`close` is called.
+        :param ssl_context: An :class:`ssl.SSLContext` for https
+            connections, or None for the default one.
+
+        """
+        self.pool_maxsize = pool_maxsize
+        self.pool_idle_timeout = pool_idle_timeout
+        self.ssl_context = ssl_context
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @property
+    def errors(self):
+        """Exceptions that reading a response body may raise."""
+        return (socket.error, _httplib().HTTPException)
+
+    def _acquire(self, key, timeout):
+        """
+        Returns a connection to the host in *key* and whether it has been
+        used before.
+
+        """
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                conn, last_used = idle.pop()
+                if ((self.pool_idle_timeout is not None and
+                        now - last_used > self.pool_idle_timeout) or
+                        _dropped(conn)):
+                    conn.close()
+                    continue
+                conn.sock.settimeout(timeout)
+                return conn, True
+
+        httplib = _httplib()
+        scheme, netloc = key
+        if scheme == 'https':
+            kwargs = {}
+            if self.ssl_context is not None:
+                kwargs['context'] = self.ssl_context
+            return httplib.HTTPSConnection(netloc, timeout=timeout,
+                                           **kwargs), False
+        return httplib.HTTPConnection(netloc, timeout=timeout), False
+
+    def _release(self, key, conn, reusable):
+        # A connection the response said would close has no socket left.
+        if reusable and conn.sock is not None:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.pool_maxsize:
+                    idle.append((conn, time.time()))
+                    return
+        conn.close()
+
+    def request(self, method, url, data=None, headers=None, timeout=None,
+                stream=False, auth=None):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        headers = dict(headers or {})
+        if auth is not None:
+            headers['Authorization'] = auth.header
+        if data is not None and not isinstance(data, bytes):
+            data = data.encode('utf-8')
+
+        errors = self.errors
+        while True:
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, target, data, headers)
+                resp = conn.getresponse()
+                if not stream:
+                    content = resp.read()
+            except socket.timeout:
+                conn.close()
+                raise NetworkError("Timeout while trying to connect to "
+                                   "RabbitMQ")
+            except errors as err:
+                conn.close()
+                if reused and method in IDEMPOTENT_METHODS:
+                    continue
+                raise NetworkError("Error during request %s %s" %
+                                   (type(err), err))
+            break
+
+        if not stream:
+            self._release(key, conn, True)
+            return Response(resp.status, content, resp.msg, resp.reason)
+
+        def release(complete):
+            self._release(key, conn, complete)
+        return Response(resp.status, headers=resp.msg, reason=resp.reason,
+                        raw=resp, release=release)
+
+    def close(self):
+        """
+        Close all idle connections. The transport remains usable.
+
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, last_used in conns:
+                conn.close()
+
+
+#: Transports that can be chosen by name.
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'stdlib': StdlibTransport,
+}
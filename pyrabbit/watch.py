@@ -0,0 +1,198 @@
+"""
+Events from the differences between consecutive polls of the queues::
+
+    watcher = Watcher(client, fields=['messages', 'consumers', 'state'],
+                      thresholds={'messages': [10000, 100000]})
+    watcher.on('no_consumers', page_someone)
+    while True:
+        for event in watcher.poll():
+            log.info('%s', event)
+        time.sleep(30)
+
+The previous poll is kept in a dict keyed by ``(vhost, name)``, holding
+just a tuple of the subscribed fields of each queue, so a poll is compared
+with the one before in time linear in the number of queues, and an
+unchanged queue costs one tuple comparison.
+
+The first poll only sets the baseline; events come from the second on.
+"""
+
+#: A queue, or whatever else is watched, appeared.
+CREATED = 'created'
+#: It went away.
+DELETED = 'deleted'
+#: A subscribed field changed.
+CHANGED = 'changed'
+#: The consumer count dropped to zero.
+NO_CONSUMERS = 'no_consumers'
+#: A field rose to or above one of its thresholds.
+ABOVE = 'above'
+#: A field fell back below one of its thresholds.
+BELOW = 'below'
+
+KINDS = (CREATED, DELETED, CHANGED, NO_CONSUMERS, ABOVE, BELOW)
+
+
+def _get(obj, field):
+    """The value of dotted *field* in *obj*, or None."""
+    for part in field.split('.'):
+        if not hasattr(obj, 'get'):
+            return None
+        obj = obj.get(part)
+        if obj is None:
+            return None
+    return obj
+
+
+class Event(object):
+    """
+    One difference between two polls.
+
+    :ivar kind: One of :data:`KINDS`.
+    :ivar key: The object's key, e.g. its (vhost, name).
+    :ivar field: The field concerned, for changes and thresholds.
+    :ivar old: The field's previous value.
+    :ivar new: The field's new value.
+    :ivar threshold: The threshold crossed, for :data:`ABOVE` and
+        :data:`BELOW`.
+    :ivar obj: The object as polled; for :data:`DELETED`, None.
+
+    """
+    __slots__ = ('kind', 'key', 'field', 'old', 'new', 'threshold', 'obj')
+
+    def __init__(self, kind, key, field=None, old=None, new=None,
+                 threshold=None, obj=None):
+        self.kind = kind
+        self.key = key
+        self.field = field
+        self.old = old
+        self.new = new
+        self.threshold = threshold
+        self.obj = obj
+
+    def __eq__(self, other):
+        return (isinstance(other, Event) and
+                all(getattr(self, name) == getattr(other, name)
+                    for name in self.__slots__ if name != 'obj'))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        parts = ['%s %r' % (self.kind, self.key)]
+        if self.field is not None:
+            parts.append('%s %r -> %r' % (self.field, self.old, self.new))
+        if self.threshold is not None:
+            parts.append('threshold %r' % (self.threshold,))
+        return '<Event %s>' % ', '.join(parts)
+
+
+class Watcher(object):
+    """
+    Polls the queues, or anything else with *fetch* and *key*, and reports
+    what changed since the previous poll as :class:`Event` objects.
+
+    Only the subscribed *fields* are kept and compared; changes to any
+    other field are never seen. A field in *thresholds* must be
+    subscribed too.
+
+    """
+
+    def __init__(self, client, fields=('messages', 'consumers'),
+                 thresholds=None, vhost=None, fetch=None, key=None):
+        """
+        :param client: The :class:`pyrabbit.api.Client` to poll with.
+        :param list fields: The fields to compare, dotted for nested ones,
+            e.g. 'message_stats.publish'. 'consumers' must be among them
+            for :data:`NO_CONSUMERS` events.
+        :param dict thresholds: Maps fields to lists of numbers, e.g.
+            ``{'messages': [1000, 10000]}``; a field reaching one of them
+            gives an :data:`ABOVE` event, and falling back below it a
+            :data:`BELOW` one.
+        :param string vhost: Only watch the queues of this vhost.
+        :param callable fetch: Called with the client to poll something
+            other than the queues; returns a list of objects.
+        :param callable key: Returns the key of one of those objects.
+            Defaults to its (vhost, name).
+
+        """
+        self.client = client
+        self.fields = list(fields)
+        self.thresholds = {}
+        for field, levels in (thresholds or {}).items():
+            if field not in self.fields:
+                raise ValueError("Threshold on %r, which isn't one of the "
+                                 "watched fields" % field)
+            self.thresholds[field] = sorted(levels)
+        self.vhost = vhost
+        self.fetch = fetch
+        self.key = key or (lambda obj: (obj['vhost'], obj['name']))
+        #: The previous poll: key -> tuple of the values of :attr:`fields`.
+        self.index = None
+        self._handlers = dict((kind, []) for kind in KINDS)
+
+    def on(self, kind, handler):
+        """Call *handler* with every :class:`Event` of *kind*."""
+        if kind not in self._handlers:
+            raise ValueError("Unknown event kind %r" % kind)
+        self._handlers[kind].append(handler)
+
+    def poll(self):
+        """Fetch the objects and return the events since the last poll."""
+        if self.fetch is not None:
+            objects = self.fetch(self.client)
+        else:
+            columns = ['vhost', 'name'] + [field for field in self.fields
+                                           if field not in ('vhost', 'name')]
+            objects = self.client.get_queues(self.vhost, columns=columns)
+        return self.update(objects)
+
+    def update(self, objects):
+        """
+        Compare *objects* with the previous poll, make them the new
+        baseline, and return the events, after passing each to its
+        handlers.
+
+        """
+        fields, key = self.fields, self.key
+        old, index = self.index, {}
+        events = []
+        for obj in objects:
+            name = key(obj)
+            values = tuple([_get(obj, field) for field in fields])
+            index[name] = values
+            if old is None:
+                continue
+            previous = old.get(name)
+            if previous is None:
+                events.append(Event(CREATED, name, obj=obj))
+            elif previous != values:
+                self._compare(name, obj, previous, values, events)
+        if old is not None:
+            for name in old:
+                if name not in index:
+                    events.append(Event(DELETED, name))
+        self.index = index
+        for event in events:
+            for handler in self._handlers[event.kind]:
+                handler(event)
+        return events
+
+    def _compare(self, name, obj, previous, values, events):
+        for field, was, now in zip(self.fields, previous, values):
+            if was == now:
+                continue
+            events.append(Event(CHANGED, name, field, was, now, obj=obj))
+            if field == 'consumers' and now == 0 and was:
+                events.append(Event(NO_CONSUMERS, name, field, was, now,
+                                    obj=obj))
+            levels = self.thresholds.get(field)
+            if not levels or was is None or now is None:
+                continue
+            for level in levels:
+                if was < level <= now:
+                    events.append(Event(ABOVE, name, field, was, now,
+                                        threshold=level, obj=obj))
+                elif now < level <= was:
+                    events.append(Event(BELOW, name, field, was, now,
+                                        threshold=level, obj=obj))
@@ -1,7 +1,20 @@
+import sys
+
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 
 version = '1.1.0'
 
+
+class BuildPy(build_py):
+    """Leaves out pyrabbit.aio, which is Python 3 only, on Python 2."""
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[0] < 3:
+            modules = [m for m in modules if m[:2] != ('pyrabbit', 'aio')]
+        return modules
+
+
 setup(name='pyrabbit',
       version=version,
       description="A Pythonic interface to the RabbitMQ Management HTTP API",
@@ -38,5 +51,6 @@ data that lives inside of RabbitMQ, and manipulate the resources there.""",
       license='MIT',
       packages=find_packages(exclude='tests'),
       include_package_data=False,
-      zip_safe=False
+      zip_safe=False,
+      cmdclass={'build_py': BuildPy}
       )
@@ -0,0 +1,118 @@
+"""Tests for the asyncio client."""
+
+import sys
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+sys.path.append('..')
+from pyrabbit import api, http
+
+try:
+    import asyncio
+    from pyrabbit import aio
+    from mock import AsyncMock
+except (ImportError, SyntaxError):
+    aio = None
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(aio is None, 'asyncio client requires Python 3.8+')
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        self.client = aio.AsyncClient('localhost:15672', 'guest', 'guest')
+
+    def test_shares_url_table(self):
+        self.assertIs(self.client.urls, api.Client.urls)
+
+    def test_get_queues(self):
+        self.client.http.do_call = AsyncMock(return_value=None)
+        self.assertEqual(run(self.client.get_queues('/')), [])
+        self.client.http.do_call.assert_called_with('queues/%2F', 'GET',
+                                                    None, None)
+
+    def test_publish(self):
+        self.client.http.do_call = AsyncMock(return_value={'routed': True})
+        self.assertTrue(run(self.client.publish('/', 'xch', 'key', 'msg')))
+
+    def test_create_user_with_password_hash(self):
+        self.client.http.do_call = AsyncMock(return_value=None)
+        run(self.client.create_user('app', '', password_hash='c2FsdA=='))
+        body = self.client.http.do_call.call_args[0][2]
+        self.assertEqual(self.client.codec.loads(body),
+                         {'password_hash': 'c2FsdA==', 'tags': ''})
+
+    def test_get_queue_depth(self):
+        self.client.http.do_call = AsyncMock(return_value={'messages': 3})
+        self.assertEqual(run(self.client.get_queue_depth('/', 'q')), 3)
+
+    def test_401_raises_permission_error(self):
+        err = http.HTTPError({}, 401, 'Unauthorized', 'users')
+        self.client.http.do_call = AsyncMock(side_effect=err)
+        with self.assertRaises(api.PermissionError):
+            run(self.client.get_users())
+
+    def test_is_alive_missing_vhost(self):
+        err = http.HTTPError({}, 404, 'Not Found', 'aliveness-test/x')
+        self.client.http.do_call = AsyncMock(side_effect=err)
+        with self.assertRaises(api.APIError):
+            run(self.client.is_alive('x'))
+
+
+@unittest.skipIf(aio is None or web is None, 'requires aiohttp')
+class TestAsyncHTTPClient(unittest.TestCase):
+    def _serve(self, handler, calls):
+        async def go():
+            app = web.Application()
+            app.router.add_route('*', '/{tail:.*}', handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            client = aio.AsyncHTTPClient('127.0.0.1:%d' % port,
+                                         'guest', 'guest')
+            try:
+                return await calls(client)
+            finally:
+                await client.close()
+                await runner.cleanup()
+        return run(go())
+
+    def test_do_call_decodes_json(self):
+        async def handler(request):
+            return web.json_response({'path': request.path})
+
+        async def calls(client):
+            return await asyncio.gather(*[client.do_call('queues', 'GET')
+                                          for i in range(20)])
+
+        results = self._serve(handler, calls)
+        self.assertEqual(results, [{'path': '/queues'}] * 20)
+
+    def test_do_call_raises_http_error(self):
+        async def handler(request):
+            return web.json_response({'reason': 'nope'}, status=404)
+
+        async def calls(client):
+            with self.assertRaises(http.HTTPError) as ctx:
+                await client.do_call('queues/%2F/q', 'GET')
+            return ctx.exception
+
+        err = self._serve(handler, calls)
+        self.assertEqual(err.status, 404)
+        self.assertEqual(err.detail, 'nope')
@@ -0,0 +1,105 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+import threading
+import time
+sys.path.append('..')
+from pyrabbit.bulk import (BulkResult, PublishResult, run_concurrently,
+                           run_streaming)
+
+
+class TestRunConcurrently(unittest.TestCase):
+    def test_results_keep_item_order(self):
+        result = run_concurrently(lambda i: i * 2, range(50), concurrency=8)
+        self.assertEqual(result.results, [(i, i * 2) for i in range(50)])
+        self.assertTrue(result)
+
+    def test_errors_are_collected(self):
+        def func(i):
+            if i % 2:
+                raise ValueError(i)
+            return i
+
+        result = run_concurrently(func, range(6), concurrency=3)
+        self.assertFalse(result)
+        self.assertEqual(result.succeeded, [0, 2, 4])
+        self.assertEqual(result.failed, [1, 3, 5])
+        self.assertIsInstance(result.errors[0][1], ValueError)
+        self.assertEqual(len(result), 6)
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        state = {'now': 0, 'peak': 0}
+
+        def func(i):
+            with lock:
+                state['now'] += 1
+                state['peak'] = max(state['peak'], state['now'])
+            time.sleep(0.01)
+            with lock:
+                state['now'] -= 1
+
+        run_concurrently(func, range(20), concurrency=4)
+        self.assertLessEqual(state['peak'], 4)
+        self.assertGreater(state['peak'], 1)
+
+    def test_sequential_runs_in_calling_thread(self):
+        me = threading.current_thread()
+        result = run_concurrently(lambda i: threading.current_thread(),
+                                  range(3))
+        self.assertTrue(all(t is me for i, t in result.results))
+
+    def test_empty_result_is_truthy(self):
+        self.assertTrue(BulkResult())
+
+
+class TestRunStreaming(unittest.TestCase):
+    def test_outcomes_are_reported(self):
+        outcomes = []
+
+        def func(i):
+            if i == 3:
+                raise ValueError(i)
+            return i * 2
+
+        run_streaming(func, iter(range(20)),
+                      lambda *outcome: outcomes.append(outcome), 4)
+        self.assertEqual(len(outcomes), 20)
+        self.assertIn((5, True, 10), outcomes)
+        failed = [o for o in outcomes if not o[1]]
+        self.assertEqual(len(failed), 1)
+        self.assertIsInstance(failed[0][2], ValueError)
+
+    def test_items_are_pulled_lazily(self):
+        pulled = []
+
+        def items():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        seen = []
+        run_streaming(lambda i: len(pulled) - i, items(),
+                      lambda item, ok, ahead: seen.append(ahead), 4)
+        # No worker is ever more than a few items ahead of the others.
+        self.assertLessEqual(max(seen), 4)
+
+    def test_failing_iterable_is_reraised(self):
+        def items():
+            yield 1
+            raise KeyError('boom')
+
+        self.assertRaises(KeyError, run_streaming, lambda i: i, items(),
+                          lambda *outcome: None, 2)
+
+    def test_publish_result(self):
+        result = PublishResult()
+        result.routed, result.unrouted, result.seconds = 6, 2, 2.0
+        self.assertEqual(result.published, 8)
+        self.assertEqual(result.rate, 4.0)
+        self.assertTrue(result)
+        result.errors.append(('message', ValueError()))
+        self.assertFalse(result)
@@ -0,0 +1,129 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+import threading
+sys.path.append('..')
+import pyrabbit
+from pyrabbit.cache import ResponseCache
+from mock import Mock
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache({'overview': 5, 'all_users': 30},
+                                   maxsize=2, clock=self.clock)
+
+    def test_hit_returns_copy(self):
+        self.cache.set('overview', 'overview', {'a': [1]})
+        hit, value = self.cache.get('overview')
+        self.assertTrue(hit)
+        value['a'].append(2)
+        self.assertEqual(self.cache.get('overview')[1], {'a': [1]})
+
+    def test_expiry(self):
+        self.cache.set('overview', 'overview', {})
+        self.clock.now += 6
+        self.assertEqual(self.cache.get('overview'), (False, None))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_uncached_endpoint_is_ignored(self):
+        self.cache.set('all_queues', 'queues', [])
+        self.assertFalse(self.cache.get('queues')[0])
+
+    def test_lru_eviction(self):
+        self.cache.set('all_users', 'users?a', 1)
+        self.cache.set('all_users', 'users?b', 2)
+        self.cache.get('users?a')
+        self.cache.set('all_users', 'users?c', 3)
+        self.assertTrue(self.cache.get('users?a')[0])
+        self.assertFalse(self.cache.get('users?b')[0])
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_invalidate_for_write(self):
+        self.cache.set('overview', 'overview', 1)
+        self.cache.set('all_users', 'users', 2)
+        self.cache.invalidate_for_write('users_by_name')
+        self.assertTrue(self.cache.get('overview')[0])
+        self.assertFalse(self.cache.get('users')[0])
+        self.cache.invalidate_for_write('vhosts_by_name')
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestClientCache(unittest.TestCase):
+    def setUp(self):
+        self.client = pyrabbit.api.Client('localhost:55672', 'guest',
+                                          'guest', cache=True)
+        self.client.http.do_call = Mock(return_value=[{'name': 'guest'}])
+
+    def test_cache_off_by_default(self):
+        client = pyrabbit.api.Client('localhost:55672', 'guest', 'guest')
+        self.assertIsNone(client.cache)
+
+    def test_repeated_reads_hit_cache(self):
+        for i in range(3):
+            self.assertEqual(self.client.get_users(), [{'name': 'guest'}])
+        self.assertEqual(self.client.http.do_call.call_count, 1)
+
+    def test_uncached_endpoints_always_call(self):
+        self.client.get_queues()
+        self.client.get_queues()
+        self.assertEqual(self.client.http.do_call.call_count, 2)
+
+    def test_write_invalidates(self):
+        self.client.get_users()
+        self.client.delete_user('bob')
+        self.client.get_users()
+        self.assertEqual(self.client.http.do_call.call_count, 3)
+
+    def test_failed_write_invalidates(self):
+        self.client.get_all_vhosts()
+        self.client.http.do_call.side_effect = pyrabbit.http.HTTPError(
+            {}, 500, 'oops', 'vhosts/x')
+        self.assertRaises(pyrabbit.http.HTTPError,
+                          self.client.create_vhost, 'x')
+        self.assertEqual(len(self.client.cache), 0)
+
+
+class TestEndpointFor(unittest.TestCase):
+    def test_routes(self):
+        endpoint_for = pyrabbit.api._endpoint_for
+        self.assertEqual(endpoint_for('queues'), 'all_queues')
+        self.assertEqual(endpoint_for('queues/%2F?columns=name'),
+                         'queues_by_vhost')
+        self.assertEqual(endpoint_for('queues/%2F/q'), 'queues_by_name')
+        self.assertEqual(endpoint_for('queues/%2F/q/get'), 'get_from_queue')
+        self.assertEqual(endpoint_for('bindings/v/e/x/q/q/k'),
+                         'rt_bindings_between_exch_queue')
+        self.assertIsNone(endpoint_for('no/such/thing'))
+
+    def test_first_use_from_many_threads(self):
+        api = pyrabbit.api
+        api._routes = None
+        api._route_memo.clear()
+        start = threading.Event()
+        found = []
+
+        def lookup(i):
+            start.wait()
+            found.append(api._endpoint_for('queues/v/q%d/get' % i))
+        threads = [threading.Thread(target=lookup, args=(i,))
+                   for i in range(16)]
+        for t in threads:
+            t.start()
+        start.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(found, ['get_from_queue'] * 16)
+        self.assertEqual(len(api._routes), len(api.Client.urls))
@@ -0,0 +1,106 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import gc
+import json
+import sys
+sys.path.append('..')
+import pyrabbit
+from pyrabbit import http
+from pyrabbit.codec import JSONCodec, OrjsonCodec, get_codec
+from pyrabbit.testing import FakeBroker
+from mock import Mock
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class TestCodecs(unittest.TestCase):
+    def test_json(self):
+        codec = get_codec('json')
+        self.assertIsInstance(codec, JSONCodec)
+        self.assertEqual(codec.loads(u'{"a": [1, "\xe9"]}'.encode('utf-8')),
+                         {'a': [1, u'\xe9']})
+        self.assertEqual(json.loads(codec.dumps({'a': 1})), {'a': 1})
+        self.assertRaises(ValueError, codec.loads, b'{"a": ')
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson(self):
+        codec = get_codec('orjson')
+        self.assertIsInstance(codec, OrjsonCodec)
+        self.assertIsInstance(get_codec(), OrjsonCodec)
+        self.assertEqual(codec.loads(b'{"a": 1}'), {'a': 1})
+        self.assertEqual(json.loads(codec.dumps({1: 'x'})), {'1': 'x'})
+        self.assertRaises(ValueError, codec.loads, b'{"a": ')
+
+    def test_gc_is_left_alone_by_default(self):
+        data = json.dumps([{'name': 'q%d' % i} for i in range(60000)])
+        seen = []
+
+        def loads(text):
+            seen.append(gc.isenabled())
+            return []
+        original, json.loads = json.loads, loads
+        try:
+            JSONCodec().loads(data.encode())
+            JSONCodec(pause_gc=True).loads(data.encode())
+        finally:
+            json.loads = original
+        self.assertEqual(seen, [True, False])
+
+    def test_large_bodies_restore_gc(self):
+        data = json.dumps([{'name': 'q%d' % i} for i in range(60000)])
+        codec = JSONCodec(pause_gc=True)
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(len(codec.loads(data.encode())), 60000)
+        self.assertTrue(gc.isenabled())
+        gc.disable()
+        try:
+            codec.loads(data.encode())
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()
+
+    def test_custom_and_unknown(self):
+        codec = Mock()
+        self.assertIs(get_codec(codec), codec)
+        self.assertRaises(ValueError, get_codec, 'yaml')
+
+
+class TestDecoding(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.codec = Mock(wraps=JSONCodec())
+        self.c = http.HTTPClient('localhost:15672/api/', 'guest', 'guest',
+                                 transport=self.broker, codec=self.codec)
+
+    def test_bodyless_responses_are_not_decoded(self):
+        self.assertIsNone(self.c.do_call('vhosts/app', 'PUT'))
+        self.assertIsNone(self.c.do_call('vhosts/app', 'PUT'))
+        self.assertIsNone(self.c.do_call('vhosts/app', 'DELETE'))
+        self.assertFalse(self.codec.loads.called)
+
+    def test_listings_and_errors_are_decoded(self):
+        self.assertEqual(self.c.do_call('vhosts', 'GET')[0]['name'], '/')
+        with self.assertRaises(http.HTTPError) as ctx:
+            self.c.do_call('vhosts/nope', 'GET')
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertTrue(ctx.exception.detail.startswith('Not Found'))
+        self.assertEqual(self.codec.loads.call_count, 2)
+        self.assertIsInstance(self.codec.loads.call_args[0][0], bytes)
+
+    def test_client_encodes_bodies_with_codec(self):
+        client = pyrabbit.api.Client('localhost:15672/api/', 'guest', 'guest',
+                                     transport=self.broker, codec=self.codec)
+        self.assertIs(client.codec, self.codec)
+        client.create_queue('/', 'q1', durable=False)
+        self.codec.dumps.assert_called_with({'durable': False})
+        self.assertFalse(self.broker.queue('/', 'q1')['durable'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+sys.path.append('..')
+import pyrabbit
+from pyrabbit.definitions import Definitions
+from mock import Mock
+
+
+class TestDefinitions(unittest.TestCase):
+    def test_document_sections(self):
+        defs = Definitions()
+        defs.add_binding('v', 'x', 'q', 'key')
+        defs.add_vhost('v')
+        defs.add_queue('v', 'q')
+        doc = defs.to_document()
+        self.assertEqual(sorted(doc), ['bindings', 'queues', 'vhosts'])
+        self.assertEqual(doc['queues'][0], {'vhost': 'v', 'name': 'q',
+                                            'durable': True,
+                                            'auto_delete': False,
+                                            'arguments': {}})
+        self.assertEqual([s for s, o in defs.items()],
+                         ['vhosts', 'queues', 'bindings'])
+        self.assertEqual(len(defs), 3)
+
+    def test_from_document(self):
+        defs = Definitions({'queues': [{'name': 'q'}], 'policies': []})
+        self.assertEqual(len(defs), 1)
+
+
+class TestApplyDefinitions(unittest.TestCase):
+    def setUp(self):
+        self.client = pyrabbit.api.Client('localhost:55672', 'guest', 'guest')
+        self.defs = Definitions()
+        self.defs.add_vhost('v')
+        for i in range(10):
+            self.defs.add_queue('v', 'q%d' % i)
+        self.bodies = []
+
+    def do_call(self, bad=()):
+        def do_call(path, method, body=None, headers=None):
+            doc = json.loads(body)
+            self.bodies.append(doc)
+            names = [q['name'] for q in doc.get('queues', [])]
+            if set(names) & set(bad):
+                raise pyrabbit.http.HTTPError({}, 400, 'Bad Request', path)
+        return Mock(side_effect=do_call)
+
+    def test_single_request(self):
+        self.client.http.do_call = self.do_call()
+        result = self.client.apply_definitions(self.defs)
+        self.assertTrue(result)
+        self.assertEqual(len(result.succeeded), 11)
+        self.assertEqual(len(self.bodies), 1)
+        self.assertEqual(self.client.http.do_call.call_args[0][:2],
+                         ('definitions', 'POST'))
+
+    def test_chunking_keeps_order(self):
+        self.client.http.do_call = self.do_call()
+        self.client.apply_definitions(self.defs, chunk_size=4)
+        self.assertEqual(len(self.bodies), 3)
+        self.assertEqual(self.bodies[0]['vhosts'], [{'name': 'v'}])
+
+    def test_failures_are_isolated(self):
+        self.client.http.do_call = self.do_call(bad=('q3', 'q7'))
+        result = self.client.apply_definitions(self.defs)
+        self.assertFalse(result)
+        self.assertEqual([o['name'] for s, o in result.failed], ['q3', 'q7'])
+        self.assertEqual(len(result.succeeded), 9)
+
+    def test_vhost_scoped(self):
+        defs = Definitions()
+        defs.add_exchange('v', 'x', 'topic')
+        self.client.http.do_call = self.do_call()
+        self.client.apply_definitions(defs, vhost='/')
+        self.assertEqual(self.client.http.do_call.call_args[0][0],
+                         'definitions/%2F')
+        self.assertRaises(ValueError, self.client.apply_definitions,
+                          self.defs, vhost='/')
+
+    def test_permission_error_raises(self):
+        err = pyrabbit.http.HTTPError({}, 401, 'Unauthorized', 'definitions')
+        self.client.http.do_call = Mock(side_effect=err)
+        self.assertRaises(pyrabbit.api.PermissionError,
+                          self.client.apply_definitions, self.defs)
+
+    def test_get_definitions(self):
+        self.client.http.do_call = Mock(return_value={})
+        self.client.get_definitions('v')
+        self.client.http.do_call.assert_called_with('definitions/v', 'GET',
+                                                    None, None)
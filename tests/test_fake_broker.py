@@ -0,0 +1,239 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+sys.path.append('..')
+import pyrabbit
+from pyrabbit import http, reconcile
+from pyrabbit.definitions import Definitions
+from pyrabbit.testing import FakeBroker, hash_password, topic_matches
+
+
+class TestFakeBroker(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.client = pyrabbit.api.Client('localhost:15672/api/', 'guest',
+                                          'guest', transport=self.broker)
+        self.client.create_vhost('app')
+        self.client.create_exchange('app', 'events', 'topic')
+        self.client.create_queue('app', 'audit')
+        self.client.create_queue('app', 'orders')
+        self.client.create_binding('app', 'events', 'audit', '#')
+        self.client.create_binding('app', 'events', 'orders', 'order.*')
+
+    def test_provisioning(self):
+        self.assertTrue(self.client.is_alive('app'))
+        self.assertEqual(sorted(self.client.get_vhost_names()), ['/', 'app'])
+        names = [q['name'] for q in self.client.get_queues('app')]
+        self.assertEqual(names, ['audit', 'orders'])
+        self.assertEqual(self.client.get_exchange('app', 'events')['type'],
+                         'topic')
+        totals = self.client.get_overview()['object_totals']
+        self.assertEqual(totals['queues'], 2)
+
+    def test_routing(self):
+        self.assertTrue(self.client.publish('app', 'events', 'order.new',
+                                            'o1'))
+        self.assertTrue(self.client.publish('app', 'events', 'user.new',
+                                            'u1'))
+        self.assertTrue(self.client.publish('app', 'amq.default', 'orders',
+                                            'direct'))
+        self.assertFalse(self.client.publish('app', 'amq.default', 'nope',
+                                             'lost'))
+        self.assertEqual(self.broker.queue('app', 'audit')['messages'], 2)
+        messages = self.client.get_messages('app', 'orders', count=5)
+        self.assertEqual([m['payload'] for m in messages], ['o1', 'direct'])
+        self.assertEqual(self.broker.queue('app', 'orders')['messages'], 0)
+
+    def test_exchange_to_exchange_routing(self):
+        self.client.create_exchange('app', 'fan', 'fanout')
+        self.client.create_exchange_binding('app', 'fan', 'events', '')
+        self.client.publish('app', 'fan', 'order.paid', 'p')
+        self.assertEqual(self.broker.queue('app', 'orders')['messages'], 1)
+        self.assertEqual(self.broker.queue('app', 'audit')['messages'], 1)
+
+    def test_requeue_and_purge(self):
+        self.client.publish('app', 'events', 'order.new', 'o1')
+        msg = self.client.get_messages('app', 'orders', requeue=True)[0]
+        self.assertEqual(msg['message_count'], 1)
+        self.assertEqual(self.broker.queue('app', 'orders')['messages'], 1)
+        self.client.purge_queue('app', 'orders')
+        self.assertEqual(self.broker.queue('app', 'orders')['messages'], 0)
+
+    def test_redeclare_with_different_properties_is_refused(self):
+        self.client.create_queue('app', 'audit')
+        with self.assertRaises(http.HTTPError) as ctx:
+            self.client.create_queue('app', 'audit', durable=False)
+        self.assertEqual(ctx.exception.status, 400)
+
+    def test_missing_objects(self):
+        with self.assertRaises(http.HTTPError) as ctx:
+            self.client.create_queue('nowhere', 'q')
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertRaises(http.HTTPError, self.client.create_binding,
+                          'app', 'events', 'nope', 'k')
+        self.assertRaises(http.HTTPError, self.client.delete_queue,
+                          'app', 'nope')
+
+    def test_deletes_cascade(self):
+        self.client.delete_queue('app', 'orders')
+        sources = [(b['source'], b['destination'])
+                   for b in self.client.get_bindings()]
+        self.assertNotIn(('events', 'orders'), sources)
+        self.assertIn(('events', 'audit'), sources)
+        self.client.delete_exchange('app', 'events')
+        self.assertEqual([b['source'] for b in self.client.get_bindings()
+                          if b['vhost'] == 'app'], [''])
+        self.client.delete_vhost('app')
+        self.assertEqual(self.client.get_queues(), [])
+
+    def test_delete_binding_by_properties_key(self):
+        binding = [b for b in self.client.get_queue_bindings('app', 'orders')
+                   if b['source'] == 'events'][0]
+        self.client.delete_binding('app', 'events', 'orders',
+                                   binding['properties_key'])
+        self.assertEqual(len(self.client.get_queue_bindings('app',
+                                                            'orders')), 1)
+
+    def test_pagination_and_columns(self):
+        for i in range(25):
+            self.client.create_queue('app', 'bulk.%02d' % i)
+        names = [q['name'] for q in self.client.iter_queues(
+            'app', page_size=10, name='bulk')]
+        self.assertEqual(len(names), 25)
+        self.assertEqual(self.client.get_queues('app', columns=['name'])[0],
+                         {'name': 'audit'})
+
+    def test_definitions_round_trip(self):
+        doc = self.client.get_definitions('app')
+        broker = FakeBroker()
+        other = pyrabbit.api.Client('h/api/', 'guest', 'guest',
+                                    transport=broker)
+        other.create_vhost('app')
+        self.assertTrue(other.apply_definitions(doc, vhost='app'))
+        self.assertEqual(broker.queue('app', 'orders')['name'], 'orders')
+        other.publish('app', 'events', 'order.x', 'x')
+        self.assertEqual(broker.queue('app', 'orders')['messages'], 1)
+
+    def test_definitions_import_is_all_or_nothing(self):
+        defs = Definitions()
+        defs.add_queue('app', 'new')
+        defs.add_binding('app', 'events', 'missing', 'k')
+        result = self.client.apply_definitions(defs)
+        # Bisecting isolates the bad binding; the queue still goes in.
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0][1].status, 400)
+        self.assertIsNotNone(self.broker.queue('app', 'new'))
+
+    def test_reconcile(self):
+        defs = Definitions()
+        defs.add_queue('app', 'audit')
+        defs.add_queue('app', 'billing')
+        plan, result = reconcile.reconcile(self.client, defs, prune=True)
+        self.assertEqual(len(plan.creates), 1)
+        self.assertTrue(result)
+        names = [q['name'] for q in self.client.get_queues('app')]
+        self.assertEqual(names, ['audit', 'billing'])
+
+    def test_bad_credentials(self):
+        client = pyrabbit.api.Client('h/api/', 'guest', 'wrong',
+                                     transport=self.broker)
+        self.assertRaises(pyrabbit.api.PermissionError, client.get_overview)
+
+    def test_passwords_are_never_listed(self):
+        self.client.create_user('app', 'secret')
+        users = [self.client.get_users(),
+                 [self.client._call('users/app', 'GET')],
+                 self.client.get_definitions()['users']]
+        for listing in users:
+            for user in listing:
+                self.assertNotIn('password', user)
+                self.assertTrue(user['password_hash'])
+        self.assertNotIn('secret', str(users))
+
+    def test_password_hash_logs_in(self):
+        self.client.create_user('app', '', password_hash=hash_password('s'))
+        self.client.create_user('other', '', password_hash='c2FsdA==')
+        for user, password, ok in (('app', 's', True), ('app', '', False),
+                                   ('other', '', False)):
+            client = pyrabbit.api.Client('h/api/', user, password,
+                                         transport=self.broker)
+            if ok:
+                self.assertTrue(client.get_overview())
+            else:
+                self.assertRaises(pyrabbit.api.PermissionError,
+                                  client.get_overview)
+
+    def test_scale(self):
+        defs = Definitions()
+        for i in range(5000):
+            defs.add_queue('app', 'q%d' % i)
+            defs.add_binding('app', 'events', 'q%d' % i, 'k.%d' % i)
+        self.assertTrue(self.client.apply_definitions(defs))
+        self.assertEqual(len(self.client.get_queues('app')), 5002)
+        for i in range(5000):
+            self.client.publish('app', 'events', 'k.%d' % i, 'm')
+        self.assertEqual(self.broker.queue('app', 'q4999')['messages'], 1)
+        for i in range(5000):
+            self.assertEqual(len(self.client.get_queue_bindings(
+                'app', 'q%d' % i)), 2)
+            self.client.delete_queue('app', 'q%d' % i)
+        self.assertEqual([b['destination'] for b in
+                          self.client.get_bindings('app')
+                          if b['source'] == 'events'], ['audit', 'orders'])
+
+
+class TestFaultInjection(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.broker = FakeBroker(sleep=self.sleeps.append)
+
+    def client(self, **kwargs):
+        return pyrabbit.api.Client('h/api/', 'guest', 'guest',
+                                   transport=self.broker, **kwargs)
+
+    def test_scripted_failures(self):
+        self.broker.fail(503, count=2, method='GET', path='^overview')
+        client = self.client()
+        self.assertRaises(http.HTTPError, client.get_overview)
+        self.assertRaises(http.HTTPError, client.get_overview)
+        self.assertTrue(client.get_overview())
+        self.broker.fail(None)
+        self.assertRaises(http.NetworkError, client.get_overview)
+
+    def test_retries_ride_out_failures(self):
+        self.broker.fail(503, count=2)
+        client = self.client(retry=http.RetryPolicy(sleep=self.sleeps.append))
+        self.assertTrue(client.get_overview())
+        self.assertEqual(self.broker.requests['GET'], 3)
+
+    def test_random_failures_and_latency(self):
+        self.broker = FakeBroker(latency=0.01, error_rate=0.5, seed=1,
+                                 sleep=self.sleeps.append)
+        client = self.client()
+        failures = 0
+        for i in range(100):
+            try:
+                client.get_overview()
+            except http.HTTPError as err:
+                self.assertEqual(err.status, 503)
+                failures += 1
+        self.assertTrue(30 < failures < 70)
+        self.assertEqual(self.sleeps, [0.01] * 100)
+
+
+class TestTopicMatching(unittest.TestCase):
+    def test_patterns(self):
+        cases = [('a.*', 'a.b', True), ('a.*', 'a.b.c', False),
+                 ('a.#', 'a', True), ('#', 'x.y', True),
+                 ('a.#.c', 'a.b.b.c', True), ('a.#.c', 'a.c', True),
+                 ('*.b', 'b', False), ('a.b', 'a.b', True)]
+        for pattern, key, expected in cases:
+            self.assertEqual(topic_matches(pattern, key), expected,
+                             (pattern, key))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,9 +3,15 @@ try:
 except ImportError:
     import unittest
 
+import io
+import json
 import sys
+import threading
+import time
+import requests
 sys.path.append('..')
 from pyrabbit import http
+from mock import patch
 
 
 
@@ -36,3 +42,500 @@ class TestHTTPClient(unittest.TestCase):
         c = http.HTTPClient(self.testhost, self.testuser, self.testpass, 1)
         self.assertEqual(c.timeout, 1)
 
+
+    def test_client_reuses_pooled_session(self):
+        with patch('requests.Session.request') as req:
+            req.return_value = self._response({'status': 'ok'})
+            self.c.do_call('overview', 'GET')
+            session = self.c.transport._session
+            self.c.do_call('overview', 'GET')
+            self.assertIs(self.c.transport._session, session)
+            self.assertEqual(req.call_count, 2)
+
+    def test_client_close_releases_session(self):
+        with patch('requests.Session.request') as req:
+            req.return_value = self._response(None)
+            self.c.do_call('overview', 'GET')
+        self.assertIsNotNone(self.c.transport._session)
+        self.c.close()
+        self.assertIsNone(self.c.transport._session)
+
+    def test_client_context_manager_closes(self):
+        with http.HTTPClient(self.testhost, self.testuser,
+                             self.testpass) as c:
+            with patch('requests.Session.request') as req:
+                req.return_value = self._response(None)
+                c.do_call('overview', 'GET')
+            self.assertIsNotNone(c.transport._session)
+        self.assertIsNone(c.transport._session)
+
+    def test_client_idle_pool_is_evicted(self):
+        c = http.HTTPClient(self.testhost, self.testuser, self.testpass,
+                            pool_idle_timeout=10)
+        with patch('requests.Session.request') as req:
+            req.return_value = self._response(None)
+            c.do_call('overview', 'GET')
+            session = c.transport._session
+            c.transport._last_used -= 11
+            c.do_call('overview', 'GET')
+            self.assertIsNot(c.transport._session, session)
+
+    def test_stream_call_yields_items(self):
+        items = [{'name': 'q%d' % i, 'messages': i} for i in range(100)]
+        with patch('requests.Session.request') as req:
+            req.return_value = self._raw_response(json.dumps(items).encode())
+            result = self.c.stream_call('queues')
+            self.assertEqual(list(result), items)
+            self.assertTrue(req.call_args[1]['stream'])
+
+    def test_stream_call_raises_http_error(self):
+        with patch('requests.Session.request') as req:
+            req.return_value = self._raw_response(b'{"reason": "no"}', 404)
+            with self.assertRaises(http.HTTPError) as ctx:
+                self.c.stream_call('queues')
+            self.assertEqual(ctx.exception.detail, 'no')
+
+    def _raw_response(self, data, status=200):
+        resp = requests.Response()
+        resp.raw = io.BytesIO(data)
+        resp.status_code = status
+        return resp
+
+    def _response(self, content):
+        resp = requests.Response()
+        resp._content = json.dumps(content).encode()
+        resp.status_code = 200
+        return resp
+
+
+class TestIterJSONArray(unittest.TestCase):
+    def chunked(self, data, size):
+        data = data.encode('utf-8')
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def test_decodes_across_chunk_boundaries(self):
+        items = [{'name': u'q\u00e9%d' % i, 'args': {'x-ttl': [i, 1.5]}}
+                 for i in range(20)]
+        items += [12345, 'text, with ] and , chars', True, None, []]
+        data = json.dumps(items)
+        for size in (1, 2, 3, 7, 64, len(data)):
+            result = list(http.iter_json_array(self.chunked(data, size)))
+            self.assertEqual(result, items)
+
+    def test_number_split_across_chunks(self):
+        self.assertEqual(list(http.iter_json_array([b'[12', b'34]'])),
+                         [1234])
+
+    def test_split_at_every_offset(self):
+        data = (u'[0.5, 1e3, -2.25E-3, 10, true, false, null, "\u00e9", '
+                u'{"rate": 0.25}, [1.5]]').encode('utf-8')
+        expected = json.loads(data.decode('utf-8'))
+        for i in range(len(data) + 1):
+            self.assertEqual(list(http.iter_json_array([data[:i],
+                                                        data[i:]])),
+                             expected, 'split at %d' % i)
+        self.assertEqual(list(http.iter_json_array([b'[0.', b'5]'])), [0.5])
+        self.assertEqual(list(http.iter_json_array([b'[1e', b'3]'])),
+                         [1000.0])
+
+    def test_empty_array_and_body(self):
+        self.assertEqual(list(http.iter_json_array([b' [ ] '])), [])
+        self.assertEqual(list(http.iter_json_array([])), [])
+
+    def test_non_array_document(self):
+        self.assertEqual(list(http.iter_json_array([b'{"a"', b': 1}'])),
+                         [{'a': 1}])
+
+    def test_truncated_array(self):
+        with self.assertRaises(ValueError):
+            list(http.iter_json_array([b'[{"a": 1}, {"b"']))
+
+
+class TestCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.c = http.HTTPClient('localhost:15672', 'guest', 'guest',
+                                 coalesce=True)
+        self.release = threading.Event()
+        self.calls = []
+
+        def slow_call(path, method, body=None, headers=None, label=None):
+            self.calls.append(path)
+            self.release.wait(5)
+            if path == 'bad':
+                raise http.NetworkError('boom')
+            return [{'name': 'q1'}]
+        self.c._do_call = slow_call
+
+    def _run_concurrently(self, path, count):
+        results = [None] * count
+
+        def call(i):
+            try:
+                results[i] = self.c.do_call(path, 'GET')
+            except Exception as err:
+                results[i] = err
+
+        threads = [threading.Thread(target=call, args=(i,))
+                   for i in range(count)]
+        for t in threads:
+            t.start()
+        # Give every thread a chance to join the in-flight call.
+        while self.c.coalesce_stats['saved'] < count - 1:
+            time.sleep(0.001)
+        self.release.set()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_identical_gets_share_one_request(self):
+        results = self._run_concurrently('queues', 10)
+        self.assertEqual(self.calls, ['queues'])
+        self.assertEqual(self.c.coalesce_stats, {'issued': 1, 'saved': 9})
+        self.assertTrue(all(r == [{'name': 'q1'}] for r in results))
+        self.assertEqual(len(set(id(r) for r in results)), 10)
+
+    def test_callers_get_private_copies(self):
+        seen = []
+        original = self.c.do_call
+
+        def call_and_modify(path, method):
+            result = original(path, method)
+            seen.append(result[0]['name'])
+            result[0]['name'] = 'modified'
+            return result
+        self.c.do_call = call_and_modify
+        self._run_concurrently('queues', 10)
+        self.assertEqual(seen, ['q1'] * 10)
+
+    def test_errors_are_shared(self):
+        results = self._run_concurrently('bad', 4)
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(all(isinstance(r, http.NetworkError)
+                            for r in results))
+
+    def test_writes_are_never_coalesced(self):
+        self.release.set()
+        self.c.do_call('queues/%2F/q', 'PUT')
+        self.c.do_call('queues/%2F/q', 'PUT')
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.c.coalesce_stats['issued'], 0)
+
+
+class TestMultiEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.c = http.HTTPClient(['node1:15672', 'node2:15672',
+                                  'node3:15672'], 'guest', 'guest',
+                                 probe_interval=0.01)
+        self.down = set()
+        self.urls = []
+
+    def fake_request(self, method, url, **kwargs):
+        self.urls.append((method, url))
+        host = url.split('/')[2].split(':')[0]
+        if host in self.down:
+            raise requests.exceptions.ConnectionError('refused')
+        resp = requests.Response()
+        resp.raw = io.BytesIO(b'{}')
+        resp.status_code = 503 if host + '-503' in self.down else 200
+        return resp
+
+    def test_single_url_still_works(self):
+        c = http.HTTPClient('localhost:15672', 'guest', 'guest')
+        self.assertEqual(c.base_url, 'http://localhost:15672')
+        self.assertEqual(len(c.endpoints), 1)
+
+    def test_reads_spread_across_nodes(self):
+        with patch('requests.Session.request', self.fake_request):
+            for i in range(60):
+                self.c.do_call('overview', 'GET')
+        hosts = set(url.split('/')[2] for m, url in self.urls)
+        self.assertEqual(len(hosts), 3)
+
+    def test_reads_prefer_fastest(self):
+        self.c.endpoints[0].latency = 0.5
+        self.c.endpoints[1].latency = 0.001
+        self.c.endpoints[2].latency = 0.5
+        self.c.endpoints[1].latency_weight = 0
+        with patch('requests.Session.request', self.fake_request):
+            for i in range(30):
+                self.c.do_call('overview', 'GET')
+        fast = [u for m, u in self.urls if 'node2' in u]
+        self.assertGreater(len(fast), 15)
+
+    def test_reads_fail_over_fastest_first(self):
+        for endpoint, latency in zip(self.c.endpoints, (0.3, 0.1, 0.2)):
+            endpoint.latency = latency
+        for i in range(20):
+            order = self.c._candidates('GET')
+            self.assertEqual(sorted(order[1:], key=lambda e: e.latency),
+                             order[1:])
+        self.assertEqual(self.c._candidates('PUT'), self.c.endpoints)
+
+    def test_unmeasured_nodes_rank_as_average(self):
+        measured, unmeasured, idle = self.c.endpoints
+        measured.latency = 0.0
+        idle.healthy = False
+        for i in range(10):
+            self.assertEqual(self.c._candidates('GET')[:2],
+                             [measured, unmeasured])
+        idle.healthy = True
+        measured.latency, idle.latency = 0.1, 0.5
+        # Unmeasured, it ranks at 0.3, between the other two.
+        for i in range(10):
+            order = self.c._candidates('GET')
+            self.assertEqual(order[1:], [e for e in (measured, unmeasured,
+                                                     idle)
+                                         if e is not order[0]])
+
+    def test_writes_go_to_preferred_node(self):
+        with patch('requests.Session.request', self.fake_request):
+            for i in range(5):
+                self.c.do_call('vhosts/x', 'PUT')
+        self.assertTrue(all('node1' in u for m, u in self.urls))
+
+    def test_read_fails_over_and_ejects(self):
+        self.down.add('node1')
+        self.c.endpoints[0].latency = 0
+        self.c.endpoints[1].latency = 1
+        self.c.endpoints[2].latency = 1
+        with patch('requests.Session.request', self.fake_request):
+            for i in range(10):
+                self.assertEqual(self.c.do_call('overview', 'GET'), None)
+            self.assertFalse(self.c.endpoints[0].healthy)
+            self.assertEqual(self.c.endpoint_stats()[0]['failures'], 1)
+            # Writes move to the next node while the preferred one is out.
+            self.c.do_call('vhosts/x', 'PUT')
+            self.assertIn('node2', self.urls[-1][1])
+
+            # Once the node is back, the probe returns it to rotation.
+            self.down.clear()
+            deadline = time.time() + 5
+            while not self.c.endpoints[0].healthy and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertTrue(self.c.endpoints[0].healthy)
+        self.c.close()
+
+    def test_5xx_fails_over_reads_but_not_writes(self):
+        self.down.update(['node1-503', 'node2-503', 'node3-503'])
+        with patch('requests.Session.request', self.fake_request):
+            with self.assertRaises(http.HTTPError):
+                self.c.do_call('overview', 'GET')
+            self.assertEqual(len(self.urls), 3)
+            del self.urls[:]
+            with self.assertRaises(http.HTTPError):
+                self.c.do_call('vhosts/x', 'PUT')
+            self.assertEqual(len(self.urls), 1)
+        self.c.close()
+
+    def test_write_network_error_is_not_retried(self):
+        self.down.add('node1')
+        with patch('requests.Session.request', self.fake_request):
+            self.assertRaises(http.NetworkError, self.c.do_call,
+                              'vhosts/x', 'PUT')
+        self.assertEqual(len(self.urls), 1)
+        self.c.close()
+
+
+class TestHedging(unittest.TestCase):
+    def setUp(self):
+        self.policy = http.HedgePolicy(max_delay=0.02, min_samples=1000)
+        self.c = http.HTTPClient(['node1:15672', 'node2:15672'], 'guest',
+                                 'guest', hedge=self.policy)
+        # Make node1 the primary for every read.
+        self.c.endpoints[0].latency = 0.001
+        self.c.endpoints[1].latency = 0.002
+        self.c.endpoints[0].latency_weight = 0
+        self.c.endpoints[1].latency_weight = 0
+        self.delays = {'node1': 0, 'node2': 0}
+        self.fail = set()
+        self.closed = []
+
+    def fake_request(self, method, url, **kwargs):
+        host = url.split('/')[2].split(':')[0]
+        time.sleep(self.delays[host])
+        if host in self.fail:
+            raise requests.exceptions.ConnectionError('refused')
+        resp = requests.Response()
+        resp.raw = io.BytesIO(json.dumps({'host': host}).encode())
+        resp.status_code = 200
+        resp.close = lambda: self.closed.append(host)
+        return resp
+
+    def call(self):
+        with patch('requests.Session.request', self.fake_request):
+            return self.c.do_call('queues/%2F/q', 'GET')
+
+    def test_fast_primary_is_not_hedged(self):
+        self.assertEqual(self.call(), {'host': 'node1'})
+        self.assertEqual(self.policy.stats()['hedged'], 0)
+
+    def test_slow_primary_is_hedged(self):
+        self.delays['node1'] = 0.3
+        self.assertEqual(self.call(), {'host': 'node2'})
+        stats = self.policy.stats()
+        self.assertEqual((stats['hedged'], stats['hedge_wins']), (1, 1))
+        self.assertEqual(stats['hedge_rate'], 1.0)
+        # The loser's connection is dropped once it answers.
+        deadline = time.time() + 2
+        while 'node1' not in self.closed and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertIn('node1', self.closed)
+
+    def test_hedge_loses_to_primary(self):
+        self.delays['node1'] = 0.05
+        self.delays['node2'] = 0.5
+        self.assertEqual(self.call(), {'host': 'node1'})
+        self.assertEqual(self.policy.stats()['primary_wins'], 1)
+
+    def test_failed_primary_goes_to_other_node(self):
+        self.fail.add('node1')
+        self.assertEqual(self.call(), {'host': 'node2'})
+
+    def test_both_fail(self):
+        self.fail.update(['node1', 'node2'])
+        self.assertRaises(http.NetworkError, self.call)
+
+    def test_writes_are_not_hedged(self):
+        self.delays['node1'] = 0.05
+        with patch('requests.Session.request', self.fake_request):
+            self.c.do_call('queues/%2F/q', 'PUT')
+        self.assertEqual(self.policy.stats()['requests'], 0)
+
+    def test_delay_uses_percentile(self):
+        policy = http.HedgePolicy(percentile=90, min_delay=0, min_samples=10)
+        self.assertEqual(policy.delay(), policy.max_delay)
+        for i in range(1, 101):
+            policy.record(i / 1000.0, False, False)
+        self.assertAlmostEqual(policy.delay(), 0.09, places=2)
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.policy = http.RetryPolicy(max_attempts=3, backoff=0.1,
+                                       sleep=self.sleeps.append)
+        self.c = http.HTTPClient('localhost:15672', 'guest', 'guest',
+                                 retry=self.policy)
+        self.answers = []
+        self.calls = []
+
+    def fake_request(self, method, url, **kwargs):
+        self.calls.append(method)
+        answer = self.answers.pop(0) if self.answers else 200
+        if answer == 'down':
+            raise requests.exceptions.ConnectionError('refused')
+        resp = requests.Response()
+        resp.raw = io.BytesIO(b'{}')
+        resp.status_code = answer
+        return resp
+
+    def call(self, method='GET'):
+        with patch('requests.Session.request', self.fake_request):
+            return self.c.do_call('overview', method)
+
+    def test_transient_errors_are_retried(self):
+        self.answers = [503, 'down']
+        self.assertEqual(self.call(), None)
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.policy.stats()['retries'], 2)
+
+    def test_backoff_is_jittered_and_capped(self):
+        for attempt in range(1, 10):
+            delay = self.policy.delay(attempt)
+            self.assertTrue(0 <= delay <= min(5.0, 0.1 * 2 ** (attempt - 1)))
+        self.assertEqual(self.policy.delay(1, retry_after='2'), 2.0)
+        self.assertEqual(self.policy.delay(1, retry_after='60'), 5.0)
+
+    def test_gives_up_after_max_attempts(self):
+        self.answers = [503, 503, 503, 503]
+        self.assertRaises(http.HTTPError, self.call)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_post_and_client_errors_are_not_retried(self):
+        self.answers = [503]
+        self.assertRaises(http.HTTPError, self.call, 'POST')
+        self.answers = [404]
+        self.assertRaises(http.HTTPError, self.call)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.sleeps, [])
+
+    def test_budget_limits_retries(self):
+        self.policy.budget_cap = 1
+        self.policy._tokens = 1
+        self.answers = ['down', 'down', 'down']
+        self.assertRaises(http.NetworkError, self.call)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.policy.stats()['budget_exhausted'], 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = [1000.0]
+        self.breaker = http.CircuitBreaker(failure_threshold=2,
+                                           reset_timeout=10,
+                                           clock=lambda: self.now[0])
+        self.status = 503
+        self.calls = []
+
+    def fake_request(self, method, url, **kwargs):
+        self.calls.append(url)
+        resp = requests.Response()
+        resp.raw = io.BytesIO(b'{}')
+        resp.status_code = self.status
+        return resp
+
+    def test_breaker_states(self):
+        b = self.breaker
+        b.record_failure()
+        self.assertTrue(b.allow())
+        b.record_failure()
+        self.assertEqual(b.state, b.OPEN)
+        self.assertFalse(b.allow())
+        self.now[0] += 10
+        self.assertTrue(b.allow())
+        self.assertEqual(b.state, b.HALF_OPEN)
+        # Only one trial request at a time.
+        self.assertFalse(b.allow())
+        b.record_failure()
+        self.assertEqual(b.state, b.OPEN)
+        self.now[0] += 10
+        self.assertTrue(b.allow())
+        b.record_success()
+        self.assertEqual(b.state, b.CLOSED)
+        self.assertEqual(b.rejected, 2)
+
+    def test_open_circuit_fails_fast(self):
+        c = http.HTTPClient('localhost:15672', 'guest', 'guest',
+                            circuit_breaker=self.breaker,
+                            retry=http.RetryPolicy(sleep=lambda s: None))
+        with patch('requests.Session.request', self.fake_request):
+            # Two failures (one call plus its retry) open the circuit.
+            self.assertRaises(http.CircuitOpenError, c.do_call,
+                              'overview', 'GET')
+            self.assertEqual(len(self.calls), 2)
+            self.assertRaises(http.CircuitOpenError, c.do_call,
+                              'overview', 'GET')
+            self.assertEqual(len(self.calls), 2)
+            self.assertEqual(c.endpoint_stats()[0]['circuit'], 'open')
+
+            self.now[0] += 10
+            self.status = 200
+            self.assertEqual(c.do_call('overview', 'GET'), None)
+        self.assertEqual(c.endpoint_stats()[0]['circuit'], 'closed')
+        # Each endpoint gets its own breaker.
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertIsNot(c.endpoints[0].breaker, self.breaker)
+
+    def test_open_circuit_sends_writes_elsewhere(self):
+        c = http.HTTPClient(['node1:15672', 'node2:15672'], 'guest',
+                            'guest', circuit_breaker=self.breaker)
+        breaker = c.endpoints[0].breaker
+        breaker.record_failure()
+        breaker.record_failure()
+        self.status = 204
+        with patch('requests.Session.request', self.fake_request):
+            c.do_call('vhosts/x', 'PUT')
+        self.assertEqual(len(self.calls), 1)
+        self.assertIn('node2', self.calls[0])
+        c.close()
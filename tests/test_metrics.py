@@ -0,0 +1,114 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import io
+import json
+import sys
+import requests
+sys.path.append('..')
+import pyrabbit
+from pyrabbit.metrics import Metrics
+from mock import patch
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1.0))
+
+    def test_snapshot(self):
+        self.metrics.observe('overview', 'GET', 0.05, 200, 0, 100, 0.001)
+        self.metrics.observe('overview', 'GET', 0.5, 200, 0, 50, 0.002)
+        self.metrics.observe('overview', 'GET', 3.0, None,
+                             error='NetworkError')
+        self.metrics.observe(None, 'PUT', 0.01, 204, 12)
+        snap = self.metrics.snapshot()
+
+        data = snap['overview']['GET']
+        self.assertEqual(data['latency']['count'], 3)
+        self.assertAlmostEqual(data['latency']['sum'], 3.55)
+        self.assertEqual(data['latency']['buckets'],
+                         [(0.1, 1), (1.0, 2), (float('inf'), 3)])
+        self.assertEqual(data['response_bytes'], 150)
+        self.assertAlmostEqual(data['decode_seconds'], 0.003)
+        self.assertEqual(data['statuses'], {200: 2})
+        self.assertEqual(data['errors'], {'NetworkError': 1})
+        self.assertEqual(snap['other']['PUT']['request_bytes'], 12)
+
+    def test_reset(self):
+        self.metrics.observe('overview', 'GET', 0.05, 200)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot(), {})
+
+    def test_prometheus(self):
+        self.metrics.observe('queues_by_name', 'GET', 0.05, 404,
+                             error='HTTPError')
+        text = self.metrics.to_prometheus()
+        labels = 'endpoint="queues_by_name",method="GET"'
+        self.assertIn('# TYPE pyrabbit_request_duration_seconds histogram',
+                      text)
+        self.assertIn('pyrabbit_request_duration_seconds_bucket{%s,le="0.1"} 1'
+                      % labels, text)
+        self.assertIn('pyrabbit_request_duration_seconds_bucket{%s,le="+Inf"} '
+                      '1' % labels, text)
+        self.assertIn('pyrabbit_request_duration_seconds_count{%s} 1' % labels,
+                      text)
+        self.assertIn('pyrabbit_responses_total{%s,status="404"} 1' % labels,
+                      text)
+        self.assertIn('pyrabbit_errors_total{%s,error="HTTPError"} 1' % labels,
+                      text)
+        self.assertTrue(text.endswith('\n'))
+
+
+class TestClientMetrics(unittest.TestCase):
+    def setUp(self):
+        self.client = pyrabbit.api.Client('localhost:55672', 'guest', 'guest',
+                                          metrics=True)
+        self.status = 200
+        self.body = [{'name': 'q1', 'vhost': '/'}]
+
+    def fake_request(self, method, url, **kwargs):
+        resp = requests.Response()
+        resp.raw = io.BytesIO(json.dumps(self.body).encode())
+        resp.status_code = self.status
+        return resp
+
+    def test_calls_are_keyed_by_url_name(self):
+        with patch('requests.Session.request', self.fake_request):
+            self.client.get_queue('/', 'q1')
+            self.client.get_queue('/', 'q2')
+            list(self.client.get_queues(stream=True))
+            size = len(json.dumps(self.body))
+            self.status = 404
+            self.body = {'error': 'Object Not Found', 'reason': 'Not Found'}
+            self.assertRaises(pyrabbit.http.HTTPError,
+                              self.client.get_queue, '/', 'q3')
+        snap = self.client.metrics.snapshot()
+        data = snap['queues_by_name']['GET']
+        self.assertEqual(data['latency']['count'], 3)
+        self.assertEqual(data['statuses'], {200: 2, 404: 1})
+        self.assertEqual(data['errors'], {'HTTPError': 1})
+        self.assertEqual(data['response_bytes'],
+                         2 * size + len(json.dumps(self.body)))
+        self.assertEqual(snap['all_queues']['GET']['response_bytes'], size)
+
+    def test_request_bytes(self):
+        self.body = {}
+        with patch('requests.Session.request', self.fake_request):
+            self.client.create_vhost('app')
+        data = self.client.metrics.snapshot()['vhosts_by_name']['PUT']
+        self.assertEqual(data['request_bytes'], 0)
+        with patch('requests.Session.request', self.fake_request):
+            self.client.create_queue('app', 'q', durable=True)
+        data = self.client.metrics.snapshot()['queues_by_name']['PUT']
+        self.assertGreater(data['request_bytes'], 0)
+
+    def test_off_by_default(self):
+        client = pyrabbit.api.Client('localhost:55672', 'guest', 'guest')
+        self.assertIsNone(client.metrics)
+        self.assertIsNone(client.http.metrics)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 """Main test file for the pyrabbit Client."""
 
+import io
 import json
 
 try:
@@ -13,6 +14,7 @@ import sys
 import requests
 sys.path.append('..')
 import pyrabbit
+from pyrabbit.testing import FakeBroker
 from mock import Mock, patch
 
 class TestClient(unittest.TestCase):
@@ -41,6 +43,45 @@ class TestClient(unittest.TestCase):
         queues = self.client.get_queues()
         self.assertIsInstance(queues, list)
 
+    def test_get_queues_columns(self):
+        self.client.http.do_call = Mock(return_value=[])
+        self.client.get_queues('/', columns=['name', 'messages',
+                                             'message_stats.publish_details.rate'])
+        self.client.http.do_call.assert_called_with(
+            'queues/%2F?columns=name%2Cmessages%2C'
+            'message_stats.publish_details.rate', 'GET', None, None)
+
+    def test_get_queues_no_columns(self):
+        self.client.http.do_call = Mock(return_value=[])
+        self.client.get_queues()
+        self.client.http.do_call.assert_called_with('queues', 'GET',
+                                                    None, None)
+
+    def test_get_connections_columns(self):
+        self.client.http.do_call = Mock(return_value=[])
+        self.client.get_connections(columns=['name', 'user'])
+        self.client.http.do_call.assert_called_with(
+            'connections?columns=name%2Cuser', 'GET', None, None)
+
+    def test_get_channels_columns(self):
+        self.client.http.do_call = Mock(return_value=[])
+        self.client.get_channels(columns='name,consumer_count')
+        self.client.http.do_call.assert_called_with(
+            'channels?columns=name%2Cconsumer_count', 'GET', None, None)
+
+    def test_get_queues_stream(self):
+        items = [{'name': 'q1'}, {'name': 'q2'}]
+        self.client.http.stream_call = Mock(return_value=iter(items))
+        result = self.client.get_queues('/', stream=True)
+        self.assertEqual(list(result), items)
+        self.client.http.stream_call.assert_called_with('queues/%2F', 'GET')
+
+    def test_get_bindings_stream_permission_error(self):
+        err = pyrabbit.http.HTTPError({}, 401, 'Unauthorized', 'bindings')
+        self.client.http.stream_call = Mock(side_effect=err)
+        with self.assertRaises(pyrabbit.api.PermissionError):
+            self.client.get_bindings(stream=True)
+
     def test_get_nodes(self):
         self.client.http.do_call = Mock(return_value=[])
         nodes = self.client.get_nodes()
@@ -48,7 +89,85 @@ class TestClient(unittest.TestCase):
 
     def test_purge_queues(self):
         self.client.http.do_call = Mock(return_value=True)
-        self.assertTrue(self.client.purge_queues(['q1', 'q2']))
+        self.assertTrue(self.client.purge_queues([('/', 'q1'), ('/', 'q2')]))
+        self.client.http.do_call.assert_called_with(
+            'queues/%2F/q2/contents', 'DELETE', None, None)
+
+    def test_purge_queues_reports_failures(self):
+        def do_call(path, method, body=None, headers=None):
+            if 'q2' in path:
+                raise pyrabbit.http.HTTPError({}, 404, 'Not Found', path)
+        self.client.http.do_call = Mock(side_effect=do_call)
+        result = self.client.purge_queues([('/', 'q1'), ('/', 'q2'),
+                                           ('/', 'q3')], concurrency=3)
+        self.assertFalse(result)
+        self.assertEqual(result.succeeded, [('/', 'q1'), ('/', 'q3')])
+        self.assertEqual(result.failed, [('/', 'q2')])
+
+    def test_delete_queues(self):
+        self.client.http.do_call = Mock(return_value=None)
+        result = self.client.delete_queues([('/', 'q1'), ('/', 'q2')])
+        self.assertTrue(result)
+        self.assertEqual(self.client.http.do_call.call_count, 2)
+
+    def test_delete_exchanges(self):
+        self.client.http.do_call = Mock(return_value=None)
+        self.assertTrue(self.client.delete_exchanges([('/', 'x1')]))
+
+    def test_delete_bindings(self):
+        self.client.http.do_call = Mock(return_value=None)
+        self.assertTrue(self.client.delete_bindings([('/', 'x', 'q', 'k')]))
+
+    def test_delete_connections(self):
+        self.client.http.do_call = Mock(return_value=None)
+        result = self.client.delete_connections(['c1', 'c2'], concurrency=2)
+        self.assertEqual(result.succeeded, ['c1', 'c2'])
+
+    def _paged(self, items, page_size):
+        def do_call(path, method, body=None, headers=None):
+            query = dict(i.split('=') for i in path.split('?')[1].split('&'))
+            page, size = int(query['page']), int(query['page_size'])
+            count = (len(items) + size - 1) // size
+            return {'items': items[(page - 1) * size:page * size],
+                    'page': page, 'page_count': count,
+                    'page_size': size, 'total_count': len(items)}
+        return Mock(side_effect=do_call)
+
+    def test_iter_queues(self):
+        queues = [{'name': 'q%d' % i} for i in range(25)]
+        for prefetch in (True, False):
+            self.client.http.do_call = self._paged(queues, 10)
+            result = list(self.client.iter_queues('/', page_size=10,
+                                                  prefetch=prefetch))
+            self.assertEqual(result, queues)
+            self.assertEqual(self.client.http.do_call.call_count, 3)
+        self.assertEqual(self.client.http.do_call.call_args_list[0][0][0],
+                         'queues/%2F?page=1&page_size=10')
+
+    def test_iter_queues_is_lazy(self):
+        self.client.http.do_call = self._paged([{'name': 'q'}] * 30, 10)
+        queues = self.client.iter_queues(page_size=10, prefetch=False)
+        next(queues)
+        self.assertEqual(self.client.http.do_call.call_count, 1)
+
+    def test_iter_queues_name_filter(self):
+        self.client.http.do_call = self._paged([], 100)
+        self.assertEqual(list(self.client.iter_queues(name='^amq',
+                                                      use_regex=True)), [])
+        self.assertEqual(self.client.http.do_call.call_args[0][0],
+                         'queues?name=%5Eamq&page=1&page_size=100'
+                         '&use_regex=true')
+
+    def test_iter_exchanges_unpaginated_server(self):
+        xchs = [{'name': 'x1'}, {'name': 'x2'}]
+        self.client.http.do_call = Mock(return_value=xchs)
+        self.assertEqual(list(self.client.iter_exchanges()), xchs)
+
+    def test_iter_connections(self):
+        conns = [{'name': 'c%d' % i} for i in range(3)]
+        self.client.http.do_call = self._paged(conns, 2)
+        self.assertEqual(list(self.client.iter_connections(page_size=2)),
+                         conns)
 
     def test_get_queue(self):
         self.client.http.do_call = Mock(return_value=True)
@@ -76,7 +195,7 @@ class TestClient(unittest.TestCase):
         self.assertEqual(myexch['name'], 'foo')
 
     def test_get_users(self):
-        with patch('pyrabbit.http.HTTPClient.do_call') as do_call:
+        with patch('pyrabbit.http.HTTPClient.do_call'):
             self.assertTrue(self.client.get_users())
 
     def test_get_queue_depth(self):
@@ -94,7 +213,7 @@ class TestClient(unittest.TestCase):
         q = {'messages': 8}
         json_q = json.dumps(q)
 
-        with patch('requests.request') as req:
+        with patch('requests.Session.request') as req:
             resp = requests.Response()
             resp._content = json_q.encode()
             resp.status_code = 200
@@ -103,6 +222,46 @@ class TestClient(unittest.TestCase):
             self.assertEqual(depth, q['messages'])
 
 
+    def _depths(self, name, ready=1, unacked=2):
+        return {'name': name, 'messages': ready + unacked,
+                'messages_ready': ready, 'messages_unacknowledged': unacked}
+
+    def test_get_queue_depths_all(self):
+        self.client.http.do_call = Mock(return_value=[self._depths('q1'),
+                                                      self._depths('q2')])
+        depths = self.client.get_queue_depths('/')
+        self.assertEqual(depths, {'q1': (3, 1, 2), 'q2': (3, 1, 2)})
+        self.assertEqual(depths['q1'].messages_unacknowledged, 2)
+        self.client.http.do_call.assert_called_once_with(
+            'queues/%2F?columns=messages%2Cmessages_ready%2C'
+            'messages_unacknowledged%2Cname', 'GET', None, None)
+
+    def test_get_queue_depths_few_names(self):
+        def do_call(path, method, body=None, headers=None):
+            name = path.split('?')[0].split('/')[-1]
+            if name == 'missing':
+                raise pyrabbit.http.HTTPError({}, 404, 'Not Found', path)
+            return self._depths(name, ready=5)
+        self.client.http.do_call = Mock(side_effect=do_call)
+        depths = self.client.get_queue_depths('/', ['q1', 'missing'],
+                                              concurrency=2)
+        self.assertEqual(depths, {'q1': (7, 5, 2)})
+        self.assertEqual(self.client.http.do_call.call_count, 2)
+
+    def test_get_queue_depths_errors_raise(self):
+        err = pyrabbit.http.HTTPError({}, 500, 'Error', 'queues/%2F/q1')
+        self.client.http.do_call = Mock(side_effect=err)
+        self.assertRaises(pyrabbit.http.HTTPError,
+                          self.client.get_queue_depths, '/', ['q1'])
+
+    def test_get_queue_depths_many_names_uses_listing(self):
+        queues = [self._depths('q%d' % i) for i in range(20)]
+        self.client.http.do_call = Mock(return_value=queues)
+        names = ['q%d' % i for i in range(10)] + ['missing']
+        depths = self.client.get_queue_depths('/', names)
+        self.assertEqual(sorted(depths), sorted(names[:-1]))
+        self.assertEqual(self.client.http.do_call.call_count, 1)
+
     def test_purge_queue(self):
         self.client.http.do_call = Mock(return_value=True)
         self.assertTrue(self.client.purge_queue('vname', 'qname'))
@@ -135,6 +294,12 @@ class TestClient(unittest.TestCase):
         self.client.http.do_call = Mock(return_value=True)
         self.assertTrue(self.client.get_bindings())
 
+    def test_get_bindings_by_vhost(self):
+        self.client.http.do_call = Mock(return_value=[])
+        self.assertEqual(self.client.get_bindings('/'), [])
+        self.client.http.do_call.assert_called_with('bindings/%2F', 'GET',
+                                                    None, None)
+
     def test_create_binding(self):
         self.client.http.do_call = Mock(return_value=True)
         self.assertTrue(self.client.create_binding('vhost',
@@ -196,6 +361,112 @@ class TestClient(unittest.TestCase):
             self.assertTrue(self.client.is_alive())
 
 
+class TestPublishMany(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.client = pyrabbit.api.Client('localhost:15672/api/', 'guest',
+                                          'guest', transport=self.broker,
+                                          max_concurrency=4)
+        self.client.create_queue('/', 'q')
+
+    def test_counts(self):
+        messages = (('q' if i % 4 else 'nowhere', 'm%d' % i)
+                    for i in range(100))
+        result = self.client.publish_many('/', 'amq.default', messages)
+        self.assertTrue(result)
+        self.assertEqual((result.routed, result.unrouted), (75, 25))
+        self.assertGreater(result.rate, 0)
+        self.assertEqual(self.broker.queue('/', 'q')['messages'], 75)
+
+    def test_bytes_are_base64_encoded(self):
+        self.client.publish_many('/', 'amq.default', [
+            ('q', b'\x00\xff', {'delivery_mode': 2}),
+            ('q', memoryview(b'view')), ('q', u'text')], concurrency=1)
+        messages = self.client.get_messages('/', 'q', count=3)
+        self.assertEqual([(m['payload'], m['payload_encoding'])
+                          for m in messages],
+                         [('AP8=', 'base64'), ('dmlldw==', 'base64'),
+                          ('text', 'string')])
+        self.assertEqual(messages[0]['properties'], {'delivery_mode': 2})
+
+    def test_errors_are_collected(self):
+        result = self.client.publish_many('nope', 'amq.default',
+                                          [('q', 'a'), ('q', 'b')])
+        self.assertFalse(result)
+        self.assertEqual(result.published, 0)
+        self.assertEqual(sorted(m for m, err in result.errors),
+                         [('q', 'a'), ('q', 'b')])
+
+
+class TestIterMessages(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.client = pyrabbit.api.Client('localhost:15672/api/', 'guest',
+                                          'guest', transport=self.broker)
+        self.client.create_queue('/', 'dlq')
+        self.client.publish_many('/', 'amq.default',
+                                 (('dlq', 'message %d' % i)
+                                  for i in range(1000)))
+        self.counts = []
+        call = self.client._call
+
+        def spy(path, method, body=None, headers=None):
+            messages = call(path, method, body, headers)
+            self.counts.append(len(messages or ()))
+            return messages
+        self.client._call = spy
+
+    def depth(self):
+        return self.broker.queue('/', 'dlq')['messages']
+
+    def test_drain(self):
+        payloads = [m['payload'] for m in
+                    self.client.iter_messages('/', 'dlq')]
+        self.assertEqual(payloads, ['message %d' % i for i in range(1000)])
+        self.assertEqual(self.depth(), 0)
+        self.assertEqual(self.counts[:4], [10, 20, 40, 80])
+
+    def test_batches_shrink_for_big_payloads(self):
+        self.client.message_batch_bytes = 50
+        list(self.client.iter_messages('/', 'dlq', max_messages=40))
+        self.assertEqual(self.counts[:3], [10, 5, 5])
+
+    def test_message_budget(self):
+        messages = list(self.client.iter_messages('/', 'dlq',
+                                                  max_messages=25))
+        self.assertEqual(len(messages), 25)
+        self.assertEqual(self.depth(), 975)
+
+    def test_byte_budget_and_sink(self):
+        sink = io.BytesIO()
+        messages = list(self.client.iter_messages(
+            '/', 'dlq', max_bytes=50, truncate=3, sink=sink))
+        self.assertEqual(len(messages), 17)
+        self.assertNotIn('payload', messages[0])
+        self.assertEqual(sink.getvalue()[:8], b'mes\nmes\n')
+
+    def test_byte_budget_counts_decoded_bytes(self):
+        self.client.purge_queue('/', 'dlq')
+        self.client.publish_many('/', 'amq.default',
+                                 [('dlq', u'\u00e9t\u00e9')] * 10 +
+                                 [('dlq', b'\x00\xff\x00\xff')] * 10)
+        messages = list(self.client.iter_messages('/', 'dlq', max_bytes=30,
+                                                  batch_size=1))
+        self.assertEqual(len(messages), 6)
+        list(self.client.iter_messages('/', 'dlq', max_messages=4))
+        messages = list(self.client.iter_messages('/', 'dlq', max_bytes=16,
+                                                  batch_size=1))
+        self.assertEqual([m['payload_encoding'] for m in messages],
+                         ['base64'] * 4)
+
+    def test_peek(self):
+        messages = list(self.client.iter_messages('/', 'dlq', requeue=True,
+                                                  max_messages=5))
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(self.counts, [5])
+        self.assertEqual(self.depth(), 1000)
+
+
 @unittest.skip
 class TestLiveServer(unittest.TestCase):
     def setUp(self):
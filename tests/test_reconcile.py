@@ -0,0 +1,182 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+sys.path.append('..')
+import pyrabbit
+from pyrabbit import reconcile
+from pyrabbit.definitions import Definitions
+from pyrabbit.testing import FakeBroker
+from mock import Mock
+
+
+LIVE = {
+    'vhosts': [{'name': 'v'}, {'name': 'other'}],
+    'users': [{'name': 'guest', 'tags': ['administrator']},
+              {'name': 'app', 'tags': ''}],
+    'permissions': [{'vhost': 'v', 'user': 'app', 'configure': '.*',
+                     'write': '.*', 'read': '.*'}],
+    'exchanges': [{'vhost': 'v', 'name': '', 'type': 'direct',
+                   'durable': True, 'auto_delete': False, 'internal': False,
+                   'arguments': {}},
+                  {'vhost': 'v', 'name': 'amq.topic', 'type': 'topic',
+                   'durable': True, 'auto_delete': False, 'internal': False,
+                   'arguments': {}},
+                  {'vhost': 'v', 'name': 'events', 'type': 'topic',
+                   'durable': True, 'auto_delete': False, 'internal': False,
+                   'arguments': {}}],
+    'queues': [{'vhost': 'v', 'name': 'keep', 'durable': True,
+                'auto_delete': False, 'arguments': {}},
+               {'vhost': 'v', 'name': 'stale', 'durable': True,
+                'auto_delete': False, 'arguments': {}},
+               {'vhost': 'v', 'name': 'transient', 'durable': True,
+                'auto_delete': False, 'arguments': {}},
+               {'vhost': 'other', 'name': 'untouched', 'durable': True,
+                'auto_delete': False, 'arguments': {}}],
+    'bindings': [{'vhost': 'v', 'source': '', 'destination': 'keep',
+                  'destination_type': 'queue', 'routing_key': 'keep',
+                  'arguments': {}, 'properties_key': 'keep'},
+                 {'vhost': 'v', 'source': 'events', 'destination': 'stale',
+                  'destination_type': 'queue', 'routing_key': 'a.*',
+                  'arguments': {}, 'properties_key': 'a.%2A'}],
+}
+
+
+def desired():
+    defs = Definitions()
+    defs.add_user('app', 'secret', 'monitoring')
+    defs.add_permission('v', 'app', '.*', '.*', '.*')
+    defs.add_exchange('v', 'events', 'topic')
+    defs.add_queue('v', 'keep')
+    defs.add_queue('v', 'new')
+    defs.add_queue('v', 'transient', durable=False)
+    defs.add_binding('v', 'events', 'new', 'b.#')
+    return defs
+
+
+class TestDiff(unittest.TestCase):
+    def test_creates_updates_conflicts(self):
+        plan = reconcile.diff(desired(), LIVE)
+        self.assertEqual([(s, o.get('name', o.get('destination')))
+                          for s, o in plan.creates],
+                         [('queues', 'new'), ('bindings', 'new')])
+        self.assertEqual([(s, o['name']) for s, o in plan.updates],
+                         [('users', 'app')])
+        self.assertEqual([(s, d['name'], f) for s, d, l, f in plan.conflicts],
+                         [('queues', 'transient', ['durable'])])
+        self.assertEqual(plan.deletes, [])
+
+    def test_prune(self):
+        plan = reconcile.diff(desired(), LIVE, prune=True, user='guest')
+        self.assertEqual([(s, o.get('name', o.get('destination')))
+                          for s, o in plan.deletes],
+                         [('bindings', 'stale'), ('queues', 'stale')])
+
+    def test_no_changes(self):
+        plan = reconcile.diff(LIVE, LIVE, prune=True)
+        self.assertFalse(plan)
+        self.assertEqual(len(plan), 0)
+
+
+class TestExecute(unittest.TestCase):
+    def setUp(self):
+        self.client = pyrabbit.api.Client('localhost:55672', 'guest',
+                                          'guest')
+        self.calls = []
+
+        def do_call(path, method, body=None, headers=None):
+            self.calls.append((method, path))
+            if path == 'queues' or path.startswith('queues?'):
+                return LIVE['queues']
+            listing = {'users': 'users', 'permissions': 'permissions',
+                       'exchanges': 'exchanges', 'bindings': 'bindings'}
+            if method == 'GET' and path in listing:
+                return LIVE[listing[path]]
+            if method == 'DELETE' and 'stale' in path and 'bindings' in path:
+                raise pyrabbit.http.HTTPError({}, 404, 'Not Found', path)
+        self.client.http.do_call = Mock(side_effect=do_call)
+
+    def test_reconcile_with_definitions(self):
+        plan, result = reconcile.reconcile(self.client, desired(), prune=True)
+        writes = [c for c in self.calls if c[0] != 'GET']
+        self.assertEqual(writes, [
+            ('POST', 'definitions'),
+            ('DELETE', 'bindings/v/e/events/q/stale/a.%2A'),
+            ('DELETE', 'queues/v/stale'),
+        ])
+        self.assertEqual(result.failed,
+                         [('delete', 'bindings', LIVE['bindings'][1])])
+        self.assertEqual(sorted(action for action, s, o in result.succeeded),
+                         ['create', 'create', 'delete', 'update'])
+
+    def test_reconcile_with_calls(self):
+        reconcile.reconcile(self.client, desired(), use_definitions=False,
+                            concurrency=4)
+        writes = [c for c in self.calls if c[0] != 'GET']
+        self.assertEqual(writes, [
+            ('PUT', 'queues/v/new'),
+            ('POST', 'bindings/v/e/events/q/new'),
+            ('PUT', 'users/app'),
+        ])
+
+    def _user_update(self, user):
+        defs = Definitions({'users': [dict(user, name='app',
+                                           tags='monitoring')]})
+        plan, result = reconcile.reconcile(self.client, defs,
+                                           use_definitions=False)
+        puts = [c for c in self.client.http.do_call.call_args_list
+                if c[0][:2] == ('users/app', 'PUT')]
+        return result, [self.client.codec.loads(c[0][2]) for c in puts]
+
+    def test_user_update_sends_password_hash(self):
+        result, bodies = self._user_update({'password_hash': 'c2FsdA=='})
+        self.assertTrue(result)
+        self.assertEqual(bodies, [{'password_hash': 'c2FsdA==',
+                                   'tags': 'monitoring'}])
+
+    def test_user_update_without_credential_is_refused(self):
+        result, bodies = self._user_update({})
+        self.assertEqual(bodies, [])
+        self.assertEqual(result.failed, [('update', 'users',
+                                          {'name': 'app',
+                                           'tags': 'monitoring'})])
+        self.assertIsInstance(result.errors[0][1], ValueError)
+
+    def test_dry_run(self):
+        plan, result = reconcile.reconcile(self.client, desired(),
+                                           dry_run=True)
+        self.assertIsNone(result)
+        self.assertTrue(all(c[0] == 'GET' for c in self.calls))
+
+
+class TestPruneScope(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker(users={'guest': 'guest', 'ops': 'x'})
+        self.client = pyrabbit.api.Client('localhost:15672/api/', 'guest',
+                                          'guest', transport=self.broker)
+        self.client.create_queue('/', 'legacy')
+        self.desired = Definitions()
+        self.desired.add_vhost('app')
+        self.desired.add_user('deploy', 'secret', '')
+        self.desired.add_queue('app', 'jobs')
+
+    def names(self):
+        return (self.client.get_vhost_names(),
+                sorted(u['name'] for u in self.client.get_users()))
+
+    def test_vhosts_and_users_are_kept(self):
+        plan, result = reconcile.reconcile(self.client, self.desired,
+                                           prune=True)
+        self.assertTrue(result)
+        self.assertEqual(self.names(), (['/', 'app'],
+                                        ['deploy', 'guest', 'ops']))
+        self.assertIsNotNone(self.broker.queue('/', 'legacy'))
+
+    def test_prune_global(self):
+        reconcile.reconcile(self.client, self.desired, prune=True,
+                            prune_global=True)
+        # The default vhost is built in, and guest is the client's user.
+        self.assertEqual(self.names(), (['/', 'app'], ['deploy', 'guest']))
+        self.assertIsNotNone(self.broker.queue('/', 'legacy'))
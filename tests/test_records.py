@@ -0,0 +1,82 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+sys.path.append('..')
+import pyrabbit
+from pyrabbit import records
+from mock import Mock
+
+
+QUEUE = {'name': 'q1', 'vhost': '/', 'messages': 5, 'consumers': 0,
+         'message_stats': {'publish_details': {'rate': 1.5}},
+         'arguments': {}}
+
+
+class TestRecords(unittest.TestCase):
+    def test_fields_are_attributes(self):
+        q = records.Queue(QUEUE)
+        self.assertEqual(q.name, 'q1')
+        self.assertEqual(q.messages, 5)
+        self.assertIsNone(q.node)
+        self.assertFalse(hasattr(q, '__dict__'))
+
+    def test_extra_fields_decoded_lazily(self):
+        q = records.Queue(QUEUE)
+        self.assertIsInstance(q._extra, str)
+        self.assertEqual(q.message_stats['publish_details']['rate'], 1.5)
+        self.assertIsInstance(q._extra, dict)
+
+    def test_unknown_field(self):
+        q = records.Queue(QUEUE)
+        self.assertRaises(AttributeError, getattr, q, 'nope')
+        self.assertRaises(KeyError, q.__getitem__, 'nope')
+        self.assertEqual(q.get('nope', 1), 1)
+
+    def test_dict_style_access(self):
+        q = records.Queue(QUEUE)
+        self.assertEqual(q['vhost'], '/')
+        self.assertEqual(q['arguments'], {})
+
+    def test_to_dict_round_trip(self):
+        self.assertEqual(records.Queue(QUEUE).to_dict(), QUEUE)
+        self.assertEqual(records.Queue(QUEUE), records.Queue(QUEUE))
+
+    def test_wrap(self):
+        self.assertIsNone(records.wrap(records.Exchange, None))
+        self.assertIsInstance(records.wrap(records.Exchange, {}),
+                              records.Exchange)
+        wrapped = records.wrap(records.Node, iter([{'name': 'n'}]))
+        self.assertEqual([n.name for n in wrapped], ['n'])
+
+
+class TestClientRecords(unittest.TestCase):
+    def setUp(self):
+        self.client = pyrabbit.api.Client('localhost:55672', 'guest',
+                                          'guest', result_type='records')
+
+    def test_get_queues(self):
+        self.client.http.do_call = Mock(return_value=[QUEUE])
+        queues = self.client.get_queues()
+        self.assertIsInstance(queues[0], records.Queue)
+
+    def test_get_exchange(self):
+        self.client.http.do_call = Mock(return_value={'name': 'x'})
+        self.assertIsInstance(self.client.get_exchange('/', 'x'),
+                              records.Exchange)
+
+    def test_get_bindings_stream(self):
+        self.client.http.stream_call = Mock(return_value=iter([{}]))
+        bindings = list(self.client.get_bindings(stream=True))
+        self.assertIsInstance(bindings[0], records.Binding)
+
+    def test_dicts_by_default(self):
+        client = pyrabbit.api.Client('localhost:55672', 'guest', 'guest')
+        client.http.do_call = Mock(return_value=[QUEUE])
+        self.assertIs(client.get_queues()[0], QUEUE)
+
+    def test_bad_result_type(self):
+        self.assertRaises(ValueError, pyrabbit.api.Client, 'localhost',
+                          'guest', 'guest', result_type='objects')
@@ -0,0 +1,119 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+import time
+sys.path.append('..')
+import pyrabbit
+from pyrabbit.sampler import Sampler, Source
+from pyrabbit.testing import FakeBroker
+
+
+class TestSampler(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.broker = FakeBroker()
+        self.client = pyrabbit.api.Client('localhost:15672/api/', 'guest',
+                                          'guest', transport=self.broker)
+        self.client.create_queue('/', 'jobs')
+        self.sampler = Sampler(self.client, sources=('queues', 'overview'),
+                               interval=10, capacity=5,
+                               clock=lambda: self.now)
+
+    def tick(self, seconds=10):
+        self.sampler.sample()
+        self.now += seconds
+
+    def publish(self, count):
+        self.client.publish_many('/', 'amq.default',
+                                 [('jobs', 'x')] * count)
+
+    def test_rates(self):
+        for i in range(3):
+            self.publish(20)
+            self.tick()
+        key = ('/', 'jobs')
+        self.assertEqual(self.sampler.latest('queues', 'messages', key), 60)
+        self.assertEqual(self.sampler.growth('queues', 'messages', key), 2.0)
+        self.assertEqual(self.sampler.rate('queues', 'message_stats.publish',
+                                           key), 2.0)
+        self.assertEqual(self.sampler.rate('overview',
+                                           'message_stats.publish'), 2.0)
+        self.assertEqual(self.sampler.growth('queues', 'messages', key,
+                                             window=10), 2.0)
+
+    def test_ring_keeps_last_samples(self):
+        for i in range(12):
+            self.publish(1)
+            self.tick()
+        points = self.sampler.series('queues', 'messages', ('/', 'jobs'))
+        self.assertEqual([value for when, value in points],
+                         [8, 9, 10, 11, 12])
+        self.assertEqual(points[-1][0], self.now - 10)
+
+    def test_deleted_objects_are_dropped(self):
+        self.client.create_queue('/', 'temp')
+        self.tick()
+        self.assertEqual(sorted(self.sampler.keys('queues')),
+                         [('/', 'jobs'), ('/', 'temp')])
+        self.client.delete_queue('/', 'temp')
+        self.tick()
+        self.assertEqual(self.sampler.keys('queues'), [('/', 'jobs')])
+        self.assertIsNone(self.sampler.latest('queues', 'messages',
+                                              ('/', 'temp')))
+
+    def test_unknown_field(self):
+        self.tick()
+        self.assertRaises(ValueError, self.sampler.series, 'queues', 'nope',
+                          ('/', 'jobs'))
+
+    def test_errors_are_counted(self):
+        self.broker.fail(503, method='GET', path='^queues')
+        self.tick()
+        self.assertEqual(self.sampler.errors, 1)
+        self.assertIsInstance(self.sampler.last_error, pyrabbit.http.HTTPError)
+        self.assertIsNotNone(self.sampler.latest('overview',
+                                                 'object_totals.queues'))
+
+    def test_background_thread(self):
+        sampler = Sampler(self.client, sources=('overview',), interval=0.01)
+        sampler.start()
+        time.sleep(0.1)
+        sampler.stop()
+        self.assertGreater(len(sampler.series('overview',
+                                              'object_totals.queues')), 1)
+
+
+class TestDerivatives(unittest.TestCase):
+    def sampler(self, values):
+        current = {}
+        source = Source('counter', lambda client: current, ['n'])
+        sampler = Sampler(None, sources=[source], capacity=10,
+                          clock=lambda: current['t'])
+        for i, value in enumerate(values):
+            current.update(n=value, t=i * 10.0)
+            sampler.sample()
+        return sampler
+
+    def test_counter_reset(self):
+        sampler = self.sampler([100, 150, 20, 40])
+        # 50 before the reset, then 20 and 20 after it, over 30 seconds.
+        self.assertEqual(sampler.rate('counter', 'n'), 3.0)
+        self.assertEqual(sampler.growth('counter', 'n'), -2.0)
+
+    def test_churn(self):
+        sampler = self.sampler([2, 0, 3, 3, 1])
+        self.assertEqual(sampler.churn('counter', 'n'), 7)
+        self.assertEqual(sampler.churn('counter', 'n', window=10), 2)
+
+    def test_too_few_samples(self):
+        sampler = self.sampler([5])
+        self.assertIsNone(sampler.rate('counter', 'n'))
+        self.assertIsNone(sampler.growth('counter', 'n'))
+        self.assertEqual(sampler.churn('counter', 'n'), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+sys.path.append('..')
+import pyrabbit
+from pyrabbit.topology import Topology
+from pyrabbit.testing import FakeBroker
+
+
+class TestTopology(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.client = c = pyrabbit.api.Client('localhost:15672/api/', 'guest',
+                                              'guest', transport=self.broker)
+        c.create_vhost('other')
+        for name in ('ingest', 'orders', 'audit', 'unused'):
+            c.create_exchange('/', name, 'topic')
+        for name in ('jobs', 'archive', 'lonely'):
+            c.create_queue('/', name)
+        c.create_exchange_binding('/', 'ingest', 'orders', 'order.#')
+        c.create_exchange_binding('/', 'orders', 'audit', '#')
+        c.create_binding('/', 'orders', 'jobs', 'order.new')
+        c.create_binding('/', 'orders', 'jobs', 'order.retry')
+        c.create_binding('/', 'audit', 'archive', '#')
+        c.create_queue('other', 'stray')
+        self.topology = Topology(c)
+        self.topology.refresh()
+
+    def test_three_listings(self):
+        before = sum(self.broker.requests.values())
+        Topology(self.client).refresh()
+        self.assertEqual(sum(self.broker.requests.values()) - before, 3)
+        self.assertEqual(self.topology.queue('/', 'jobs')['name'], 'jobs')
+        self.assertEqual(self.topology.exchange('/', 'orders')['type'],
+                         'topic')
+        self.assertIsNone(self.topology.queue('/', 'nope'))
+
+    def test_bindings(self):
+        self.assertEqual(sorted(b['routing_key'] for b in
+                                self.topology.bindings_to('/', 'jobs')),
+                         ['order.new', 'order.retry'])
+        self.assertEqual(sorted(b['destination'] for b in
+                                self.topology.bindings_from('/', 'orders')),
+                         ['audit', 'jobs', 'jobs'])
+        self.assertEqual([b['source'] for b in self.topology.bindings_to(
+            '/', 'orders', 'exchange')], ['ingest'])
+        self.assertEqual(self.topology.bindings_from('/', 'unused'), [])
+
+    def test_orphans_and_unbound(self):
+        self.assertEqual(sorted(self.topology.orphaned_queues()),
+                         [('/', 'lonely'), ('other', 'stray')])
+        self.assertEqual(self.topology.orphaned_queues('other'),
+                         [('other', 'stray')])
+        self.assertEqual(self.topology.unbound_exchanges(),
+                         [('/', 'unused')])
+        self.assertIn(('/', 'amq.direct'),
+                      self.topology.unbound_exchanges('/', builtin=True))
+
+    def test_graph_walks(self):
+        self.assertEqual(self.topology.feeders('/', 'archive'),
+                         ['audit', 'orders', 'ingest'])
+        self.assertEqual(self.topology.feeders('/', 'lonely'), [])
+        self.assertEqual(self.topology.destinations('/', 'ingest'),
+                         ['jobs', 'archive'])
+
+    def test_cycles(self):
+        self.client.create_exchange_binding('/', 'audit', 'orders', 'loop')
+        self.topology.refresh()
+        self.assertEqual(self.topology.feeders('/', 'jobs'),
+                         ['orders', 'ingest', 'audit'])
+        self.assertEqual(self.topology.destinations('/', 'audit'),
+                         ['archive', 'jobs'])
+
+    def test_incremental_refresh(self):
+        self.client.delete_binding('/', 'audit', 'archive', '%23')
+        self.client.create_binding('/', 'unused', 'lonely')
+        self.client.create_binding('other', 'amq.topic', 'stray', '#')
+        self.assertEqual(self.topology.update(
+            self.client.get_exchanges('/'), self.client.get_queues('/'),
+            self.client.get_bindings('/'), '/'), (1, 1))
+        self.assertEqual(sorted(self.topology.orphaned_queues()),
+                         [('/', 'archive'), ('other', 'stray')])
+        self.assertEqual(self.topology.feeders('/', 'lonely'), ['unused'])
+        self.topology.refresh('other')
+        self.assertEqual(self.topology.orphaned_queues(), [('/', 'archive')])
+
+    def test_deleted_vhost(self):
+        self.client.delete_vhost('other')
+        self.topology.refresh()
+        self.assertIsNone(self.topology.queue('other', 'stray'))
+        self.assertEqual(self.topology.orphaned_queues(), [('/', 'lonely')])
+
+
+if __name__ == "__main__":
+    unittest.main()
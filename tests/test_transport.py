@@ -0,0 +1,194 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import base64
+import io
+import json
+import subprocess
+import sys
+import threading
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+sys.path.append('..')
+import pyrabbit
+from pyrabbit import http
+from pyrabbit.transport import (BasicAuth, RequestsTransport,
+                                StdlibTransport)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        if self.server.drop_idle:
+            # Hang up without saying so, as a server timing out an idle
+            # keep-alive connection would.
+            self.close_connection = True
+
+    def _handle(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.seen.append((self.command, self.path,
+                                self.headers.get('Authorization')))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        if self.path == '/api/overview':
+            self._reply(200, {'management_version': '3.12.0'})
+        elif self.path.startswith('/api/queues'):
+            self._reply(200, [{'name': 'q%d' % i} for i in range(500)])
+        elif body is not None:
+            self._reply(200, json.loads(body.decode()))
+        else:
+            self._reply(404, {'error': 'Object Not Found',
+                              'reason': 'Not Found'})
+
+    do_GET = do_PUT = do_POST = do_DELETE = _handle
+
+
+class TestStdlibTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.lock = threading.Lock()
+        self.server.connections = set()
+        self.server.seen = []
+        self.server.drop_idle = False
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.url = '127.0.0.1:%d/api/' % self.server.server_address[1]
+        self.c = http.HTTPClient(self.url, 'guest', 'secret',
+                                 transport='stdlib')
+
+    def tearDown(self):
+        self.c.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_is_kept_alive(self):
+        for i in range(3):
+            self.assertEqual(self.c.do_call('overview', 'GET'),
+                             {'management_version': '3.12.0'})
+        self.assertEqual(len(self.server.connections), 1)
+        auth = 'Basic ' + base64.b64encode(b'guest:secret').decode()
+        self.assertEqual(self.server.seen[0], ('GET', '/api/overview', auth))
+
+    def test_body_and_errors(self):
+        self.assertEqual(self.c.do_call('things/x', 'PUT', '{"a": 1}'),
+                         {'a': 1})
+        with self.assertRaises(http.HTTPError) as ctx:
+            self.c.do_call('things/x', 'GET')
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertEqual(ctx.exception.detail, 'Not Found')
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_stream_call(self):
+        items = list(self.c.stream_call('queues', chunk_size=100))
+        self.assertEqual(len(items), 500)
+        self.c.do_call('overview', 'GET')
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_abandoned_stream_drops_connection(self):
+        result = self.c.stream_call('queues', chunk_size=100)
+        next(result)
+        result.close()
+        self.c.do_call('overview', 'GET')
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_connection_closed_by_server_is_replaced(self):
+        self.server.drop_idle = True
+        for i in range(3):
+            self.c.do_call('overview', 'GET')
+        self.assertEqual(len(self.server.connections), 3)
+
+    def test_client_transport_choice(self):
+        client = pyrabbit.api.Client(self.url, 'guest', 'secret',
+                                     transport='stdlib')
+        self.assertIsInstance(client.http.transport, StdlibTransport)
+        self.assertEqual(len(client.get_queues()), 500)
+
+    def test_unreachable(self):
+        self.server.shutdown()
+        self.server.server_close()
+        c = http.HTTPClient(self.url, 'guest', 'secret', transport='stdlib')
+        self.assertRaises(http.NetworkError, c.do_call, 'overview', 'GET')
+
+
+class TestTransportChoice(unittest.TestCase):
+    def test_default_is_requests(self):
+        c = http.HTTPClient('localhost:15672', 'guest', 'guest',
+                            pool_maxsize=3)
+        self.assertIsInstance(c.transport, RequestsTransport)
+        self.assertEqual(c.transport.pool_maxsize, 3)
+
+    def test_unknown_name(self):
+        self.assertRaises(ValueError, http.HTTPClient, 'localhost:15672',
+                          'guest', 'guest', transport='carrier-pigeon')
+
+    def test_import_is_light(self):
+        code = ("import sys; import pyrabbit; "
+                "print('requests' in sys.modules)")
+        out = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(out.strip(), b'False')
+
+
+class TestResponse(unittest.TestCase):
+    def setUp(self):
+        self.released = []
+
+    def response(self, data):
+        return http.Response(200, raw=io.BytesIO(data),
+                             release=self.released.append)
+
+    def test_content_releases_connection(self):
+        resp = self.response(b'[1, 2]')
+        self.assertEqual(resp.json(), [1, 2])
+        resp.close()
+        self.assertEqual(self.released, [True])
+
+    def test_iter_content(self):
+        resp = self.response(b'abcdefg')
+        self.assertEqual(list(resp.iter_content(3)), [b'abc', b'def', b'g'])
+        self.assertEqual(self.released, [True])
+
+    def test_close_before_end(self):
+        resp = self.response(b'abcdefg')
+        next(resp.iter_content(3))
+        resp.close()
+        self.assertEqual(self.released, [False])
+        self.assertTrue(resp.raw.closed)
+
+
+class TestBasicAuth(unittest.TestCase):
+    def test_header(self):
+        auth = BasicAuth('guest', 'guest')
+        self.assertEqual(auth.header, 'Basic Z3Vlc3Q6Z3Vlc3Q=')
+
+        class Request(object):
+            headers = {}
+        self.assertEqual(auth(Request()).headers['Authorization'],
+                         auth.header)
+
+
+if __name__ == "__main__":
+    unittest.main()
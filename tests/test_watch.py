@@ -0,0 +1,101 @@
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import sys
+sys.path.append('..')
+import pyrabbit
+from pyrabbit.watch import Event, Watcher
+from pyrabbit.testing import FakeBroker
+from mock import Mock
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        self.client = pyrabbit.api.Client('localhost:15672/api/', 'guest',
+                                          'guest', transport=self.broker)
+        self.client.create_queue('/', 'jobs')
+        self.watcher = Watcher(self.client,
+                               thresholds={'messages': [10, 100]})
+
+    def publish(self, count):
+        self.client.publish_many('/', 'amq.default',
+                                 [('jobs', 'x')] * count)
+
+    def test_first_poll_is_baseline(self):
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher.index, {('/', 'jobs'): (0, 0)})
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_created_and_deleted(self):
+        self.watcher.poll()
+        self.client.create_queue('/', 'new')
+        self.client.delete_queue('/', 'jobs')
+        events = self.watcher.poll()
+        self.assertEqual(events, [Event('created', ('/', 'new')),
+                                  Event('deleted', ('/', 'jobs'))])
+        self.assertEqual(events[0].obj['name'], 'new')
+
+    def test_thresholds(self):
+        self.watcher.poll()
+        self.publish(50)
+        key = ('/', 'jobs')
+        self.assertEqual(self.watcher.poll(),
+                         [Event('changed', key, 'messages', 0, 50),
+                          Event('above', key, 'messages', 0, 50,
+                                threshold=10)])
+        self.publish(100)
+        self.assertEqual([e.threshold for e in self.watcher.poll()],
+                         [None, 100])
+        self.client.purge_queue('/', 'jobs')
+        self.assertEqual([(e.kind, e.threshold) for e in self.watcher.poll()],
+                         [('changed', None), ('below', 10), ('below', 100)])
+
+    def test_only_subscribed_fields(self):
+        watcher = Watcher(self.client, fields=['consumers'])
+        watcher.poll()
+        self.publish(5)
+        self.assertEqual(watcher.poll(), [])
+        self.assertRaises(ValueError, Watcher, self.client,
+                          fields=['consumers'], thresholds={'messages': [1]})
+
+
+class TestUpdate(unittest.TestCase):
+    def test_custom_key_and_nested_fields(self):
+        watcher = Watcher(None, fields=['mem_used', 'partitions.0'],
+                          key=lambda node: node['name'])
+        watcher.update([{'name': 'rabbit@a', 'mem_used': 1,
+                         'partitions': []}])
+        events = watcher.update([{'name': 'rabbit@a', 'mem_used': 2}])
+        self.assertEqual(events, [Event('changed', 'rabbit@a', 'mem_used',
+                                        1, 2)])
+
+    def test_no_consumers_and_handlers(self):
+        watcher = Watcher(None)
+        seen = Mock()
+        watcher.on('no_consumers', seen)
+        queue = {'vhost': '/', 'name': 'jobs', 'messages': 0, 'consumers': 2}
+        watcher.update([queue])
+        events = watcher.update([dict(queue, consumers=0)])
+        self.assertEqual([e.kind for e in events],
+                         ['changed', 'no_consumers'])
+        seen.assert_called_once_with(events[1])
+        self.assertRaises(ValueError, watcher.on, 'exploded', seen)
+
+    def test_large_snapshot(self):
+        watcher = Watcher(None)
+        queues = [{'vhost': '/', 'name': 'q%d' % i, 'messages': 0,
+                   'consumers': 1} for i in range(80000)]
+        watcher.update(queues)
+        queues[123] = dict(queues[123], consumers=0)
+        events = watcher.update(queues[:-1])
+        self.assertEqual([(e.kind, e.key) for e in events],
+                         [('changed', ('/', 'q123')),
+                          ('no_consumers', ('/', 'q123')),
+                          ('deleted', ('/', 'q79999'))])
+
+
+if __name__ == "__main__":
+    unittest.main()